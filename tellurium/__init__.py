@@ -3,9 +3,15 @@ Tellurium API definition.
 
 The API functions are made available via imports from
 the respective packages and modules.
+
+Only the core of loading and simulating models is imported with the package.
+The plotting, SED-ML, OMEX, analysis, notebook and visualization subsystems
+are imported on first access of one of their functions (see _LAZY_ATTRIBUTES).
 """
 from __future__ import absolute_import
 
+from .utils.lazy import lazyAttributes
+
 # ----------------------------------------------------------------
 # TELLURIUM API
 # ----------------------------------------------------------------
@@ -21,8 +27,9 @@ from .tellurium import (
 
 # Converters
 from .teconverters import (
-    antimonyConverter,
-    inlineOmex,
+    getConversionCache,
+    setConversionCacheSize,
+    clearConversionCache,
 )
 
 # Model import
@@ -33,6 +40,21 @@ from .tellurium import (
     loads,
 )
 
+# Model cache
+from .tellurium import (
+    enableModelCache,
+    disableModelCache,
+    getModelCache,
+)
+
+# Profiling
+from .utils.profiling import (
+    profile,
+    enableProfiling,
+    disableProfiling,
+    getProfiler,
+)
+
 # Dictionary of loaded models
 from .tellurium import (
     __set_model,  # associates model name with roadrunner instance
@@ -60,14 +82,7 @@ except ImportError:
 
 # Plotting
 from .tellurium import (
-    plot,
-    show,
     getPlottingEngine,
-    nextFigure,
-    tiledFigure,
-    newTiledFigure,
-    newLowerTriFigure,
-    clearTiledFigure,
     getDefaultPlottingEngine,
     setDefaultPlottingEngine,
     disablePlotting,
@@ -80,41 +95,19 @@ from .tellurium import (
     plotWithLegend,
 )
 
-# Test models
-from .tellurium import (
-    loadTestModel,
-    getTestModel,
-    listTestModels,
-)
-
-# Latex
-from .teio.latex import LatexExport
-
-
-# Parameter scanning
-from .analysis.parameterscan import (
-    ParameterScan,
-    SteadyStateScan,
-)
-
 # Distributed computing
-from .analysis.stochasticmodel import StochasticSimulationModel
-from .analysis.parameterestimation import ParameterEstimation
-from .analysis.sensitivityanalysis import SensitivityAnalysis
-
 from .tellurium import (
     distributed_parameter_scanning, sample_plot, plotImage,
     distributed_stochastic_simulation, plot_distributed_stochastic, plot_stochastic_result, distributed_sensitivity_analysis
 )
 
-# Bifurcations
-from .analysis.bifurcation import (
-    plotBifurcation,
+# Test models
+from .tellurium import (
+    loadTestModel,
+    getTestModel,
+    listTestModels,
 )
 
-# SED-ML support
-from .sedml.tesedml import sedmlToPython, executeSEDML, executeCombineArchive
-
 # Combine archive support
 from .tellurium import (
     addFileToCombineArchive,
@@ -128,32 +121,6 @@ from .tellurium import (
     executeInlineOmexFromFile,
 )
 
-# Package utilities
-from tellurium.utils.package import (
-    searchPackage,
-    installPackage,
-    upgradePackage,
-    uninstallPackage,
-)
-from tellurium.utils.misc import(
-    saveToFile,
-    readFromFile,
-    runTool,
-    getODEsFromSBMLFile,
-    getODEsFromSBMLString,
-    getODEsFromModel,
-)
-from tellurium.utils.matrix import(
-    rank,
-    nullspace,
-    rref,
-)
-
-from tellurium.utils.uncertainty import(
-    UncertaintySingleP,
-    UncertaintyAllP,
-)
-
 # Dist config
 from .tellurium import (
     DumpJSONInfo,
@@ -176,9 +143,61 @@ from .tellurium import (
     getEigenvalues,
 )
 
+__version__ = getTelluriumVersion()
+
+
+# ----------------------------------------------------------------
+# Subsystems imported on first use
+# ----------------------------------------------------------------
+_LAZY_ATTRIBUTES = {}
+
+
+def _lazy(module, *names):
+    for name in names:
+        _LAZY_ATTRIBUTES[name] = module
+
+
+# Converters
+_lazy('.teconverters', 'antimonyConverter', 'inlineOmex')
+
+# Plotting
+_lazy('.plotting', 'plot', 'show', 'nextFigure', 'tiledFigure', 'newTiledFigure',
+      'newLowerTriFigure', 'clearTiledFigure', 'getDecimation', 'setDecimation')
+
+# Latex
+_lazy('.teio.latex', 'LatexExport')
+
+# Parameter scanning
+_lazy('.analysis.parameterscan', 'ParameterScan', 'ParameterScanEngine', 'SteadyStateScan')
+
+# Distributed computing
+_lazy('.analysis.stochasticmodel', 'StochasticSimulationModel')
+_lazy('.analysis.parameterestimation', 'ParameterEstimation')
+_lazy('.analysis.multistart', 'Experiment', 'MultiExperimentEstimation')
+_lazy('.analysis.sensitivityanalysis', 'SensitivityAnalysis')
+_lazy('.analysis.sensitivityexecutor', 'SensitivityExecutor')
+_lazy('.analysis.globalsensitivity', 'GlobalSensitivity', 'SteadyStateOutput', 'TimeCourseOutput',
+      'ControlCoefficientOutput')
+
+# Bifurcations
+_lazy('.analysis.bifurcation', 'plotBifurcation')
+
+# SED-ML support
+_lazy('.sedml.tesedml', 'sedmlToPython', 'executeSEDML', 'executeCombineArchive')
+_lazy('.sedml.batch', 'executeCombineArchives')
+_lazy('.sedml.codecache', 'getSEDMLDocumentCache', 'getSEDMLCodeCache', 'setSEDMLCacheSize', 'clearSEDMLCache')
+_lazy('.sedml.data', 'setDataCacheDir', 'getDataCacheDir')
+
+# Package utilities
+_lazy('.utils.package', 'searchPackage', 'installPackage', 'upgradePackage', 'uninstallPackage')
+_lazy('.utils.misc', 'saveToFile', 'readFromFile', 'runTool', 'getODEsFromSBMLFile',
+      'getODEsFromSBMLString', 'getODEsFromModel')
+_lazy('.utils.matrix', 'rank', 'nullspace', 'rref')
+_lazy('.utils.uncertainty', 'UncertaintySingleP', 'UncertaintyAllP', 'UncertaintyEnsemble')
+
 # SBML diagram with graphviz
-from .visualization import (
-    SBMLDiagram,
-)
+_lazy('.visualization', 'SBMLDiagram')
 
-__version__ = getTelluriumVersion()
+__getattr__, __dir__ = lazyAttributes(__name__, globals(), _LAZY_ATTRIBUTES, submodules=[
+    'analysis', 'notebooks', 'plotting', 'sedml', 'teio', 'temiriam', 'visualization',
+])
@@ -0,0 +1,397 @@
+"""
+Global sensitivity analysis with Sobol indices and Morris elementary effects.
+
+The parameters vary independently and uniformly within their bounds. The
+model output is any function of the roadrunner instance returning a vector,
+e.g. steady state values, a summary of a time course or control coefficients.
+::
+
+    gsa = te.GlobalSensitivity(r, {'k1': (0.1, 1.0), 'k2': (0.1, 1.0)},
+                               te.SteadyStateOutput(['S1', 'S2']), workers=4)
+    morris = gsa.morris(trajectories=20)    # screening, trajectories * (parameters + 1) runs
+    sobol = gsa.sobol(1024)                 # Saltelli design, n * (parameters + 2) runs
+    print(sobol.toDataFrame())
+
+The Sobol design uses scrambled Sobol sequences (scipy>=1.7). First order
+indices follow Saltelli et al. (2010), total indices Jansen (1999), the
+confidence intervals are bootstrapped from the model evaluations. The model
+evaluations are cached per parameter point, so repeated analyses and analyses
+sharing points do not simulate again. The cache is cleared if the model or the
+output function changes.
+"""
+from __future__ import print_function, division, absolute_import
+
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from tellurium.roadrunner.parallel import ModelPool, defaultWorkers, splitChunks, resetSBML
+from tellurium.utils.cache import contentHash
+from .sampling import sampleUnitCube
+
+
+# ---------------------------------------------------------------------
+# Model outputs
+# ---------------------------------------------------------------------
+class SteadyStateOutput(object):
+    """ Steady state values of the selections. """
+
+    def __init__(self, selections):
+        self.selections = list(selections)
+        self.names = list(self.selections)
+
+    def __call__(self, rr):
+        rr.steadyStateSelections = self.selections
+        return rr.getSteadyStateValues()
+
+
+class TimeCourseOutput(object):
+    """ Summary statistic of the time courses of the selections. """
+
+    STATISTICS = {
+        'final': lambda t, y: y[-1],
+        'mean': lambda t, y: np.mean(y, axis=0),
+        'max': lambda t, y: np.max(y, axis=0),
+        'min': lambda t, y: np.min(y, axis=0),
+        'auc': lambda t, y: np.sum(0.5 * (y[1:] + y[:-1]) * np.diff(t)[:, np.newaxis], axis=0),
+    }
+
+    def __init__(self, selections, start=0, end=10, points=101, statistic='final'):
+        """ Create output.
+
+        :param selections: model variables
+        :param start: start time of the simulation
+        :param end: end time of the simulation
+        :param points: number of points of the simulation
+        :param statistic: 'final', 'mean', 'max', 'min' or 'auc' (trapezoidal area under the curve)
+        """
+        if statistic not in self.STATISTICS:
+            raise ValueError("Unknown statistic '{}', use one of {}".format(statistic, sorted(self.STATISTICS)))
+        self.selections = list(selections)
+        self.start = start
+        self.end = end
+        self.points = points
+        self.statistic = statistic
+        self.names = ['{}({})'.format(statistic, s) for s in self.selections]
+
+    def __call__(self, rr):
+        s = np.asarray(rr.simulate(self.start, self.end, self.points, ['time'] + self.selections))
+        return self.STATISTICS[self.statistic](s[:, 0], s[:, 1:])
+
+
+class ControlCoefficientOutput(object):
+    """ Control coefficients at steady state. """
+
+    def __init__(self, pairs):
+        """ Create output.
+
+        :param pairs: list of (variable, parameter) of the control coefficients
+        """
+        self.pairs = [tuple(pair) for pair in pairs]
+        self.names = ['CC({},{})'.format(v, p) for v, p in self.pairs]
+
+    def __call__(self, rr):
+        rr.steadyState()
+        return [rr.getCC(v, p) for v, p in self.pairs]
+
+
+def _evaluateOutputs(rr, item):
+    """ Model output for a chunk of parameter points on the worker model.
+
+    :param rr: worker roadrunner instance
+    :param item: tuple (offset, parameter ids, points, output)
+    :return: tuple (offset, array (points, outputs)), failed points are nan
+    """
+    offset, names, points, output = item
+    values = []
+    for point in points:
+        rr.resetAll()
+        for name, value in zip(names, point):
+            rr[name] = value
+        try:
+            values.append(np.atleast_1d(np.asarray(output(rr), dtype=float)))
+        except RuntimeError:
+            values.append(None)
+    size = max([len(v) for v in values if v is not None] or [1])
+    block = np.full((len(points), size), np.nan)
+    for k, v in enumerate(values):
+        if v is not None:
+            block[k] = v
+    return offset, block
+
+
+# ---------------------------------------------------------------------
+# Results
+# ---------------------------------------------------------------------
+class SobolIndices(object):
+    """ Sobol indices of every parameter (rows) and output (columns). """
+
+    def __init__(self, parameters, outputs, S1, S1_conf, ST, ST_conf, S2=None, S2_conf=None, evaluations=0):
+        self.parameters = parameters
+        self.outputs = outputs
+        self.S1 = S1
+        self.S1_conf = S1_conf
+        self.ST = ST
+        self.ST_conf = ST_conf
+        self.S2 = S2
+        self.S2_conf = S2_conf
+        self.evaluations = evaluations
+
+    def toDataFrame(self):
+        """ Table with a row per output and parameter. """
+        index = pd.MultiIndex.from_product([self.outputs, self.parameters], names=['output', 'parameter'])
+        return pd.DataFrame({
+            'S1': self.S1.T.ravel(), 'S1_conf': self.S1_conf.T.ravel(),
+            'ST': self.ST.T.ravel(), 'ST_conf': self.ST_conf.T.ravel(),
+        }, index=index, columns=['S1', 'S1_conf', 'ST', 'ST_conf'])
+
+    def ranking(self, output=0):
+        """ Parameters ordered by decreasing total index of the output (index or name). """
+        j = self.outputs.index(output) if not isinstance(output, int) else output
+        return [self.parameters[i] for i in np.argsort(-self.ST[:, j])]
+
+
+class MorrisIndices(object):
+    """ Statistics of the elementary effects of every parameter (rows) and output (columns). """
+
+    def __init__(self, parameters, outputs, mu, mu_star, mu_star_conf, sigma, evaluations=0):
+        self.parameters = parameters
+        self.outputs = outputs
+        self.mu = mu
+        self.mu_star = mu_star
+        self.mu_star_conf = mu_star_conf
+        self.sigma = sigma
+        self.evaluations = evaluations
+
+    def toDataFrame(self):
+        """ Table with a row per output and parameter. """
+        index = pd.MultiIndex.from_product([self.outputs, self.parameters], names=['output', 'parameter'])
+        return pd.DataFrame({
+            'mu': self.mu.T.ravel(), 'mu_star': self.mu_star.T.ravel(),
+            'mu_star_conf': self.mu_star_conf.T.ravel(), 'sigma': self.sigma.T.ravel(),
+        }, index=index, columns=['mu', 'mu_star', 'mu_star_conf', 'sigma'])
+
+    def ranking(self, output=0):
+        """ Parameters ordered by decreasing mu_star of the output (index or name). """
+        j = self.outputs.index(output) if not isinstance(output, int) else output
+        return [self.parameters[i] for i in np.argsort(-self.mu_star[:, j])]
+
+
+# ---------------------------------------------------------------------
+# Estimators
+# ---------------------------------------------------------------------
+def sobolEstimates(yA, yB, yAB, yBA=None):
+    """ Sobol indices from the evaluations of the Saltelli design.
+
+    :param yA: outputs of the base matrix A (n, outputs)
+    :param yB: outputs of the base matrix B (n, outputs)
+    :param yAB: outputs of A with column i taken from B (parameters, n, outputs)
+    :param yBA: outputs of B with column i taken from A, for second order indices
+    :return: tuple (S1, ST, S2) of arrays (parameters, outputs), S2 (parameters,
+        parameters, outputs) or None
+    """
+    var = np.nanvar(np.concatenate([yA, yB]), axis=0)
+    var = np.where(var > 0, var, np.nan)
+    S1 = np.nanmean(yB * (yAB - yA), axis=1) / var
+    ST = 0.5 * np.nanmean((yA - yAB) ** 2, axis=1) / var
+    S2 = None
+    if yBA is not None:
+        d = yAB.shape[0]
+        S2 = np.full((d, d) + yA.shape[1:], np.nan)
+        for i in range(d):
+            for j in range(i + 1, d):
+                Vij = np.nanmean(yBA[i] * yAB[j] - yA * yB, axis=0) / var
+                S2[i, j] = S2[j, i] = Vij - S1[i] - S1[j]
+    return S1, ST, S2
+
+
+def morrisTrajectories(trajectories, d, levels=4, seed=None):
+    """ Morris trajectories in the unit cube.
+
+    Every trajectory starts at a random grid point and changes one parameter
+    at a time, in random order and direction, by delta = levels / (2 (levels - 1)).
+
+    :param trajectories: number of trajectories
+    :param d: number of parameters
+    :param levels: number of grid levels, even
+    :param seed: seed of the random number generator
+    :return: tuple (points (trajectories, d + 1, d), delta)
+    """
+    rng = np.random.RandomState(seed)
+    delta = levels / (2.0 * (levels - 1))
+    # base points on the grid such that x + delta stays within the cube
+    start = rng.randint(0, levels // 2, size=(trajectories, 1, d)) / (levels - 1.0)
+    B = np.tril(np.ones((d + 1, d)), -1)
+    points = np.empty((trajectories, d + 1, d))
+    for t in range(trajectories):
+        D = np.diag(rng.choice([-1, 1], size=d))
+        P = np.eye(d)[rng.permutation(d)]
+        J = np.ones((d + 1, d))
+        points[t] = (J * start[t] + delta / 2.0 * ((2 * B - J).dot(D) + J)).dot(P)
+    return points, delta
+
+
+class GlobalSensitivity(object):
+    """ Global sensitivity analysis of a model output with respect to parameters. """
+
+    def __init__(self, model, bounds, output, workers=1, batchSize=None, cache=True):
+        """ Create analysis.
+
+        :param model: roadrunner instance
+        :param bounds: dictionary of parameter id to (lower, upper) bounds
+        :param output: function of the roadrunner instance returning the output vector,
+            e.g. SteadyStateOutput, TimeCourseOutput or ControlCoefficientOutput;
+            it must be picklable with more than one worker
+        :param workers: number of worker processes, None uses all CPUs
+        :param batchSize: number of points per work item, None splits the points
+            into four chunks per worker
+        :param cache: keep the model outputs of all evaluated points, valid for the
+            current model and output function
+        """
+        self.model = model
+        self.bounds = bounds
+        self.names = list(bounds.keys())
+        self.output = output
+        self.workers = workers
+        self.batchSize = batchSize
+        self.cache = {} if cache else None
+        # model and output of the cached values
+        self._cacheState = None
+        self.evaluations = 0
+        self._noutputs = 0
+        self._lower = np.array([bounds[name][0] for name in self.names], dtype=float)
+        self._upper = np.array([bounds[name][1] for name in self.names], dtype=float)
+
+    @property
+    def outputNames(self):
+        names = getattr(self.output, 'names', None)
+        if names is None:
+            names = ['y{}'.format(k) for k in range(self._noutputs)]
+        return list(names)
+
+    def scale(self, u):
+        """ Parameter values of points of the unit cube. """
+        return self._lower + np.asarray(u) * (self._upper - self._lower)
+
+    def evaluate(self, points):
+        """ Model outputs of the parameter points, simulated in parallel batches.
+
+        :param points: array (n, parameters) of parameter values
+        :return: array (n, outputs)
+        """
+        points = np.ascontiguousarray(points, dtype=float)
+        keys = [p.tobytes() for p in points]
+        # the points are evaluated from the reset state of the model
+        sbml = resetSBML(self.model)
+        cache = self.cache if self.cache is not None else {}
+        modelKey = contentHash(sbml)
+        if self._cacheState is None or self._cacheState[0] != modelKey or self._cacheState[1] is not self.output:
+            cache.clear()
+            self._cacheState = (modelKey, self.output)
+        missing = []
+        seen = set()
+        for k, key in enumerate(keys):
+            if key not in cache and key not in seen:
+                seen.add(key)
+                missing.append(k)
+        if missing:
+            todo = points[missing]
+            workers = min(defaultWorkers(self.workers), len(missing))
+            if self.batchSize is not None:
+                nchunks = int(np.ceil(len(missing) / self.batchSize))
+            else:
+                nchunks = 4 * workers if workers > 1 else 1
+            items = [(i0, self.names, todo[i0:i1], self.output) for (i0, i1) in splitChunks(len(missing), nchunks)]
+            with ModelPool(sbml, workers=workers) as pool:
+                for offset, block in pool.imap_unordered(_evaluateOutputs, items):
+                    for k, row in enumerate(block):
+                        cache[keys[missing[offset + k]]] = row
+            self.evaluations += len(missing)
+        values = np.array([cache[key] for key in keys])
+        if values.ndim != 2:
+            raise ValueError('Model output has a varying length.')
+        self._noutputs = values.shape[1]
+        if np.isnan(values).any():
+            warnings.warn('{} of {} model evaluations failed and are ignored.'.format(
+                int(np.isnan(values).any(axis=1).sum()), len(values)))
+        return values
+
+    def sobol(self, n=1024, secondOrder=False, bootstrap=100, confidence=0.95, seed=None):
+        """ Sobol indices from the Saltelli design.
+
+        Requires n * (parameters + 2) model evaluations, with second order indices
+        n * (2 parameters + 2).
+
+        :param n: number of base points, a power of 2 for the best convergence
+        :param secondOrder: compute second order indices
+        :param bootstrap: number of bootstrap resamples of the confidence intervals
+        :param confidence: confidence level of the intervals
+        :param seed: seed of the design and the bootstrap
+        :return: SobolIndices, the *_conf fields are the half widths of the intervals
+        """
+        from scipy.stats import norm
+        d = len(self.names)
+        u = sampleUnitCube(n, 2 * d, sampling="sobol", seed=seed)
+        A, B = u[:, :d], u[:, d:]
+        designs = [A, B]
+        for i in range(d):
+            AB = A.copy()
+            AB[:, i] = B[:, i]
+            designs.append(AB)
+        if secondOrder:
+            for i in range(d):
+                BA = B.copy()
+                BA[:, i] = A[:, i]
+                designs.append(BA)
+        y = self.evaluate(self.scale(np.concatenate(designs))).reshape((len(designs), n, -1))
+        yA, yB, yAB = y[0], y[1], y[2:2 + d]
+        yBA = y[2 + d:] if secondOrder else None
+        S1, ST, S2 = sobolEstimates(yA, yB, yAB, yBA)
+
+        # bootstrap over the base points
+        rng = np.random.RandomState(seed)
+        samples = rng.randint(0, n, size=(bootstrap, n))
+        boot = [sobolEstimates(yA[r], yB[r], yAB[:, r], yBA[:, r] if secondOrder else None) for r in samples]
+        z = norm.ppf(0.5 + confidence / 2.0)
+        S1_conf = z * np.nanstd([b[0] for b in boot], axis=0)
+        ST_conf = z * np.nanstd([b[1] for b in boot], axis=0)
+        S2_conf = z * np.nanstd([b[2] for b in boot], axis=0) if secondOrder else None
+        return SobolIndices(self.names, self.outputNames, S1, S1_conf, ST, ST_conf,
+                            S2=S2, S2_conf=S2_conf, evaluations=self.evaluations)
+
+    def morris(self, trajectories=20, levels=4, bootstrap=100, confidence=0.95, seed=None):
+        """ Morris screening with elementary effects.
+
+        Requires trajectories * (parameters + 1) model evaluations. The elementary
+        effects are differences of the output per step in the unit cube.
+
+        :param trajectories: number of trajectories
+        :param levels: number of grid levels, even
+        :param bootstrap: number of bootstrap resamples of the mu_star interval
+        :param confidence: confidence level of the interval
+        :param seed: seed of the trajectories and the bootstrap
+        :return: MorrisIndices
+        """
+        from scipy.stats import norm
+        d = len(self.names)
+        points, delta = morrisTrajectories(trajectories, d, levels=levels, seed=seed)
+        y = self.evaluate(self.scale(points.reshape((-1, d)))).reshape((trajectories, d + 1, -1))
+        # parameter changed between consecutive points and the direction of the step
+        steps = np.diff(points, axis=1)
+        changed = np.argmax(np.abs(steps), axis=2)
+        sign = np.sign(steps.sum(axis=2))[:, :, np.newaxis]
+        ee = np.empty((trajectories, d, y.shape[2]))
+        effects = np.diff(y, axis=1) * sign / delta
+        for t in range(trajectories):
+            ee[t, changed[t]] = effects[t]
+
+        mu = np.nanmean(ee, axis=0)
+        mu_star = np.nanmean(np.abs(ee), axis=0)
+        sigma = np.nanstd(ee, axis=0, ddof=1) if trajectories > 1 else np.zeros_like(mu)
+        rng = np.random.RandomState(seed)
+        samples = rng.randint(0, trajectories, size=(bootstrap, trajectories))
+        boot = [np.nanmean(np.abs(ee[r]), axis=0) for r in samples]
+        mu_star_conf = norm.ppf(0.5 + confidence / 2.0) * np.nanstd(boot, axis=0)
+        return MorrisIndices(self.names, self.outputNames, mu, mu_star, mu_star_conf, sigma,
+                             evaluations=self.evaluations)
@@ -0,0 +1,259 @@
+"""
+Multi-experiment, multi-start parameter estimation.
+
+A shared parameter vector is fitted to several experiments, i.e. datasets
+measured under different experimental conditions (initial values and
+parameter overrides). The fit is started from many random points within the
+bounds and the local optima are returned as a ranked table.
+::
+
+    experiments = [
+        te.Experiment(data1),
+        te.Experiment(data2, values={'S1': 5.0}),
+    ]
+    fit = te.MultiExperimentEstimation(model, {'k1': (0.01, 1.0)}, experiments)
+    table = fit.run(restarts=20, workers=4, checkpoint='fit.json')
+
+The simulations of the experimental conditions are evaluated concurrently on
+worker processes each holding a compiled copy of the model. The state of the
+fit is written to the checkpoint file after every iteration, a run with the
+same checkpoint continues where the previous run stopped.
+"""
+from __future__ import print_function, division, absolute_import
+
+import os
+import json
+import time
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import minimize
+
+import tellurium as te
+from tellurium.roadrunner.parallel import ModelPool, defaultWorkers
+from .parameterestimation import simulationSSE
+
+CHECKPOINT_VERSION = 1
+
+
+class Experiment(object):
+    """ Dataset of an experiment and its experimental condition. """
+
+    def __init__(self, data, values=None, selections=None, weight=1.0, name=None):
+        """ Create experiment.
+
+        :param data: array with the observation times in the first column and
+            the observed values in the other columns
+        :param values: dictionary of initial values and parameters which differ
+            from the model in this experiment
+        :param selections: model variables of the data columns, None compares the
+            columns to the default time course selections
+        :param weight: weight of the squared residuals of the experiment
+        :param name: name of the experiment
+        """
+        data = np.asarray(data, dtype=float)
+        self.x = data[:, 0]
+        self.y = data[:, 1:]
+        self.values = dict(values or {})
+        self.selections = list(selections) if selections is not None else None
+        self.weight = weight
+        self.name = name
+
+
+def _simulateCondition(rr, item):
+    """ Root SSE of an experimental condition on the worker model. """
+    names, theta, settings, experiment, values, selections = item
+    return simulationSSE(rr, names, theta, settings, experiment.x, experiment.y,
+                         values=values, selections=selections)
+
+
+def _writeJSON(path, state):
+    """ Write the state atomically, the file is always complete. """
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(state, f, indent=2)
+    try:
+        os.replace(tmp, path)
+    except AttributeError:
+        # python 2, rename does not replace existing files on windows
+        if os.name == 'nt' and os.path.exists(path):
+            os.remove(path)
+        os.rename(tmp, path)
+
+
+class MultiExperimentEstimation(object):
+    """ Fit of a shared parameter vector to several experiments from many starts. """
+
+    def __init__(self, stochastic_simulation_model, bounds, experiments):
+        """ Create estimation.
+
+        :param stochastic_simulation_model: StochasticSimulationModel with the model
+            and the simulation settings
+        :param bounds: dictionary of parameter id to (lower, upper) bounds
+        :param experiments: list of Experiment, the values of an experiment must
+            not contain fitted parameters
+        """
+        self.model = stochastic_simulation_model
+        self.bounds = bounds
+        self.experiments = list(experiments)
+        self.names = list(bounds.keys())
+        for k, experiment in enumerate(self.experiments):
+            # the values are set after the fitted parameters and would overwrite them
+            fitted = sorted(set(experiment.values.keys()) & set(self.names))
+            if fitted:
+                raise ValueError("Values of experiment '{}' contain fitted parameters: {}".format(
+                    experiment.name if experiment.name is not None else k, fitted))
+        self.counters = {'evaluations': 0, 'simulateTime': 0.0, 'objectiveTime': 0.0}
+        self._pool = None
+        self._defaults = None
+        self._selections = None
+
+    def _conditions(self, rr):
+        """ Values of every experiment, including the model values of keys
+        overridden in other experiments, so that the conditions do not leak
+        into each other on a shared worker model. """
+        rr.reset()
+        keys = set()
+        for experiment in self.experiments:
+            keys.update(experiment.values.keys())
+        defaults = dict((key, rr.getValue(key)) for key in keys)
+        conditions = []
+        for experiment in self.experiments:
+            values = dict(defaults)
+            values.update(experiment.values)
+            conditions.append(values)
+        return conditions
+
+    def objective(self, theta):
+        """ Root of the weighted sum of squared residuals of all experiments.
+
+        :param theta: parameter values in the order of the bounds
+        :return: float
+        """
+        start = time.time()
+        settings = (self.model.from_time, self.model.to_time, self.model.step_points,
+                    self.model.variable_step_size)
+        # experiments without selections use the default selections, not the
+        # selections of the previous experiment on the shared worker model
+        items = [(self.names, list(theta), settings, experiment, values,
+                  experiment.selections if experiment.selections is not None else self._selections)
+                 for experiment, values in zip(self.experiments, self._defaults)]
+        results = self._pool.map(_simulateCondition, items)
+        sse = sum(experiment.weight * r[0] ** 2 for experiment, r in zip(self.experiments, results))
+        self.counters['evaluations'] += 1
+        self.counters['simulateTime'] += sum(r[1] for r in results)
+        self.counters['objectiveTime'] += time.time() - start
+        return sse ** 0.5
+
+    def startPoints(self, restarts, seed=None):
+        """ Random start points uniformly distributed within the bounds.
+
+        :param restarts: number of start points
+        :param seed: seed of the random number generator
+        :return: array (restarts, parameters)
+        """
+        rng = np.random.RandomState(seed)
+        lower = np.array([self.bounds[name][0] for name in self.names], dtype=float)
+        upper = np.array([self.bounds[name][1] for name in self.names], dtype=float)
+        return lower + rng.uniform(size=(restarts, len(self.names))) * (upper - lower)
+
+    def _loadCheckpoint(self, checkpoint, restarts, seed):
+        """ State of a previous run or a new state. """
+        if checkpoint is not None and os.path.exists(checkpoint):
+            with open(checkpoint) as f:
+                state = json.load(f)
+            if state.get('version') != CHECKPOINT_VERSION or state.get('names') != self.names \
+                    or len(state.get('starts', [])) != restarts:
+                raise ValueError("Checkpoint '{}' belongs to a different estimation.".format(checkpoint))
+            return state
+        return {
+            'version': CHECKPOINT_VERSION,
+            'names': self.names,
+            'starts': self.startPoints(restarts, seed=seed).tolist(),
+            'results': [],
+            'current': None,
+        }
+
+    def run(self, restarts=10, workers=1, method='L-BFGS-B', seed=None, checkpoint=None, options=None):
+        """ Run the local optimizer from all start points.
+
+        :param restarts: number of random starts
+        :param workers: number of processes simulating the experiments, None uses all CPUs
+        :param method: method of scipy.optimize.minimize supporting bounds
+        :param seed: seed of the start points
+        :param checkpoint: path of a JSON file the state is written to after every
+            iteration; an existing checkpoint is resumed
+        :param options: options of scipy.optimize.minimize
+        :return: pandas.DataFrame of the local optima ranked by the objective
+        """
+        state = self._loadCheckpoint(checkpoint, restarts, seed)
+        bounds = [tuple(self.bounds[name]) for name in self.names]
+        finished = set(result['restart'] for result in state['results'])
+
+        rr = te.loada(self.model.model)
+        self._defaults = self._conditions(rr)
+        self._selections = [s for s in rr.timeCourseSelections if s != 'time']
+        workers = min(defaultWorkers(workers), len(self.experiments))
+        with ModelPool(rr.getCurrentSBML(), workers=workers) as pool:
+            self._pool = pool
+            try:
+                for k, x0 in enumerate(state['starts']):
+                    if k in finished:
+                        continue
+                    current = state.get('current')
+                    if current is not None and current['restart'] == k:
+                        # continue from the last iterate of the interrupted run
+                        x0 = current['x']
+
+                    def callback(xk, k=k):
+                        if checkpoint is not None:
+                            state['current'] = {'restart': k, 'x': list(map(float, xk))}
+                            _writeJSON(checkpoint, state)
+
+                    res = minimize(self.objective, np.asarray(x0, dtype=float), method=method,
+                                   bounds=bounds, callback=callback, options=options)
+                    state['results'].append({
+                        'restart': k,
+                        'x': list(map(float, res.x)),
+                        'objective': float(res.fun),
+                        'nfev': int(res.nfev),
+                        'success': bool(res.success),
+                        'message': str(res.message),
+                    })
+                    state['current'] = None
+                    if checkpoint is not None:
+                        _writeJSON(checkpoint, state)
+            finally:
+                self._pool = None
+
+        return self.rankedOptima(state['results'])
+
+    def rankedOptima(self, results, rtol=1E-3):
+        """ Table of the optimization results ranked by the objective.
+
+        Results whose parameters agree within rtol are the same local optimum,
+        the column 'optimum' numbers the distinct optima in order of the objective.
+
+        :param results: list of result dictionaries of :func:`run`
+        :param rtol: relative tolerance of equal optima
+        :return: pandas.DataFrame
+        """
+        results = sorted(results, key=lambda r: r['objective'])
+        optima = []
+        rows = []
+        for result in results:
+            x = np.array(result['x'])
+            optimum = None
+            for j, other in enumerate(optima):
+                if np.allclose(x, other, rtol=rtol, atol=0):
+                    optimum = j
+                    break
+            if optimum is None:
+                optima.append(x)
+                optimum = len(optima) - 1
+            row = dict(zip(self.names, result['x']))
+            row.update(dict((key, result[key]) for key in ['restart', 'objective', 'nfev', 'success', 'message']))
+            row['optimum'] = optimum
+            rows.append(row)
+        columns = ['optimum', 'objective'] + self.names + ['restart', 'nfev', 'success', 'message']
+        return pd.DataFrame(rows, columns=columns)
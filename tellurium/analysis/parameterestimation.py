@@ -3,20 +3,163 @@ Parameter estimation in tellurium.
 """
 from __future__ import print_function, absolute_import
 import csv
+import time
+import inspect
+import warnings
 import numpy as np
 import tellurium as te
 from scipy.optimize import differential_evolution
-import random
+
+from tellurium.roadrunner.parallel import ModelPool, defaultWorkers
+
+
+def _supportsWorkers():
+    """ True if scipy's differential_evolution accepts a map for the population. """
+    try:
+        params = inspect.signature(differential_evolution).parameters
+    except AttributeError:
+        params = inspect.getargspec(differential_evolution).args
+    return 'workers' in params
+
+
+def simulationSSE(rr, names, theta, settings, x, y, values=None, selections=None):
+    """ Root of the sum of squared residuals of a parameter vector.
+
+    The model is simulated on the time grid of the settings and the
+    simulation is interpolated to the observation times x.
+
+    :param rr: roadrunner instance
+    :param names: parameter ids
+    :param theta: parameter values
+    :param settings: tuple (from_time, to_time, step_points, variable_step_size)
+    :param x: observation times
+    :param y: observed values, one column per simulated variable
+    :param values: dictionary of initial values and parameters of the experimental
+        condition, set after the reset of the model
+    :param selections: simulated variables compared to the columns of y, None uses
+        the current time course selections
+    :return: tuple (root of SSE, simulation time in seconds)
+    """
+    from_time, to_time, step_points, variable_step_size = settings
+    for name, value in zip(names, theta):
+        setattr(rr, name, value)
+
+    start = time.time()
+    rr.integrator.variable_step_size = variable_step_size
+    rr.reset()
+    if values:
+        for key, value in values.items():
+            rr.setValue(key, value)
+    if selections is not None:
+        rr.timeCourseSelections = ['time'] + list(selections)
+    simulated = np.array(rr.simulate(from_time, to_time, step_points))
+    simulateTime = time.time() - start
+
+    residuals = np.empty_like(y)
+    for k in range(y.shape[1]):
+        residuals[:, k] = y[:, k] - np.interp(x, simulated[:, 0], simulated[:, k+1])
+    return float(np.sum(residuals ** 2)) ** 0.5, simulateTime
+
+
+def simulationSSEGradient(rr, names, theta, settings, x, y, method='auto'):
+    """ Root of the sum of squared residuals and its gradient.
+
+    The gradient is computed from the time course sensitivities of the model,
+    interpolated to the observation times like the simulation. The simulation
+    uses the fixed time grid of the settings.
+
+    :param rr: ExtendedRoadRunner instance
+    :param names: parameter ids
+    :param theta: parameter values
+    :param settings: tuple (from_time, to_time, step_points, variable_step_size)
+    :param x: observation times
+    :param y: observed values, one column per time course selection after time
+    :param method: method of ExtendedRoadRunner.timeCourseSensitivities
+    :return: tuple (root of SSE, gradient array (parameters,))
+    """
+    from_time, to_time, step_points, _ = settings
+    for name, value in zip(names, theta):
+        setattr(rr, name, value)
+
+    rr.integrator.variable_step_size = False
+    rr.reset()
+    selections = list(rr.timeCourseSelections)
+    simulated = np.array(rr.simulate(from_time, to_time, step_points))
+    sensitivities = rr.timeCourseSensitivities(from_time, to_time, step_points, parameters=names,
+                                               selections=selections[1:], method=method)
+    rr.timeCourseSelections = selections
+
+    t = simulated[:, 0]
+    sse = 0.0
+    dsse = np.zeros(len(names))
+    for k in range(y.shape[1]):
+        residuals = y[:, k] - np.interp(x, t, simulated[:, k+1])
+        sse += np.sum(residuals ** 2)
+        for j in range(len(names)):
+            dsse[j] -= 2 * np.sum(residuals * np.interp(x, t, sensitivities[k, j]))
+    root = float(sse) ** 0.5
+    gradient = dsse / (2 * root) if root > 0 else np.zeros(len(names))
+    return root, gradient
+
+
+def _evaluateSSE(rr, item):
+    """ Objective of a single parameter vector on the worker model. """
+    return simulationSSE(rr, *item)
+
+
+class _PopulationMap(object):
+    """ Evaluates all members of a population on the pool of worker models.
+
+    Used as the workers map of differential_evolution, the objective passed by
+    the optimizer is replaced by the evaluation on the workers.
+    """
+
+    def __init__(self, estimation, pool, x, y):
+        self.estimation = estimation
+        self.pool = pool
+        self.x = x
+        self.y = y
+
+    def __call__(self, func, population):
+        est = self.estimation
+        start = time.time()
+        items = [(est._parameter_names, theta, est._simulationSettings(), self.x, self.y) for theta in population]
+        results = self.pool.map(_evaluateSSE, items)
+        est._count(len(results), sum(r[1] for r in results), time.time() - start)
+        return [r[0] for r in results]
 
 class ParameterEstimation(object):
-    """Parameter Estimation"""
+    """Parameter Estimation
+
+    The objective is the root of the sum of squared residuals between the data
+    and the simulation interpolated to the observation times. Timing of the
+    objective evaluations is counted in ``counters``.
+    """
     def __init__(self, stochastic_simulation_model,bounds, data=None):
         if(data is not None):
             self.data = data
 
         self.model = stochastic_simulation_model
         self.bounds = bounds
-        
+        self.resetCounters()
+
+    def resetCounters(self):
+        """ Reset the timing counters of the objective evaluations.
+
+        The counters are 'evaluations', 'simulateTime' (seconds spent in the
+        simulations) and 'objectiveTime' (seconds spent in the objective, for
+        parallel runs the wall time of the population evaluations).
+        """
+        self.counters = {'evaluations': 0, 'simulateTime': 0.0, 'objectiveTime': 0.0}
+
+    def _count(self, evaluations, simulateTime, objectiveTime):
+        self.counters['evaluations'] += evaluations
+        self.counters['simulateTime'] += simulateTime
+        self.counters['objectiveTime'] += objectiveTime
+
+    def _simulationSettings(self):
+        return (self.model.from_time, self.model.to_time, self.model.step_points,
+                self.model.variable_step_size)
 
 
     def setDataFromFile(self,FILENAME, delimiter=",", headers=True):
@@ -49,14 +192,22 @@ class ParameterEstimation(object):
         self.data = np.asarray(self.data, dtype = float)
         
 
-    def run(self,func=None):
+    def run(self,func=None, workers=1, jac=False, **kwargs):
         """Allows the user to set the data from a File
         This data is to be compared with the simulated data in the process of parameter estimation
         
         Args:
             func: An Optional Variable with default value (None) which by default run differential evolution
                 which is from scipy function. Users can provide reference to their defined function as argument.
-            
+            workers: Number of processes evaluating the population of differential evolution,
+                every process holds its own compiled model. None uses all CPUs.
+                Requires scipy>=1.2, ignored for a user defined func.
+            jac: If True the gradient of the objective computed from the time course
+                sensitivities is passed to the user defined func as keyword jac, e.g.
+                func=lambda f, bounds, args, jac: minimize(f, x0, args=args, bounds=bounds, jac=jac)
+                Differential evolution does not use gradients, jac is ignored with a warning
+                if no func is given.
+            kwargs: Additional arguments of differential_evolution, e.g. maxiter, popsize or seed
 
         Returns:
             The Value of the parameter(s) which are estimated by the function provided.
@@ -66,38 +217,36 @@ class ParameterEstimation(object):
         
         """
         
-        self._parameter_names = self.bounds.keys()
-        self._parameter_bounds = self.bounds.values()
+        self._parameter_names = list(self.bounds.keys())
+        self._parameter_bounds = list(self.bounds.values())
         self._model_roadrunner = te.loada(self.model.model)
-        x_data = self.data[:,0]
-        y_data = self.data[:,1:]
+        x_data = np.asarray(self.data[:,0], dtype=float)
+        y_data = np.asarray(self.data[:,1:], dtype=float)
         arguments = (x_data,y_data)
 
         if(func is not None):
-            result = differential_evolution(self._SSE, self._parameter_bounds, args=arguments)
-            return(result.x)
-        else:
-            result = func(self._SSE,self._parameter_bounds,args=arguments)
+            if jac:
+                result = func(self._SSE,self._parameter_bounds,args=arguments,jac=self._SSEGradient)
+            else:
+                result = func(self._SSE,self._parameter_bounds,args=arguments)
             return(result.x)
 
-    def _set_theta_values(self, theta):
-        """ Sets the Theta Value in the range of bounds provided to the Function.
-            Not intended to be called by user.
-            
-        Args:
-            theta: The Theta Value that is set for the function defined/provided
-            
-
-        Returns:
-            None but it sets the parameter(s) to the stochastic model provided
-        
-        .. sectionauthor:: Shaik Asifullah <s.asifullah7@gmail.com>
-        
-        
-        """
-        for theta_i,each_theta in enumerate(self._parameter_names):
-            setattr(self._model_roadrunner, each_theta, theta[theta_i])
+        if jac:
+            warnings.warn('Differential evolution does not use the gradient, jac is ignored.')
+        workers = defaultWorkers(workers)
+        if workers > 1 and not _supportsWorkers():
+            warnings.warn('Parallel differential evolution requires scipy>=1.2, running serially.')
+            workers = 1
+        if workers == 1:
+            result = differential_evolution(self._SSE, self._parameter_bounds, args=arguments, **kwargs)
+            return(result.x)
 
+        with ModelPool(self._model_roadrunner.getCurrentSBML(), workers=workers) as pool:
+            population = _PopulationMap(self, pool, x_data, y_data)
+            kwargs.setdefault('updating', 'deferred')
+            result = differential_evolution(self._SSE, self._parameter_bounds, args=arguments,
+                                            workers=population, **kwargs)
+        return(result.x)
 
     def _SSE(self,parameters, *data):
         """ Runs a simuation of SumOfSquares that get parameters and data and compute the metric.
@@ -110,49 +259,36 @@ class ParameterEstimation(object):
             
 
         Returns:
-            Sum of Squared Error
+            Root of the Sum of Squared Error of the simulation interpolated to the data points
         
         .. sectionauthor:: Shaik Asifullah <s.asifullah7@gmail.com>
         
             
         """
         theta = parameters
-
         x, y = data
-        sample_x, sample_y = data
-        self._set_theta_values(theta)
-
-        random.seed()
-        # it is now safe to use random.randint
-        #self._model.setSeed(random.randint(1000, 99999))
-
-        self._model_roadrunner.integrator.variable_step_size = self.model.variable_step_size
-        self._model_roadrunner.reset()
-        simulated_data = self._model_roadrunner.simulate(self.model.from_time, self.model.to_time,
-                                                                        self.model.step_points)
-
-        simulated_data = np.array(simulated_data)
-        simulated_x = simulated_data[:,0]
-        simulated_y = simulated_data[:,1:]
-
-        SEARCH_BEGIN_INDEX = 0
-        SSE_RESULT = 0
 
-        for simulated_i in range(len(simulated_y)):
-            y_i = simulated_y[simulated_i]
-            #yhat_i = sample_y[simulated_i]
+        start = time.time()
+        sse, simulateTime = simulationSSE(self._model_roadrunner, self._parameter_names, theta,
+                                          self._simulationSettings(), x, y)
+        self._count(1, simulateTime, time.time() - start)
+        return sse
 
-            x_i = simulated_x[simulated_i]
-            for search_i in range(SEARCH_BEGIN_INDEX+1,len(sample_x)):
-                if(sample_x[search_i-1] <= x_i < sample_x[search_i]):
-                    yhat_i = sample_y[search_i-1]
-                    break
-                SEARCH_BEGIN_INDEX += 1
-
-            partial_result = 0
-            for sse_i in range(len(y_i)):
-                partial_result += (float(y_i[sse_i]) - float(yhat_i[sse_i])) ** 2
-            SSE_RESULT += partial_result
+    def _SSEGradient(self, parameters, *data):
+        """ Gradient of the objective _SSE with respect to the parameters.
+            Not intended to be called by user.
 
-        return SSE_RESULT ** 0.5
+        Args:
+            parameters: The tuple of theta values
+            data: The observation times and the observed values
 
+        Returns:
+            Array of the derivatives of the root of the Sum of Squared Error
+        """
+        x, y = data
+        start = time.time()
+        _, gradient = simulationSSEGradient(self._model_roadrunner, self._parameter_names, parameters,
+                                            self._simulationSettings(), x, y)
+        elapsed = time.time() - start
+        self._count(0, elapsed, elapsed)
+        return gradient
@@ -5,6 +5,8 @@ from __future__ import print_function, division
 import os
 import numpy as np
 import matplotlib
+from tellurium.plotting.backend import selectBackend
+selectBackend()
 import matplotlib.pyplot as plt
 from matplotlib.collections import PolyCollection
 from mpl_toolkits.mplot3d import Axes3D
@@ -21,6 +23,129 @@ except:
 if any('IPYTHONDIR' in name for name in os.environ):
     IPYTHON = True
 
+
+def scanRange(start, end, num, log=False):
+    """ Values of a scan dimension.
+
+    :param start: first value
+    :param end: last value
+    :param num: number of values
+    :param log: logarithmically spaced values if True, otherwise linearly spaced
+    :return: numpy array of values
+    """
+    if log:
+        return np.geomspace(start, end, num)
+    return np.linspace(start, end, num)
+
+
+def _simulateScanBlock(rr, item):
+    """ Simulate a block of grid points on a worker model.
+
+    :param rr: worker roadrunner instance
+    :param item: tuple (offset, names, values, start, end, points, selections)
+    :return: tuple (offset, array of shape (len(values), points, len(selections)))
+    """
+    offset, names, values, start, end, points, selections = item
+    rr.timeCourseSelections = selections
+    block = np.empty((values.shape[0], points, len(selections)))
+    for k in range(values.shape[0]):
+        rr.reset()
+        for name, value in zip(names, values[k]):
+            rr[name] = value
+        block[k] = rr.simulate(start, end, points)
+    return offset, block
+
+
+class ParameterScanEngine(object):
+    """ Time course simulations on an N-dimensional parameter grid.
+
+    The results are written into one contiguous tensor of shape
+    ``grid shape + (points, len(selections))``. The grid points are distributed
+    over a pool of worker processes each holding its own compiled model.
+    ::
+
+        engine = ParameterScanEngine(r, [('k1', scanRange(0.1, 10, 20, log=True)),
+                                         ('S1', [1, 5, 10])],
+                                     startTime=0, endTime=20, numberOfPoints=101, workers=4)
+        result = engine.run()   # shape (20, 3, 101, len(selections))
+    """
+
+    def __init__(self, rr, parameters, startTime=0, endTime=20, numberOfPoints=50,
+                 selections=None, integrator="cvode", workers=1):
+        """ Create scan engine.
+
+        :param rr: RoadRunner instance, it is reset and every grid point is simulated
+            from its initial state; runs on rr itself with one worker
+        :param parameters: list of (id, values) tuples, one per grid dimension
+        :param startTime: start time of the simulations
+        :param endTime: end time of the simulations
+        :param numberOfPoints: number of time points
+        :param selections: selections to record, defaults to the timeCourseSelections of rr
+        :param integrator: integrator name
+        :param workers: number of worker processes, None uses all CPUs
+        """
+        self.rr = rr
+        self.names = [name for (name, values) in parameters]
+        self.values = [np.asarray(values, dtype=float) for (name, values) in parameters]
+        self.startTime = startTime
+        self.endTime = endTime
+        self.numberOfPoints = numberOfPoints
+        if selections is None:
+            selections = list(rr.timeCourseSelections)
+        self.selections = list(selections)
+        self.integrator = integrator
+        self.workers = workers
+
+    @property
+    def shape(self):
+        """ Shape of the parameter grid. """
+        return tuple(len(v) for v in self.values)
+
+    def gridPoints(self):
+        """ All grid points as array of shape (number of points, number of parameters). """
+        mesh = np.meshgrid(*self.values, indexing='ij')
+        return np.stack([m.ravel() for m in mesh], axis=-1)
+
+    def run(self):
+        """ Simulate all grid points.
+
+        :return: tensor of shape grid shape + (numberOfPoints, len(selections))
+        """
+        from tellurium.roadrunner.parallel import ModelPool, defaultWorkers, splitChunks, resetSBML
+
+        points = self.gridPoints()
+        npoints = points.shape[0]
+        result = np.empty(self.shape + (self.numberOfPoints, len(self.selections)))
+        flat = result.reshape((npoints, self.numberOfPoints, len(self.selections)))
+
+        workers = min(defaultWorkers(self.workers), max(npoints, 1))
+        chunks = splitChunks(npoints, 4 * workers if workers > 1 else 1)
+        items = [(i0, self.names, points[i0:i1], self.startTime, self.endTime,
+                  self.numberOfPoints, self.selections) for (i0, i1) in chunks]
+        if workers == 1:
+            # no copy of the model is needed
+            if self.rr.integrator.getName() != self.integrator:
+                self.rr.setIntegrator(self.integrator)
+            self.rr.reset()
+            selections = self.rr.timeCourseSelections
+            values = [self.rr[name] for name in self.names]
+            try:
+                for item in items:
+                    offset, block = _simulateScanBlock(self.rr, item)
+                    flat[offset:offset + block.shape[0]] = block
+            finally:
+                self.rr.timeCourseSelections = selections
+                for name, value in zip(self.names, values):
+                    self.rr[name] = value
+                self.rr.reset()
+            return result
+
+        # the scan resets the model, the workers start from the same initial state
+        with ModelPool(resetSBML(self.rr), workers=workers, integrator=self.integrator) as pool:
+            for offset, block in pool.imap_unordered(_simulateScanBlock, items):
+                flat[offset:offset + block.shape[0]] = block
+        return result
+
 class ParameterScan (object):
     """ ParameterScan """
     def __init__(self, rr,
@@ -46,7 +171,8 @@ class ParameterScan (object):
                     colorbar=True,
                     antialias=True,
                     sameColor=False,
-                    legend=True):
+                    legend=True,
+                    workers=1):
 
         self.rr = rr
         self.startTime = startTime
@@ -72,6 +198,7 @@ class ParameterScan (object):
         self.antialias = antialias
         self.sameColor = sameColor
         self.legend = legend
+        self.workers = workers
 
 
     def _sim(self):
@@ -148,6 +275,8 @@ class ParameterScan (object):
         """ Runs successive simulations with incremental changes in one species, and returns
         results for a plotting function.
         Not intended to be called by user.
+
+        :return: tensor of shape (polyNumber, numberOfPoints, len(selection)), first selection is time
         """
         self.rr.setIntegrator(self.integrator)
         mdl = self.rr.model
@@ -179,64 +308,57 @@ class ParameterScan (object):
                     if item.lower() != 'time':
                         raise ValueError('{0} cannot be found in loaded model'.format(item))
         self.selection = ['time'] + self.selection
-        polyNumber = float(self.polyNumber)
-        mdl[self.value] = self.startValue
-        m = self.rr.simulate(self.startTime, self.endTime, self.numberOfPoints, self.selection)
-        interval = ((self.endValue - self.startValue) / (polyNumber - 1))
-        start = self.startValue
-        while start < self.endValue - .00001:
-            self.rr.reset()
-            start += interval
-            mdl[self.value] = start
-            m1 = self.rr.simulate(self.startTime, self.endTime, self.numberOfPoints, self.selection)
-            m1 = np.delete(m1, 0, 1)
-            m = np.hstack((m, m1))
-        return m
+        engine = ParameterScanEngine(self.rr,
+                                     [(self.value, scanRange(self.startValue, self.endValue, self.polyNumber))],
+                                     startTime=self.startTime, endTime=self.endTime,
+                                     numberOfPoints=self.numberOfPoints, selections=self.selection,
+                                     integrator=self.integrator, workers=self.workers)
+        return engine.run()
+
+    @staticmethod
+    def _flattenGraduated(tensor):
+        """ Flattens a graduated scan tensor to a 2D array [time, values of 1st scan, values of 2nd scan, ...]. """
+        time = tensor[0, :, :1]
+        columns = tensor[:, :, 1:].transpose(1, 0, 2).reshape(tensor.shape[1], -1)
+        return np.hstack((time, columns))
+
+    def _graduatedTensor(self, result):
+        """ Tensor of a graduated scan, accepts the tensor or the flattened 2D array. """
+        result = np.asarray(result)
+        if result.ndim == 3:
+            return result
+        numSp = len(self.selection) - 1
+        time = result[:, 0]
+        columns = result[:, 1:].reshape(result.shape[0], -1, numSp).transpose(1, 0, 2)
+        tensor = np.empty((columns.shape[0], result.shape[0], numSp + 1))
+        tensor[:, :, 0] = time
+        tensor[:, :, 1:] = columns
+        return tensor
 
 
     def collect_plotGraduatedArray_result(self):
         result = self._graduatedSim()
-        return(np.array(result))
+        return self._flattenGraduated(result)
 
 
     def plotGraduatedArrayFunction(self,result):
-        interval = ((self.endValue - self.startValue) / (self.polyNumber - 1))
+        result = self._graduatedTensor(result)
+        values = scanRange(self.startValue, self.endValue, self.polyNumber)
         numSp = len(self.selection) - 1
-        if self.color is None and self.sameColor is True:
-            count = 1
-            for species in self.selection[1:]:
-                for i in range(self.polyNumber):
-                    if numSp > 1:
-                        lbl = "{0}, {1} = {2}".format(species, self.value, round((self.startValue + (interval * i)), 2))
-                    else:
-                        lbl = "{0} = {1}".format(self.value, round((self.startValue + (interval * i)), 2))
-                    plt.plot(result[:, 0], result[:, numSp * i + count], linewidth=self.width, color='b', label=lbl)
-                count += 1
-
-
-        elif self.color is None:
-            count = 1
-            for species in self.selection[1:]:
-                for i in range(self.polyNumber):
-                    if numSp > 1:
-                        lbl = "{0}, {1} = {2}".format(species, self.value, round((self.startValue + (interval * i)), 2))
-                    else:
-                        lbl = "{0} = {1}".format(self.value, round((self.startValue + (interval * i)), 2))
-                    plt.plot(result[:, 0], result[:, numSp * i + count], linewidth=self.width, label=lbl)
-                count += 1
-        else:
-            if len(self.color) != self.polyNumber:
-                self.color = self.colorCycle()
-            count = 1
-            for species in self.selection[1:]:
-                for i in range(self.polyNumber):
-                    if numSp > 1:
-                        lbl = "{0}, {1} = {2}".format(species, self.value, round((self.startValue + (interval * i)), 2))
-                    else:
-                        lbl = "{0} = {1}".format(self.value, round((self.startValue + (interval * i)), 2))
-                    plt.plot(result[:, 0], result[:, numSp * i + count], color=self.color[i],
-                             linewidth=self.width, label=lbl)
-                count += 1
+        if self.color is not None and len(self.color) != self.polyNumber:
+            self.color = self.colorCycle()
+        for count, species in enumerate(self.selection[1:]):
+            for i in range(self.polyNumber):
+                if numSp > 1:
+                    lbl = "{0}, {1} = {2}".format(species, self.value, round(values[i], 2))
+                else:
+                    lbl = "{0} = {1}".format(self.value, round(values[i], 2))
+                kwargs = {}
+                if self.color is None and self.sameColor is True:
+                    kwargs['color'] = 'b'
+                elif self.color is not None:
+                    kwargs['color'] = self.color[i]
+                plt.plot(result[i, :, 0], result[i, :, count + 1], linewidth=self.width, label=lbl, **kwargs)
 
         if self.title is not None:
             plt.suptitle(self.title)
@@ -267,27 +389,21 @@ class ParameterScan (object):
 
 
     def plotPolyArrayFunction(self,result):
-        interval = ((self.endValue - self.startValue) / (self.polyNumber - 1))
+        result = self._graduatedTensor(result)
         self.rr.reset()
         fig = plt.figure()
         ax = fig.gca(projection='3d')
         if self.startValue is None:
             self.startValue = self.rr.model[self.value]
         columnNumber = self.polyNumber + 1
-        lastPoint = [self.endTime]
-        firstPoint = [self.startTime]
-        for i in range(int(columnNumber) - 1):
-            lastPoint.append(0)
-            firstPoint.append(0)
-        lastPoint = np.array(lastPoint)
-        firstPoint = np.array(firstPoint)
-        zresult = np.vstack((result, lastPoint))
-        zresult = np.vstack((firstPoint, zresult))
-        zs = []
-        result = []
-        for i in range(int(columnNumber) - 1):
-            zs.append(i)
-            result.append(list(zip(zresult[:, 0], zresult[:, (i + 1)])))
+        zs = np.arange(self.polyNumber)
+        # closed polygons along the time axis for every scan value
+        verts = np.zeros((self.polyNumber, self.numberOfPoints + 2, 2))
+        verts[:, 0, 0] = self.startTime
+        verts[:, -1, 0] = self.endTime
+        verts[:, 1:-1, 0] = result[:, :, 0]
+        verts[:, 1:-1, 1] = result[:, :, 1]
+        result = verts
         if self.color is None:
             poly = PolyCollection(result)
         else:
@@ -299,7 +415,7 @@ class ParameterScan (object):
         ax.add_collection3d(poly, zs=zs, zdir='y')
         ax.set_xlim3d(0, self.endTime)
         ax.set_ylim3d(0, (columnNumber - 1))
-        ax.set_zlim3d(0, (self.endValue + interval))
+        ax.set_zlim3d(0, self.endValue + (self.endValue - self.startValue) / (self.polyNumber - 1))
         if self.xlabel == 'toSet':
             ax.set_xlabel('Time')
         elif self.xlabel:
@@ -322,7 +438,7 @@ class ParameterScan (object):
 
     def collect_plotPolyArray_result(self):
         result = self._graduatedSim()
-        return(np.array(result))
+        return self._flattenGraduated(result)
 
 
     def plotPolyArray(self):
@@ -381,23 +497,14 @@ class ParameterScan (object):
 
             fig = plt.figure()
             ax = fig.gca(projection='3d')
-            interval = (self.endTime - self.startTime) / float(self.numberOfPoints - 1)
-            X = np.arange(self.startTime, (self.endTime + (interval - 0.001)), interval)
-            interval = (self.endValue - self.startValue) / float(self.numberOfPoints - 1)
-            Y = np.arange(self.startValue, (self.endValue + (interval - 0.001)), interval)
+            X = np.linspace(self.startTime, self.endTime, self.numberOfPoints)
+            Y = scanRange(self.startValue, self.endValue, self.numberOfPoints)
             X, Y = np.meshgrid(X, Y)
-            self.rr.reset()
-            self.rr.model[self.independent[1]] = self.startValue
-
-            Z = self.rr.simulate(self.startTime, self.endTime, self.numberOfPoints, [self.dependent])
-            Z = Z.T
-
-            for i in range(self.numberOfPoints - 1):
-                self.rr.reset()
-                self.rr.model[self.independent[1]] = self.startValue + ((i + 1) * interval)
-                Z1 = self.rr.simulate(self.startTime, self.endTime, self.numberOfPoints, [self.dependent])
-                Z1 = Z1.T
-                Z = np.concatenate((Z, Z1))
+            engine = ParameterScanEngine(self.rr, [(self.independent[1], Y[:, 0])],
+                                         startTime=self.startTime, endTime=self.endTime,
+                                         numberOfPoints=self.numberOfPoints, selections=[self.dependent],
+                                         integrator=self.integrator, workers=self.workers)
+            Z = engine.run()[:, :, 0]
 
             if self.antialias is False:
                 surf = ax.plot_surface(X, Y, Z, rstride=1, cstride=1, cmap=self.colormap,
@@ -569,7 +676,8 @@ class SteadyStateScan (object):
                 colorbar=True,
                 antialias=True,
                 sameColor=False,
-                legend=None):
+                legend=None,
+                continuation=False):
         self.rr = rr
         self.startTime = startTime
         self.endTime = endTime
@@ -592,6 +700,8 @@ class SteadyStateScan (object):
         self.antialias = antialias
         self.sameColor = sameColor
         self.legend = legend
+        self.continuation = continuation
+        self.solverStats = None
 
 
     def steadyStateSim(self):
@@ -603,21 +713,70 @@ class SteadyStateScan (object):
         if self.endValue is None:
             self.endValue = self.startValue + 5
         interval = (float(self.endValue - self.startValue) / float(self.numberOfPoints - 1))
-        a = []
-        for i in range(len(self.selection) + 1):
-            a.append(0.)
-        result = np.array(a)
-        start = self.startValue
-        for i in range(self.numberOfPoints):
+        values = self.startValue + interval * np.arange(1, self.numberOfPoints + 1)
+        if self.continuation:
+            return self._continuationSim(values)
+
+        result = np.empty((self.numberOfPoints, len(self.selection) + 1))
+        for i, value in enumerate(values):
             self.rr.reset()
-            start += interval
-            self.rr.model[self.value] = start
+            self.rr.model[self.value] = value
             self.rr.steadyState()
-            b = [self.rr.model[self.value]]
-            for i in range(len(self.selection)):
-                b.append(self.rr.model[self.selection[i]])
-            result = np.vstack((result, b))
-        result = np.delete(result, 0, 0)
+            result[i, 0] = self.rr.model[self.value]
+            for k, sid in enumerate(self.selection):
+                result[i, k + 1] = self.rr.model[sid]
+        return result
+
+
+    def _solveSteadyState(self, value, reset):
+        """ Solve for the steady state at the given scan value.
+
+        :return: residual of the steady state solution
+        """
+        if reset:
+            self.rr.reset()
+        self.rr.model[self.value] = value
+        residual = self.rr.steadyState()
+        if residual is not None and not np.isfinite(residual):
+            raise RuntimeError('Steady state solver returned non-finite residual for {} = {}'.format(self.value, value))
+        return residual
+
+
+    def _continuationSim(self, values):
+        """ Steady state scan with warm starts.
+
+        Every solve starts from the steady state of the previous scan point.
+        Only if the solver fails the model is reset and solved again from the
+        initial conditions. The number of solver attempts, the residual and the
+        wall time per point are stored in self.solverStats.
+        Not intended to be called by user.
+        """
+        import time
+        n = len(values)
+        result = np.empty((n, len(self.selection) + 1))
+        stats = {
+            'value': np.asarray(values, dtype=float),
+            'attempts': np.zeros(n, dtype=int),
+            'residual': np.full(n, np.nan),
+            'walltime': np.zeros(n),
+        }
+        for i, value in enumerate(values):
+            t0 = time.time()
+            attempts = 1
+            try:
+                residual = self._solveSteadyState(value, reset=(i == 0))
+            except RuntimeError:
+                # warm start failed, fall back to the initial conditions
+                attempts = 2
+                residual = self._solveSteadyState(value, reset=True)
+            stats['walltime'][i] = time.time() - t0
+            stats['attempts'][i] = attempts
+            if residual is not None:
+                stats['residual'][i] = residual
+            result[i, 0] = self.rr.model[self.value]
+            for k, sid in enumerate(self.selection):
+                result[i, k + 1] = self.rr.model[sid]
+        self.solverStats = stats
         return result
     
 
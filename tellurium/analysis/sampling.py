@@ -0,0 +1,36 @@
+"""
+Sampling designs of the unit cube used by the ensemble and sensitivity analyses.
+"""
+from __future__ import print_function, division, absolute_import
+
+import numpy as np
+
+
+def sampleUnitCube(n, d, sampling="uniform", seed=None):
+    """ Points in the d-dimensional unit cube.
+
+    :param n: number of points
+    :param d: dimension
+    :param sampling: "uniform" (independent random points), "lhs" (Latin hypercube)
+        or "sobol" (scrambled Sobol sequence, requires scipy>=1.7)
+    :param seed: seed of the random number generator
+    :return: array (n, d) with values in (0, 1)
+    """
+    rng = np.random.RandomState(seed)
+    if sampling == "uniform":
+        u = rng.uniform(size=(n, d))
+    elif sampling == "lhs":
+        # one point in every of the n strata per dimension, strata shuffled independently
+        u = (np.arange(n)[:, np.newaxis] + rng.uniform(size=(n, d))) / n
+        for k in range(d):
+            u[:, k] = u[rng.permutation(n), k]
+    elif sampling == "sobol":
+        try:
+            from scipy.stats import qmc
+        except ImportError:
+            raise ImportError("Sobol sampling requires scipy>=1.7")
+        u = qmc.Sobol(d, scramble=True, seed=seed).random(n)
+    else:
+        raise ValueError("Unknown sampling '{}', use 'uniform', 'lhs' or 'sobol'".format(sampling))
+    eps = np.finfo(float).eps
+    return np.clip(u, eps, 1 - eps)
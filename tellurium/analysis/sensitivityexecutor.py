@@ -0,0 +1,334 @@
+"""
+Execution of SensitivityAnalysis objects on interchangeable backends.
+
+The parameter grid of the SensitivityAnalysis is evaluated in chunks. Every
+worker loads the model and the user defined simulation once and reuses them
+for all samples of all chunks it receives. The results of the chunks are
+aggregated as soon as they arrive, the samples are never collected for the
+'avg' and histogram calculations. On spark every partition aggregates its
+chunks on the cluster and the partial aggregates are merged by a tree
+reduction.
+::
+
+    sa = te.SensitivityAnalysis(model=ant)
+    sa.bounds = {'k1': [0.1, 1.0, 10], 'k2': [0.1, 1.0, 10]}
+    sa.simulation = MySimulation()
+    stats = te.SensitivityExecutor(backend='process', workers=4).run(sa, calculation='avg')
+
+The backends are 'serial', 'thread', 'process' (multiprocessing), 'spark'
+(context is a SparkContext) and 'dask' (context is a dask.distributed.Client).
+"""
+from __future__ import print_function, division, absolute_import
+
+import os
+import sys
+import copy
+import uuid
+import inspect
+import functools
+import importlib
+import threading
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+
+import numpy as np
+
+from tellurium.roadrunner.parallel import defaultWorkers, splitChunks
+
+BACKENDS = ['serial', 'thread', 'process', 'spark', 'dask']
+
+# model and simulation of the current worker thread, keyed by task
+_local = threading.local()
+
+
+def sensitivityGrid(sensitivity_analysis_model):
+    """ Parameter grid of the sensitivity analysis.
+
+    The bounds map every parameter to (lower, upper) or (lower, upper, points),
+    with allowLog the bounds are decimal exponents.
+
+    :param sensitivity_analysis_model: SensitivityAnalysis
+    :return: array (samples, parameters) in the order of the bounds
+    """
+    space = np.logspace if sensitivity_analysis_model.allowLog else np.linspace
+    params = []
+    for name, bound_values in sensitivity_analysis_model.bounds.items():
+        if len(bound_values) > 2:
+            params.append(space(bound_values[0], bound_values[1], int(bound_values[2])))
+        elif len(bound_values) == 2:
+            params.append(space(bound_values[0], bound_values[1], 3))
+        else:
+            raise ValueError("Improper boundaries defined for '{}': {}".format(name, bound_values))
+    mesh = np.meshgrid(*params)
+    return np.column_stack([m.ravel() for m in mesh])
+
+
+def loadSimulation(filename):
+    """ Instance of the simulation class defined in a python file.
+
+    The class is the first class of the module providing presimulator and
+    simulator methods. If the file does not exist the module is imported by
+    name, e.g. after it was distributed with SparkContext.addPyFile.
+
+    :param filename: path of the python file
+    :return: simulation instance
+    """
+    name = os.path.splitext(os.path.basename(filename))[0]
+    directory = os.path.dirname(os.path.abspath(filename))
+    if os.path.exists(filename) and directory not in sys.path:
+        sys.path.insert(0, directory)
+    module = importlib.import_module(name)
+    for key in dir(module):
+        value = getattr(module, key)
+        if inspect.isclass(value) and hasattr(value, 'presimulator') and hasattr(value, 'simulator'):
+            return value()
+    raise ValueError("No simulation class with presimulator and simulator in '{}'".format(filename))
+
+
+class _SensitivityTask(object):
+    """ Picklable description of the work, the worker state is built from it once. """
+
+    def __init__(self, sensitivity_analysis_model):
+        sa = sensitivity_analysis_model
+        self.model = sa.model
+        self.sbml = sa.sbml
+        self.conservedMoietyAnalysis = sa.conservedMoietyAnalysis
+        self.names = list(sa.bounds.keys())
+        self.filename = sa.filename
+        self.simulation = sa.simulation if sa.filename is None else None
+        self.key = uuid.uuid4().hex
+
+    def state(self):
+        """ Model and simulation of the current worker thread. """
+        states = getattr(_local, 'states', None)
+        if states is None:
+            states = _local.states = {}
+        if self.key not in states:
+            # long living workers keep only the state of the current task
+            states.clear()
+            import tellurium as te
+            if self.sbml:
+                rr = te.loadSBMLModel(self.model)
+            else:
+                rr = te.loada(self.model)
+            rr.conservedMoietyAnalysis = self.conservedMoietyAnalysis
+            simulation = self.simulation if self.filename is None else loadSimulation(self.filename)
+            states[self.key] = (rr, simulation)
+        return states[self.key]
+
+
+def _evaluateChunk(item):
+    """ Computations of a chunk of samples on the worker model.
+
+    :param item: tuple (offset, task, samples)
+    :return: tuple (offset, list of [parameter dict, computations dict])
+    """
+    offset, task, samples = item
+    rr, simulation = task.state()
+    results = []
+    for values in samples:
+        rr.resetAll()
+        parameters = dict(zip(task.names, (float(v) for v in values)))
+        for name, value in parameters.items():
+            rr[name] = value
+        rr = simulation.presimulator(rr)
+        computations = {}
+        rr = simulation.simulator(rr, computations)
+        results.append([parameters, computations])
+    return offset, results
+
+
+def _aggregatePartition(aggregate, items):
+    """ Partial aggregate of the chunks of a spark partition. """
+    aggregate = copy.deepcopy(aggregate)
+    for item in items:
+        aggregate.update(*_evaluateChunk(item))
+    yield aggregate
+
+
+def _mergeAggregates(a, b):
+    return a.merge(b)
+
+
+class _Collect(object):
+    """ All results in the order of the samples. """
+
+    def __init__(self, n):
+        self.results = [None] * n
+
+    def update(self, offset, results):
+        self.results[offset:offset + len(results)] = results
+
+    def result(self):
+        return self.results
+
+
+class _Average(object):
+    """ Running mean and standard deviation of every computed value (Welford). """
+
+    def __init__(self):
+        self.count = {}
+        self.mean = {}
+        self.m2 = {}
+
+    def update(self, offset, results):
+        for _, computations in results:
+            for key, value in computations.items():
+                value = np.asarray(value, dtype=float)
+                n = self.count.get(key, 0) + 1
+                self.count[key] = n
+                if n == 1:
+                    self.mean[key] = value
+                    self.m2[key] = np.zeros_like(value)
+                    continue
+                delta = value - self.mean[key]
+                self.mean[key] = self.mean[key] + delta / n
+                self.m2[key] = self.m2[key] + delta * (value - self.mean[key])
+
+    def merge(self, other):
+        """ Combines the statistics of disjoint samples (Chan et al.). """
+        for key, nb in other.count.items():
+            na = self.count.get(key, 0)
+            if na == 0:
+                self.count[key] = nb
+                self.mean[key] = other.mean[key]
+                self.m2[key] = other.m2[key]
+                continue
+            n = na + nb
+            delta = other.mean[key] - self.mean[key]
+            self.mean[key] = self.mean[key] + delta * nb / n
+            self.m2[key] = self.m2[key] + other.m2[key] + delta ** 2 * na * nb / n
+            self.count[key] = n
+        return self
+
+    def result(self):
+        stats = {}
+        for key, n in self.count.items():
+            stats[key] = {"mean": self.mean[key], "stdev": np.sqrt(self.m2[key] / n)}
+        return stats
+
+
+class _Histogram(object):
+    """ Number of values of every computed key within the given bins. """
+
+    def __init__(self, bins):
+        self.bins = bins
+        self.counts = {}
+
+    def update(self, offset, results):
+        for _, computations in results:
+            for key, value in computations.items():
+                bins = self.bins[key]
+                counts = self.counts.setdefault(key, [0] * len(bins))
+                for k, (lower, upper) in enumerate(bins):
+                    if lower <= value <= upper:
+                        counts[k] += 1
+
+    def merge(self, other):
+        for key, counts in other.counts.items():
+            total = self.counts.setdefault(key, [0] * len(counts))
+            for k, count in enumerate(counts):
+                total[k] += count
+        return self
+
+    def result(self):
+        return list(self.counts.items())
+
+
+class SensitivityExecutor(object):
+    """ Evaluates the grid of a SensitivityAnalysis on a backend. """
+
+    def __init__(self, backend='process', workers=None, context=None, chunkSize=None):
+        """ Create executor.
+
+        :param backend: 'serial', 'thread', 'process', 'spark' or 'dask'
+        :param workers: number of threads or processes, None uses all CPUs;
+            the number of partitions for spark and dask
+        :param context: SparkContext for 'spark', dask.distributed.Client for 'dask'
+        :param chunkSize: number of samples per work item, None splits the grid
+            into four chunks per worker
+        """
+        if backend not in BACKENDS:
+            raise ValueError("Unknown backend '{}', use one of {}".format(backend, BACKENDS))
+        if backend in ['spark', 'dask'] and context is None:
+            raise ValueError("The '{}' backend requires a context.".format(backend))
+        self.backend = backend
+        self.workers = 1 if backend == 'serial' else defaultWorkers(workers)
+        self.context = context
+        self.chunkSize = chunkSize
+
+    def _items(self, task, samples):
+        n = samples.shape[0]
+        if self.chunkSize is not None:
+            nchunks = int(np.ceil(n / self.chunkSize))
+        else:
+            nchunks = 4 * self.workers if self.workers > 1 else 1
+        return [(i0, task, samples[i0:i1]) for (i0, i1) in splitChunks(n, nchunks)]
+
+    def _imap(self, items):
+        """ Results of _evaluateChunk for all items as they finish. """
+        if self.backend == 'serial' or self.workers == 1 and self.backend in ['thread', 'process']:
+            for item in items:
+                yield _evaluateChunk(item)
+        elif self.backend in ['thread', 'process']:
+            if self.backend == 'thread':
+                pool = ThreadPool(self.workers)
+            else:
+                pool = multiprocessing.Pool(self.workers)
+            try:
+                for result in pool.imap_unordered(_evaluateChunk, items):
+                    yield result
+            finally:
+                pool.terminate()
+                pool.join()
+        elif self.backend == 'spark':
+            for result in self.context.parallelize(items, len(items)).map(_evaluateChunk).collect():
+                yield result
+        else:
+            from dask.distributed import as_completed
+            futures = self.context.map(_evaluateChunk, items, pure=False)
+            for future in as_completed(futures):
+                yield future.result()
+
+    def run(self, sensitivity_analysis_model, calculation=None):
+        """ Evaluate the simulation for all samples of the grid.
+
+        :param sensitivity_analysis_model: SensitivityAnalysis with model, bounds and
+            simulation (an instance or the filename of the simulation class)
+        :param calculation: None returns [parameters, computations] for every sample,
+            'avg' the mean and standard deviation of every computed value and a
+            dictionary of key to list of (lower, upper) bins the counts per bin
+        :return: list or dict depending on calculation
+        """
+        sa = sensitivity_analysis_model
+        if sa.bounds is None:
+            raise ValueError("Bounds are undefined.")
+        if sa.simulation is None and sa.filename is None:
+            raise ValueError("Neither simulation nor filename is defined.")
+
+        task = _SensitivityTask(sa)
+        if self.backend == 'spark' and sa.filename is not None:
+            self.context.addPyFile(sa.filename)
+        samples = sensitivityGrid(sa)
+        if calculation is None:
+            aggregate = _Collect(samples.shape[0])
+        elif calculation == "avg":
+            aggregate = _Average()
+        elif isinstance(calculation, dict):
+            aggregate = _Histogram(calculation)
+        else:
+            raise ValueError("Unknown calculation '{}'".format(calculation))
+
+        try:
+            if self.backend == 'spark' and calculation is not None:
+                # aggregated on the cluster, only the merged statistics are collected
+                items = self._items(task, samples)
+                rdd = self.context.parallelize(items, len(items))
+                aggregate = rdd.mapPartitions(functools.partial(_aggregatePartition, aggregate)) \
+                    .treeReduce(_mergeAggregates)
+            else:
+                for offset, results in self._imap(self._items(task, samples)):
+                    aggregate.update(offset, results)
+        finally:
+            getattr(_local, 'states', {}).pop(task.key, None)
+        return aggregate.result()
@@ -3,3 +3,4 @@ from __future__ import print_function, division, absolute_import
 
 from .factory import getPlottingEngineFactory
 from .api import plot, show, nextFigure, tiledFigure, newTiledFigure, newLowerTriFigure, clearTiledFigure, plot_text
+from .decimation import getDecimation, setDecimation, percentileBands
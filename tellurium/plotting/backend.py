@@ -0,0 +1,50 @@
+"""
+Selection of the matplotlib backend.
+
+The backend is selected on the first use of matplotlib for plotting, not on
+the import of tellurium, so sessions which never plot do not import
+matplotlib. Notebooks and environments without Tkinter use the Agg backend.
+A backend chosen by importing pyplot before is kept.
+"""
+from __future__ import print_function, division, absolute_import
+
+import os
+import sys
+
+_selected = False
+
+
+def selectBackend():
+    """ Select the matplotlib backend once, call before importing pyplot. """
+    global _selected
+    if _selected:
+        return
+    _selected = True
+    if 'matplotlib.pyplot' in sys.modules:
+        return
+
+    ipython = any('IPYTHONDIR' in name for name in os.environ)
+    try:
+        get_ipython()
+        agg = ipython
+    except:
+        try:
+            import Tkinter
+            agg = False
+        except ImportError:
+            agg = True
+
+    if agg:
+        import matplotlib
+        try:
+            matplotlib.use('Agg', warn=False)
+        except TypeError:
+            # matplotlib >= 3.3 has no warn argument
+            matplotlib.use('Agg')
+
+
+def pyplot():
+    """ matplotlib.pyplot with the selected backend. """
+    selectBackend()
+    import matplotlib.pyplot as plt
+    return plt
@@ -0,0 +1,220 @@
+"""
+Decimation of large datasets for plotting.
+
+A line with more points than the figure has pixels looks the same if only the
+extreme values of every pixel column are drawn. Line datasets with more points
+than the point budget are therefore reduced before rendering, with one of the
+methods
+
+* 'minmax': first, last, minimal and maximal point of every bucket (M4)
+* 'lttb': largest triangle three buckets, the point of every bucket spanning
+  the largest triangle with the means of the neighbouring buckets
+
+The buckets are evaluated together on numpy arrays, the time of the
+decimation only grows with the number of points, not with the number of
+Python operations. Ensembles of traces are aggregated into percentile bands
+with :func:`percentileBands`.
+::
+
+    te.plotting.setDecimation(points=2000, method='lttb')
+    te.plotting.setDecimation(points=None)  # render all points
+"""
+from __future__ import print_function, division, absolute_import
+
+import numpy as np
+
+METHODS = ['minmax', 'lttb']
+
+# maximal number of points of a rendered line, None disables the decimation
+__decimation_points = 4000
+__decimation_method = 'minmax'
+
+
+def getDecimation():
+    """ Point budget and method of the decimation.
+
+    :return: tuple (points, method)
+    """
+    return __decimation_points, __decimation_method
+
+
+def setDecimation(points=4000, method='minmax'):
+    """ Set the decimation of line datasets before rendering.
+
+    :param points: maximal number of points per dataset, None disables the decimation
+    :param method: 'minmax' or 'lttb'
+    """
+    global __decimation_points, __decimation_method
+    if method not in METHODS:
+        raise ValueError("Unknown decimation method '{}', use one of {}".format(method, METHODS))
+    if points is not None and points < 3:
+        raise ValueError('The decimation requires at least 3 points, got {}'.format(points))
+    __decimation_points = points
+    __decimation_method = method
+
+
+def _buckets(n, buckets):
+    """ Indices of the inner points 1, ..., n-2 in buckets of equal size.
+
+    :return: array (buckets, size) of indices, -1 pads the last bucket
+    """
+    size = int(np.ceil((n - 2) / buckets))
+    buckets = int(np.ceil((n - 2) / size))
+    index = np.arange(1, 1 + buckets * size)
+    index[index > n - 2] = -1
+    return index.reshape(buckets, size)
+
+
+def decimationIndices(x, y, points=None, method=None):
+    """ Sorted indices of the points kept by the decimation.
+
+    The first and the last point and all points with NaN values (the
+    separators of merged traces) are always kept.
+
+    :param x: x values
+    :param y: y values
+    :param points: approximate number of points to keep, defaults to the point budget
+    :param method: 'minmax' or 'lttb', defaults to the decimation method
+    :return: index array
+    """
+    if points is None and method is None:
+        points, method = getDecimation()
+    elif method is None:
+        method = getDecimation()[1]
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if points is None or n <= points:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=float)
+    if method == 'minmax':
+        index = _buckets(n, max(1, (points - 2) // 4))
+    elif method == 'lttb':
+        index = _buckets(n, max(1, points - 2))
+    else:
+        raise ValueError("Unknown decimation method '{}', use one of {}".format(method, METHODS))
+    valid = index >= 0
+    safe = np.where(valid, index, 0)
+    values = y[safe]
+    finite = valid & np.isfinite(values)
+    rows = np.arange(index.shape[0])
+
+    if method == 'minmax':
+        low = np.where(finite, values, np.inf).argmin(axis=1)
+        high = np.where(finite, values, -np.inf).argmax(axis=1)
+        keep = [index[:, 0], index[rows, valid.sum(axis=1) - 1], index[rows, low], index[rows, high]]
+    else:
+        px = x[safe]
+        finite &= np.isfinite(px)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            count = finite.sum(axis=1)
+            mx = np.where(finite, px, 0).sum(axis=1) / count
+            my = np.where(finite, values, 0).sum(axis=1) / count
+        # the previous selected point is approximated by the mean of the previous
+        # bucket, so all buckets are evaluated at once
+        ax = np.concatenate([[x[0]], mx[:-1]])[:, None]
+        ay = np.concatenate([[y[0]], my[:-1]])[:, None]
+        cx = np.concatenate([mx[1:], [x[-1]]])[:, None]
+        cy = np.concatenate([my[1:], [y[-1]]])[:, None]
+        with np.errstate(invalid='ignore'):
+            area = np.abs((ax - cx) * (values - ay) - (ax - px) * (cy - ay))
+        area = np.where(finite & np.isfinite(area), area, -1.0)
+        keep = [index[rows, area.argmax(axis=1)]]
+
+    separators = np.flatnonzero(np.isnan(x) | np.isnan(y))
+    return np.unique(np.concatenate([[0, n - 1], separators] + keep)).astype(int)
+
+
+def decimate(x, y, points=None, method=None):
+    """ Decimated x and y values, see :func:`decimationIndices`.
+
+    :return: tuple (x, y)
+    """
+    index = decimationIndices(x, y, points=points, method=method)
+    return np.asarray(x)[index], np.asarray(y)[index]
+
+
+def decimateRows(m, points=None):
+    """ Rows of a time course kept by the 'minmax' decimation of any column.
+
+    The extreme values are kept, so decimating the decimated rows of several
+    chunks together gives the extreme values of the complete time course.
+
+    :param m: array with x values in the first column
+    :param points: approximate number of points per column, defaults to the point budget
+    :return: array of the kept rows
+    """
+    if points is None:
+        points = getDecimation()[0]
+    if points is None or m.shape[0] <= points:
+        return m
+    index = np.unique(np.concatenate([decimationIndices(m[:, 0], m[:, k], points=points, method='minmax')
+                                      for k in range(1, m.shape[1])] or [np.arange(m.shape[0])]))
+    return m[index]
+
+
+def decimateDataset(dataset, points=None, method=None):
+    """ Dataset of a PlottingFigure with decimated arrays.
+
+    Only line datasets are decimated, markers and text are kept. The error
+    bars and the upper bounds of bands are reduced to the same points, the
+    extreme values of the bounds are kept.
+
+    :param dataset: dictionary with 'x', 'y' and optional keys
+    :return: the dataset or a decimated copy
+    """
+    if points is None and method is None:
+        points, method = getDecimation()
+    if points is None or dataset.get('text') is not None or dataset.get('scatter') \
+            or dataset.get('mode') not in [None, 'lines']:
+        return dataset
+    n = len(dataset['y'])
+    if n <= points or len(dataset['x']) != n:
+        return dataset
+
+    index = decimationIndices(dataset['x'], dataset['y'], points=points, method=method)
+    if dataset.get('fill') is not None:
+        index = np.union1d(index, decimationIndices(dataset['x'], dataset['fill'], points=points, method=method))
+    result = dict(dataset)
+    for key in ['x', 'y', 'fill', 'error_y_pos', 'error_y_neg']:
+        value = dataset.get(key)
+        if value is not None and np.ndim(value) > 0 and len(value) == n:
+            result[key] = np.asarray(value)[index]
+    return result
+
+
+def resampleTraces(x, traces):
+    """ Values of traces with their own time points at x.
+
+    Every trace is evaluated as step function (the last value at or before x),
+    as for stochastic simulations. Values before the first time point are NaN.
+
+    :param x: time points
+    :param traces: list of (t, y) with increasing t
+    :return: array (traces, len(x))
+    """
+    x = np.asarray(x, dtype=float)
+    result = np.empty((len(traces), len(x)))
+    for k, (t, y) in enumerate(traces):
+        y = np.asarray(y, dtype=float)
+        i = np.searchsorted(np.asarray(t, dtype=float), x, side='right') - 1
+        result[k] = np.where(i >= 0, y[np.clip(i, 0, len(y) - 1)], np.nan)
+    return result
+
+
+def percentileBands(x, traces, percentiles=(5, 25, 50, 75, 95)):
+    """ Percentiles of an ensemble of traces at every x.
+
+    :param x: x values
+    :param traces: array (traces, len(x)) of the values at x or list of
+        (t, y) traces with their own time points (see :func:`resampleTraces`)
+    :param percentiles: percentiles in [0, 100]
+    :return: array (len(percentiles), len(x))
+    """
+    if isinstance(traces, np.ndarray) and traces.ndim == 2:
+        values = traces
+    else:
+        values = resampleTraces(x, traces)
+    if values.shape[1] != len(x):
+        raise ValueError('The traces have {} values, but x has {}'.format(values.shape[1], len(x)))
+    return np.nanpercentile(values, percentiles, axis=0)
@@ -8,9 +8,10 @@ from __future__ import print_function, division, absolute_import
 from collections import defaultdict
 import itertools
 import numpy as np
-from functools import reduce
 import abc
 
+from .decimation import getDecimation, decimateDataset, decimateRows, percentileBands
+
 
 def filterWithSelections(self, name, selections):
     """ This function is intended to be used as an argument to the filter built-in.
@@ -27,6 +28,34 @@ def filterWithSelections(self, name, selections):
         return True
 
 
+def timecourseData(m):
+    """ Array and column names of a timecourse.
+
+    The chunks of a stream are decimated while they are consumed (see
+    :func:`tellurium.plotting.decimation.decimateRows`), only the complete
+    stream is kept if the decimation is disabled.
+
+    :param m: An array returned by RoadRunner.simulate or a simulation stream
+              returned by RoadRunner.simulateStream, which is consumed chunk by chunk.
+    :return: tuple (array, colnames)
+    """
+    if isinstance(m, np.ndarray):
+        return m, m.colnames
+    points = getDecimation()[0]
+    kept = np.empty((0, len(m.colnames)))
+    chunks = []
+    for chunk in m:
+        if points is None:
+            chunks.append(chunk)
+            continue
+        kept = np.concatenate([kept, chunk])
+        if kept.shape[0] > 4 * points:
+            kept = decimateRows(kept, points=points)
+    if chunks:
+        kept = np.concatenate(chunks)
+    return kept, m.colnames
+
+
 class PlottingEngine(object):
     """ Abstract parent class of all PlottingEngines.
 
@@ -65,13 +94,14 @@ class PlottingEngine(object):
     def figureFromTimecourse(self, m, ordinates=None, tag=None, alpha=None, title=None, xlim=None, ylim=None, **kwargs):
         """ Generate a new figure from a timecourse simulation.
 
-        :param m: An array returned by RoadRunner.simulate.
+        :param m: An array returned by RoadRunner.simulate or a simulation stream.
         :return: instance of PlottingFigure
         """
         fig = self.newFigure()
+        m, colnames = timecourseData(m)
 
         for k in range(1, m.shape[1]):
-            fig.addXYDataset(m[:,0], m[:,k], name=m.colnames[k], tag=tag, alpha=alpha)
+            fig.addXYDataset(m[:,0], m[:,k], name=colnames[k], tag=tag, alpha=alpha)
 
         return fig
 
@@ -152,17 +182,18 @@ class PlottingEngine(object):
         """ Accumulates the traces instead of plotting (like matplotlib with show=False).
         Call show() to show the plot.
 
-        :param m: An array returned by RoadRunner.simulate.
+        :param m: An array returned by RoadRunner.simulate or a simulation stream.
         """
         if not self.fig:
             self.fig = self.newFigure()
 
-        if m.colnames[0] != 'time':
+        m, colnames = timecourseData(m)
+        if colnames[0] != 'time':
             raise RuntimeError('Cannot plot timecourse - first column is not time')
 
         for k in range(1,m.shape[1]):
-            t = tag if tag else m.colnames[k]
-            self.fig.addXYDataset(m[:,0], m[:, k], name=m.colnames[k], tag=t, alpha=alpha)
+            t = tag if tag else colnames[k]
+            self.fig.addXYDataset(m[:,0], m[:, k], name=colnames[k], tag=t, alpha=alpha)
 
         if xtitle:
             self.fig.xtitle = xtitle
@@ -252,7 +283,7 @@ class PlottingFigure(object):
         :return:
         """
 
-    def addXYDataset(self, x_arr, y_arr, color=None, tag=None, name=None, filter=True, alpha=None, mode=None, logx=None, logy=None, scatter=None, error_y_pos=None, error_y_neg=None, showlegend=None, text=None, dash=None):
+    def addXYDataset(self, x_arr, y_arr, color=None, tag=None, name=None, filter=True, alpha=None, mode=None, logx=None, logy=None, scatter=None, error_y_pos=None, error_y_neg=None, showlegend=None, text=None, dash=None, fill=None):
         """ Adds an X/Y dataset to the plot.
 
         :param x_arr: A numpy array describing the X datapoints. Should have the same size as y_arr.
@@ -263,6 +294,7 @@ class PlottingFigure(object):
         :param filter: Apply the self.selections filter?
         :param alpha: Floating point representing the opacity.
         :param mode: Either 'lines' or 'markers' (defaults to 'lines').
+        :param fill: Upper values of a band, the area between y_arr and fill is filled.
         """
         if filter and name is not None and self.selections is not None:
             # if this name is filtered out, return
@@ -297,21 +329,26 @@ class PlottingFigure(object):
             dataset['text'] = text
         if dash is not None:
             dataset['dash'] = dash
+        if fill is not None:
+            dataset['fill'] = fill
         self.xy_datasets.append(dataset)
 
     def getMergedTaggedDatasets(self):
         for datasets_for_tag in self.tagged_data.values():
-            x = reduce(lambda u,v: np.concatenate((u,[np.nan],v)), (dataset['x'] for dataset in datasets_for_tag))
-            y = reduce(lambda u,v: np.concatenate((u,[np.nan],v)), (dataset['y'] for dataset in datasets_for_tag))
+            if not datasets_for_tag:
+                continue
+            # concatenate all traces at once, separated by NaN
+            separator = [np.nan]
+            x = np.concatenate([part for dataset in datasets_for_tag for part in (separator, dataset['x'])][1:])
+            y = np.concatenate([part for dataset in datasets_for_tag for part in (separator, dataset['y'])][1:])
             # merge all datasets
-            result_dataset = datasets_for_tag[0] if datasets_for_tag else None
+            result_dataset = {}
             for dataset in datasets_for_tag:
                 result_dataset.update(dataset)
             # use the concatenated values for x and y
             result_dataset['x'] = x
             result_dataset['y'] = y
-            if result_dataset is not None:
-                yield result_dataset
+            yield result_dataset
 
     def getDatasets(self):
         """ Get an iterable of all datasets."""
@@ -319,6 +356,43 @@ class PlottingFigure(object):
             self.getMergedTaggedDatasets(),
             (dataset for dataset in self.xy_datasets if not 'tag' in dataset))
 
+    def getRenderDatasets(self, points=None, method=None):
+        """ Get an iterable of all datasets reduced for rendering.
+
+        Line datasets with more points than the point budget are decimated,
+        see :mod:`tellurium.plotting.decimation`.
+
+        :param points: point budget, defaults to the global setting
+        :param method: decimation method, defaults to the global setting
+        """
+        return (decimateDataset(dataset, points=points, method=method) for dataset in self.getDatasets())
+
+    def addPercentileBands(self, x, traces, percentiles=(5, 25, 50, 75, 95), color=None, name=None, alpha=0.2, tag=None):
+        """ Adds an ensemble of traces as percentile bands.
+
+        Pairs of percentiles (first and last, second and second last, ...) are
+        filled bands, an odd middle percentile (the median) is drawn as line.
+        ::
+
+            fig = te.nextFigure()
+            fig.addPercentileBands(t, ensemble, color='blue', name='S1')
+            fig.render()
+
+        :param x: x values
+        :param traces: array (traces, len(x)) or list of (t, y) traces with their own time points
+        :param percentiles: increasing percentiles in [0, 100]
+        :param color: color of the bands and the line
+        :param name: name of the line
+        :param alpha: opacity of the bands
+        :param tag: tag of the line
+        """
+        bands = percentileBands(x, traces, percentiles=percentiles)
+        k = len(percentiles)
+        for i in range(k // 2):
+            self.addXYDataset(x, bands[i], color=color, alpha=alpha, fill=bands[k - 1 - i], showlegend=False)
+        if k % 2:
+            self.addXYDataset(x, bands[k // 2], color=color, name=name, tag=tag)
+
     def plot(self, x, y, colnames=None, title=None, xtitle=None, logx=None, logy=None, ytitle=None, alpha=None, name=None, names=None, tag=None, tags=None, scatter=None, error_y_pos=None, error_y_neg=None, showlegend=None, label=None, labels=None, text=None, dash=None, color=None):
         """ Plot x & y data.
         """
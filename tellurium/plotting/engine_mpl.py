@@ -5,10 +5,18 @@ from __future__ import absolute_import, print_function, division
 
 
 from .engine import PlottingEngine, PlottingFigure, PlottingLayout
+from .backend import selectBackend
+from ..utils.profiling import timed
 
 import os
+import itertools
+from collections import OrderedDict
+import numpy as np
+selectBackend()
 import matplotlib.pyplot as plt
 from matplotlib import gridspec
+from matplotlib.collections import LineCollection
+from matplotlib.lines import Line2D
 from tempfile import mkstemp
 
 # enable fixes for non-IPython environment
@@ -36,12 +44,32 @@ class MatplotlibEngine(PlottingEngine):
         return fig
 
 
+def lineSegments(x, y):
+    """ Segments of a line split at the NaN values, where plt.plot interrupts the line.
+
+    :return: list of arrays (points, 2)
+    """
+    xy = np.column_stack([np.asarray(x, dtype=float), np.asarray(y, dtype=float)])
+    missing = np.isnan(xy).any(axis=1)
+    if not missing.any():
+        return [xy]
+    segments = np.split(xy, np.flatnonzero(missing))
+    return [segment[~np.isnan(segment).any(axis=1)] for segment in segments if len(segment) > 1]
+
+
 class MatplotlibFigure(PlottingFigure):
-    """ MatplotlibFigure. """
+    """ MatplotlibFigure.
+
+    By default the datasets are rendered in batches: all lines of one style
+    are drawn as a single LineCollection and all markers of one style as a
+    single scatter, the legend shows one entry per named dataset. With
+    batch=False every dataset is drawn with its own plt.plot call.
+    """
 
     def __init__(self, layout=PlottingLayout(), use_legend=True, xtitle=None, ytitle=None, title=None, 
                  linewidth=None, xlim=None, ylim=None, logx=None, logy=None, xscale=None, yscale=None, 
-                 grid=None, ordinates=None, tag=None, labels=None, figsize=(9,6), savefig=None, dpi=None):
+                 grid=None, ordinates=None, tag=None, labels=None, figsize=(9,6), savefig=None, dpi=None,
+                 batch=True):
         super(MatplotlibFigure, self).__init__(title=title, layout=layout,
                                                xtitle=xtitle, ytitle=ytitle, logx=logx, logy=logy)
         self.use_legend = use_legend
@@ -55,40 +83,16 @@ class MatplotlibFigure(PlottingFigure):
         self.figsize = figsize
         self.savefig = savefig
         self.dpi = dpi
+        self.batch = batch
 
+    @timed('plot.render')
     def render(self):
         """ Plot the figure. Call this last."""
         fig, ax = plt.subplots(num=None, figsize=self.figsize, facecolor='w', edgecolor='k')
-        have_labels = False
-        show_legend = False # override self.use_legend if user called plot with showlegend=True
-        for dataset in self.getDatasets():
-            kwargs = {}
-            if 'name' in dataset:
-                kwargs['label'] = dataset['name']
-                have_labels = True
-            if 'color' in dataset:
-                kwargs['color'] = dataset['color']
-            if 'alpha' in dataset and dataset['alpha'] is not None:
-                kwargs['alpha'] = dataset['alpha']
-            if 'showlegend' in dataset and dataset['showlegend'] is not None:
-                show_legend = dataset['showlegend']
-            if 'color' in dataset and dataset['color'] is not None:
-                kwargs['color'] = dataset['color']
-            scatter = False
-            marker = ''
-            if 'mode' in dataset and dataset['mode'] is not None:
-                if dataset['mode'] == 'markers':
-                    scatter = True
-                    marker = ''
-            if 'dash' in dataset and dataset['dash'] is not None:
-                kwargs['dashes'] = [4,2]
-            if  'text' in dataset and dataset['text'] is not None:
-                for x,y,t in zip(dataset['x'], dataset['y'], dataset['text']):
-                    plt.text(x, y, t, bbox=dict(facecolor='white', alpha=1))
-            elif not scatter:
-                plt.plot(dataset['x'], dataset['y'], marker=marker, linewidth=self.linewidth, **kwargs)
-            else:
-                plt.scatter(dataset['x'], dataset['y'], **kwargs)
+        if self.batch:
+            have_labels, show_legend, handles = self._renderBatched(ax)
+        else:
+            have_labels, show_legend, handles = self._renderDatasets(ax)
 
         # TODO: data as points
 
@@ -124,12 +128,15 @@ class MatplotlibFigure(PlottingFigure):
 
         # legend
         if (self.use_legend and have_labels) or show_legend:
+            legend_kwargs = {}
+            if handles is not None:
+                legend_kwargs['handles'] = handles
             if not IPYTHON:
-                legend = plt.legend()
+                legend = plt.legend(**legend_kwargs)
             else:
                 # legend = plt.legend(bbox_to_anchor=(1.0, 0.5), loc='center left', borderaxespad=1.)
                 # legend = plt.legend(bbox_to_anchor=(0.0, 1.02, 1., .102), ncol=2, loc='best', borderaxespad=0.)
-                legend = plt.legend(ncol=1, loc='best', borderaxespad=0.)
+                legend = plt.legend(ncol=1, loc='best', borderaxespad=0., **legend_kwargs)
             # legend.draw_frame(False)
             legend.draw_frame(True)
 
@@ -142,6 +149,113 @@ class MatplotlibFigure(PlottingFigure):
 
         return fig
 
+    def _renderDatasets(self, ax):
+        """ Draw every dataset with its own call.
+
+        :return: tuple (have_labels, show_legend, None)
+        """
+        have_labels = False
+        show_legend = False # override self.use_legend if user called plot with showlegend=True
+        for dataset in self.getRenderDatasets():
+            kwargs = {}
+            if 'name' in dataset:
+                kwargs['label'] = dataset['name']
+                have_labels = True
+            if 'color' in dataset:
+                kwargs['color'] = dataset['color']
+            if 'alpha' in dataset and dataset['alpha'] is not None:
+                kwargs['alpha'] = dataset['alpha']
+            if 'showlegend' in dataset and dataset['showlegend'] is not None:
+                show_legend = dataset['showlegend']
+            if 'color' in dataset and dataset['color'] is not None:
+                kwargs['color'] = dataset['color']
+            scatter = False
+            marker = ''
+            if 'mode' in dataset and dataset['mode'] is not None:
+                if dataset['mode'] == 'markers':
+                    scatter = True
+                    marker = ''
+            if 'dash' in dataset and dataset['dash'] is not None:
+                kwargs['dashes'] = [4,2]
+            if 'fill' in dataset and dataset['fill'] is not None:
+                ax.fill_between(dataset['x'], dataset['y'], dataset['fill'], linewidth=0, **kwargs)
+            elif 'text' in dataset and dataset['text'] is not None:
+                for x,y,t in zip(dataset['x'], dataset['y'], dataset['text']):
+                    plt.text(x, y, t, bbox=dict(facecolor='white', alpha=1))
+            elif not scatter:
+                plt.plot(dataset['x'], dataset['y'], marker=marker, linewidth=self.linewidth, **kwargs)
+            else:
+                plt.scatter(dataset['x'], dataset['y'], **kwargs)
+        return have_labels, show_legend, None
+
+    def _renderBatched(self, ax):
+        """ Draw the datasets grouped by style.
+
+        The default colors follow the color cycle of matplotlib like
+        individual plt.plot (lines) and plt.scatter/fill_between (markers,
+        bands) calls, so the figure looks the same as with batch=False.
+
+        :return: tuple (have_labels, show_legend, legend handles)
+        """
+        have_labels = False
+        show_legend = False # override self.use_legend if user called plot with showlegend=True
+        cycle = plt.rcParams['axes.prop_cycle'].by_key().get('color', ['C0'])
+        line_colors = itertools.cycle(cycle)
+        patch_colors = itertools.cycle(cycle)
+        linewidth = self.linewidth or plt.rcParams['lines.linewidth']
+        lines = OrderedDict()
+        markers = OrderedDict()
+        handles = []
+        for dataset in self.getRenderDatasets():
+            name = dataset.get('name')
+            if 'name' in dataset:
+                have_labels = True
+            if 'showlegend' in dataset and dataset['showlegend'] is not None:
+                show_legend = dataset['showlegend']
+            color = dataset.get('color')
+            alpha = dataset.get('alpha')
+            dashed = dataset.get('dash') is not None
+
+            if 'fill' in dataset and dataset['fill'] is not None:
+                band = ax.fill_between(dataset['x'], dataset['y'], dataset['fill'], linewidth=0, label=name,
+                                       color=color if color is not None else next(patch_colors), alpha=alpha)
+                if name is not None:
+                    handles.append(band)
+            elif 'text' in dataset and dataset['text'] is not None:
+                # annotations have no collection, create the texts without pyplot lookups
+                bbox = dict(facecolor='white', alpha=1)
+                for x, y, t in zip(np.asarray(dataset['x']).tolist(), np.asarray(dataset['y']).tolist(), dataset['text']):
+                    ax.text(x, y, t, bbox=bbox)
+            elif dataset.get('mode') == 'markers':
+                if color is None:
+                    color = next(patch_colors)
+                markers.setdefault((color, alpha), []).append((dataset['x'], dataset['y']))
+                if name is not None:
+                    handles.append(Line2D([], [], linestyle='', marker='o', color=color, alpha=alpha, label=name))
+            else:
+                if color is None:
+                    color = next(line_colors)
+                lines.setdefault((color, alpha, dashed), []).extend(lineSegments(dataset['x'], dataset['y']))
+                if name is not None:
+                    handle = Line2D([], [], color=color, alpha=alpha, linewidth=linewidth, label=name)
+                    if dashed:
+                        handle.set_dashes([4, 2])
+                    handles.append(handle)
+
+        for (color, alpha, dashed), segments in lines.items():
+            style = 'dash' if dashed else 'solid'
+            collection = LineCollection(segments, colors=[color], linewidths=linewidth, alpha=alpha,
+                                        linestyles=[(0, (4, 2))] if dashed else 'solid', zorder=2,
+                                        capstyle=plt.rcParams['lines.{}_capstyle'.format(style)],
+                                        joinstyle=plt.rcParams['lines.{}_joinstyle'.format(style)])
+            ax.add_collection(collection, autolim=True)
+        for (color, alpha), points in markers.items():
+            ax.scatter(np.concatenate([np.asarray(x, dtype=float) for x, _ in points]),
+                       np.concatenate([np.asarray(y, dtype=float) for _, y in points]), color=color, alpha=alpha)
+        if lines:
+            ax.autoscale_view()
+        return have_labels, show_legend, handles
+
     def save(self, filename, format):
         fig = self.render()
         fig.savefig(filename, format=format)
@@ -1,13 +1,17 @@
 """
-Plotly implementation of the plotting engine.
+Null implementation of the plotting engine.
+
+Used if plotting is disabled (see tellurium.disablePlotting). All plot calls
+return immediately, no datasets are extracted from the data and no figures
+are rendered.
 """
 from __future__ import print_function, absolute_import
 
-from .engine import PlottingEngine, PlottingFigure, PlottingLayout, filterWithSelections, TiledFigure, LowerTriFigure
+from .engine import PlottingEngine, PlottingFigure, PlottingLayout, TiledFigure, LowerTriFigure
 
 
 class NullEngine(PlottingEngine):
-    """ PlottingEngine using plotly. """
+    """ PlottingEngine which does not plot. """
 
     def __init__(self):
         PlottingEngine.__init__(self)
@@ -19,41 +23,75 @@ class NullEngine(PlottingEngine):
         """ Returns a figure object."""
         return NullFigure(title=title, layout=layout, xtitle=xtitle, ytitle=ytitle)
 
+    def newStackedFigure(self, title=None, logX=False, logY=False, layout=PlottingLayout(), xtitle=None, ytitle=None):
+        return self.newFigure(title=title, layout=layout, xtitle=xtitle, ytitle=ytitle)
+
     def newTiledFigure(self, title=None, rows=None, cols=None):
         return NullTiledFigure(engine=self, rows=rows, cols=cols)
 
     def newLowerTriFigure(self, title=None, rows=None, cols=None):
         return NullLowerTriFigure(engine=self, rows=rows, cols=cols)
 
+    def figureFromXY(self, x, y, **kwargs):
+        return self.newFigure()
+
+    def figureFromTimecourse(self, m, **kwargs):
+        return self.newFigure()
+
+    def plot(self, x, y, show=True, **kwargs):
+        return self.newFigure()
+
+    def plot_text(self, x, y, text, show=True, **kwargs):
+        return self.newFigure()
+
+    def plotTimecourse(self, m, **kwargs):
+        pass
+
+    def accumulateTimecourse(self, m, **kwargs):
+        pass
+
+    def show(self, reset=True):
+        return None
+
 
 class NullFigure(PlottingFigure):
-    """ PlotlyFigure. """
+    """ Figure which ignores its datasets. """
 
     def __init__(self, title=None, layout=PlottingLayout(), logx=False, logy=False, save_to_pdf=False, xtitle=None, ytitle=None):
         super(NullFigure, self).__init__(title=title, layout=layout, logx=logx, xtitle=xtitle, logy=logy, ytitle=ytitle)
 
+    def addXYDataset(self, x_arr, y_arr, **kwargs):
+        pass
+
+    def addPercentileBands(self, x, traces, **kwargs):
+        pass
+
+    def plot(self, x, y, **kwargs):
+        return self
+
     def render(self):
         pass
 
     def save(self, filename, format):
-        # FIXME: implement
-        raise NotImplementedError
-
+        pass
 
 
-class PlotlyTiledFigure(TiledFigure):
+class NullTiledFigure(TiledFigure):
     def __init__(self, engine, rows, cols):
-        pass
+        self.engine = engine
+        self.rows = rows
+        self.cols = cols
 
     def nextFigure(self, *args, **kwargs):
-        pass
+        return self.engine.newFigure()
+
+    def isExhausted(self):
+        return False
 
     def renderIfExhausted(self):
-        pass
+        return False
 
-class PlotlyLowerTriFigure(PlotlyTiledFigure,LowerTriFigure):
-    def makeTitles(self):
-        pass
 
-    def renderIfExhausted(self):
+class NullLowerTriFigure(NullTiledFigure, LowerTriFigure):
+    def makeTitles(self):
         pass
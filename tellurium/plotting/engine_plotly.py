@@ -1,14 +1,69 @@
 """
 Plotly implementation of the plotting engine.
+
+Figures with many points are drawn with WebGL (Scattergl) instead of SVG.
+Evenly spaced x values, e.g. the time points of a simulation, are sent as
+x0 and dx instead of an array, and with plotly.js >= 2.28 all other arrays are
+sent as base64 encoded typed arrays instead of lists of JSON numbers.
 """
 from __future__ import print_function, absolute_import
 
 from .engine import PlottingEngine, PlottingFigure, PlottingLayout, filterWithSelections, TiledFigure, LowerTriFigure
+from ..utils.profiling import timed
+import base64
 import numpy as np
 import plotly
-from plotly.graph_objs import Scatter, Scatter3d, Layout, Data, Marker
+from plotly.graph_objs import Scatter, Scattergl, Scatter3d, Layout, Data, Marker
 from plotly import tools
 
+# figures with more points are drawn with WebGL, None always uses SVG
+WEBGL_THRESHOLD = 100000
+
+
+def _plotlyVersion():
+    try:
+        return tuple(int(v) for v in plotly.__version__.split('.')[:2])
+    except ValueError:
+        return (0, 0)
+
+
+# plotly.py >= 5.18 bundles plotly.js >= 2.28, which decodes typed arrays
+BINARY_ARRAYS = _plotlyVersion() >= (5, 18)
+
+
+def encodeArray(values):
+    """ Typed array of plotly.js with the base64 encoded float64 values. """
+    values = np.ascontiguousarray(values, dtype='<f8')
+    return {'dtype': 'f8', 'bdata': base64.b64encode(values.tobytes()).decode('ascii')}
+
+
+def _arrayKey(values):
+    """ Key of the memory of an array, views of the same column have the same key. """
+    if isinstance(values, np.ndarray):
+        return values.__array_interface__['data'][0], values.shape, values.strides, values.dtype.str
+    return id(values)
+
+
+def uniformSpacing(x):
+    """ Start and step of evenly spaced values.
+
+    :param x: values
+    :return: tuple (x0, dx) or None if the values are not evenly spaced or
+        not finite (e.g. the NaN separators of tagged datasets)
+    """
+    x = np.asarray(x)
+    if x.ndim != 1 or len(x) < 2 or not np.issubdtype(x.dtype, np.number):
+        return None
+    x = x.astype(float)
+    if not np.isfinite(x).all():
+        return None
+    dx = (x[-1] - x[0]) / (len(x) - 1)
+    if not np.isfinite(dx) or dx == 0:
+        return None
+    if np.max(np.abs(x - (x[0] + dx * np.arange(len(x))))) > 1E-6 * abs(dx):
+        return None
+    return float(x[0]), float(dx)
+
 
 class PlotlyEngine(PlottingEngine):
     """ PlottingEngine using plotly. """
@@ -39,6 +94,10 @@ class PlotlyFigure(PlottingFigure):
 
     def __init__(self, title=None, layout=PlottingLayout(), logx=False, logy=False, save_to_pdf=False, xtitle=None, ytitle=None):
         super(PlotlyFigure, self).__init__(title=title, layout=layout, logx=logx, xtitle=xtitle, logy=logy, ytitle=ytitle)
+        # number of points above which WebGL is used, None for SVG only
+        self.webgl_threshold = WEBGL_THRESHOLD
+        # send arrays as typed arrays if plotly supports it
+        self.binary = True
 
     def getArgsForDataset(self, dataset):
         kwargs = {}
@@ -78,24 +137,70 @@ class PlotlyFigure(PlottingFigure):
             )
         return kwargs
 
-    def getScatterGOs(self):
-        for dataset in self.getDatasets():
-            yield Scatter(
-                x = dataset['x'],
-                y = dataset['y'],
-                **self.getArgsForDataset(dataset)
-            )
+    def getTraces(self, binary=False):
+        """ Traces of the datasets as dictionaries.
+
+        Figures with more than webgl_threshold points use 'scattergl' traces.
+        The x values are sent once per array: evenly spaced values as x0 and
+        dx, all other arrays are encoded once even if several traces use them.
+
+        :param binary: send the arrays as base64 encoded typed arrays
+        :return: generator of trace dictionaries
+        """
+        datasets = list(self.getRenderDatasets())
+        webgl = self.webgl_threshold is not None and \
+            sum(np.size(dataset['y']) for dataset in datasets) > self.webgl_threshold
+        trace_type = 'scattergl' if webgl else 'scatter'
+        arrays = {}
+        xvalues = {}
+
+        def array(values):
+            key = _arrayKey(values)
+            if key not in arrays:
+                arrays[key] = encodeArray(values) if binary else values
+            return arrays[key]
+
+        def xValues(x):
+            key = _arrayKey(x)
+            if key not in xvalues:
+                spacing = uniformSpacing(x)
+                xvalues[key] = {'x0': spacing[0], 'dx': spacing[1]} if spacing else {'x': array(x)}
+            return xvalues[key]
 
+        for dataset in datasets:
+            trace = {'type': trace_type}
+            trace.update(xValues(dataset['x']))
+            trace.update(self.getArgsForDataset(dataset))
+            trace['y'] = array(dataset['y'])
+            if 'fill' in dataset and dataset['fill'] is not None:
+                # band: invisible lower line, upper line filled to the lower one
+                trace['showlegend'] = False
+                trace['line'] = {'width': 0}
+                yield trace
+                trace = dict(trace, y=array(dataset['fill']), fill='tonexty')
+                if 'color' in dataset and dataset['color'] is not None:
+                    trace['fillcolor'] = dataset['color']
+            yield trace
 
+    def getScatterGOs(self):
+        for trace in self.getTraces():
+            trace = dict(trace)
+            if trace.pop('type') == 'scattergl':
+                yield Scattergl(**trace)
+            else:
+                yield Scatter(**trace)
+
+    @timed('plot.render')
     def render(self):
         """ Plot the figure. Call this last."""
-        traces = list(self.getScatterGOs())
+        traces = list(self.getTraces(binary=self.binary and BINARY_ARRAYS))
 
-        data = Data(traces)
+        # the traces are built from validated settings, the typed arrays are
+        # not accepted by the validation of older plotly versions
         plotly.offline.iplot({
-            'data': data,
+            'data': traces,
             'layout': self.makeLayout()
-        })
+        }, validate=False)
 
     def save(self, filename, format):
         # FIXME: implement
@@ -137,6 +242,7 @@ class PlotlyStackedFigure(PlotlyFigure):
         super(PlotlyStackedFigure, self).__init__(title=title, layout=layout, logx=logx, logy=logy)
         self.zindex = 0
 
+    @timed('plot.render')
     def render(self):
         """ Plot the figure. Call this last."""
         traces = []
@@ -1,31 +1,46 @@
 """
 Factory for the engines.
+
+The engines are imported when they are created, so importing the plotting
+package does not import matplotlib or plotly.
 """
 
 from __future__ import absolute_import, print_function
 
-from .engine_null import NullEngine
-__engines = {'null': NullEngine}
+import importlib
+
+# module and class of the engines
+__engines = {
+    'null': ('.engine_null', 'NullEngine'),
+    'matplotlib': ('.engine_mpl', 'MatplotlibEngine'),
+    'plotly': ('.engine_plotly', 'PlotlyEngine'),
+}
+
 
-from .engine_mpl import MatplotlibEngine
-__engines['matplotlib'] = MatplotlibEngine
+def getEngine(engine):
+    """ Class of the engine, raises ImportError if the engine is not available.
+
+    :param engine: name of the engine
+    """
+    module, name = __engines[engine]
+    return getattr(importlib.import_module(module, __package__), name)
 
-try:
-    from .engine_plotly import PlotlyEngine
-    __engines['plotly'] = PlotlyEngine
-except ImportError:
-    pass
 
 def getEngines():
-    global __engines
-    return __engines
+    """ Dictionary of the available engine classes, imports all engines. """
+    engines = {}
+    for engine in __engines:
+        try:
+            engines[engine] = getEngine(engine)
+        except ImportError:
+            pass
+    return engines
 
 
 class PlottingEngineFactory:
     def __init__(self, engine):
         self.engine = engine
         self.save_plots_to_pdf = False
-        self.engines = getEngines()
 
     def __call__(self):
         """ Creates a plotting engine based on passed argument.
@@ -38,11 +53,11 @@ class PlottingEngineFactory:
             'plotly',
             'null'
         ]
+        if not self.engine in possible_keys:
+            raise RuntimeError('No such plotting engine "{}". Possible values are {}.'.format(self.engine, ', '.join(possible_keys)))
         try:
-            return self.engines[self.engine]()
-        except KeyError:
-            if not self.engine in possible_keys:
-                raise RuntimeError('No such plotting engine "{}". Possible values are {}.'.format(self.engine, ', '.join(possible_keys)))
+            return getEngine(self.engine)()
+        except ImportError:
             raise RuntimeError('Could not create plotting engine because {} is not available.'.format(self.engine))
 
 factories = {}
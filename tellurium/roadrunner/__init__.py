@@ -1,2 +1,3 @@
 from __future__ import print_function, division, absolute_import
 from .extended_roadrunner import ExtendedRoadRunner
+from .model_cache import ModelCache, modelKey
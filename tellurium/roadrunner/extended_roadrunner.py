@@ -7,6 +7,8 @@ import os
 import roadrunner
 import warnings
 import copy
+
+from ..utils.profiling import timed
 # ---------------------------------------------------------------------
 # Extended RoadRunner class
 # ---------------------------------------------------------------------
@@ -339,13 +341,16 @@ class ExtendedRoadRunner(roadrunner.RoadRunner):
         :type alpha: float
         :param kwargs: additional matplotlib keywords like marker, lineStyle, ...
         """
+        from .. import getPlottingEngine, getDefaultPlottingEngine
+        if getDefaultPlottingEngine() == 'null':
+            # plotting is disabled
+            return
+
         if result is None:
             simData = self.getSimulationData()
             result = copy.copy(simData)
             result.colnames = simData.colnames
 
-        from .. import getPlottingEngine
-
         if xtitle:
             kwargs['xtitle'] = xtitle
         if ytitle:
@@ -398,6 +403,19 @@ class ExtendedRoadRunner(roadrunner.RoadRunner):
         from .. import getPlottingEngine
         getPlottingEngine().show(reset=reset)
 
+    # ---------------------------------------------------------------------
+    # Simulation Methods
+    # ---------------------------------------------------------------------
+    @timed('simulate')
+    def simulate(self, *args, **kwargs):
+        return super(ExtendedRoadRunner, self).simulate(*args, **kwargs)
+    simulate.__doc__ = roadrunner.RoadRunner.simulate.__doc__
+
+    @timed('steadyState')
+    def steadyState(self, *args, **kwargs):
+        return super(ExtendedRoadRunner, self).steadyState(*args, **kwargs)
+    steadyState.__doc__ = roadrunner.RoadRunner.steadyState.__doc__
+
     # ---------------------------------------------------------------------
     # Stochastic Simulation Methods
     # ---------------------------------------------------------------------
@@ -437,6 +455,7 @@ class ExtendedRoadRunner(roadrunner.RoadRunner):
         """ Setter for Gillespie seed. """
         return self.setSeed(value)
 
+    @timed('gillespie')
     def gillespie(self, *args, **kwargs):
         """ Run a Gillespie stochastic simulation.
 
@@ -483,3 +502,222 @@ class ExtendedRoadRunner(roadrunner.RoadRunner):
         self.setIntegrator(integratorName)
         self.integrator.variable_step_size = vss
         return s
+
+    # ---------------------------------------------------------------------
+    # Streaming Simulation Methods
+    # ---------------------------------------------------------------------
+    def simulateStream(self, start=0, end=10, points=None, chunkSize=10000, selections=None, windows=100):
+        """ Simulate in chunks of rows instead of one in-memory result.
+
+        The returned stream integrates lazily while it is iterated, so very long
+        time courses never have to be held in memory. Chunks can be written
+        directly to a sink.
+        ::
+
+            from tellurium.teio.sinks import CSVSink
+            r.simulateStream(0, 1e5, 1000001, chunkSize=50000).writeTo(CSVSink('result.csv'))
+
+        :param start: start time
+        :param end: end time
+        :param points: number of points on a fixed time grid, None for variable step sizes
+        :type points: int
+        :param chunkSize: number of rows per chunk
+        :type chunkSize: int
+        :param selections: selections to record, defaults to the timeCourseSelections
+        :param windows: number of integration windows for variable step sizes
+        :type windows: int
+        :returns: stream of simulation chunks
+        :rtype: tellurium.roadrunner.stream.SimulationStream
+        """
+        from .stream import streamSimulation
+        return streamSimulation(self, start, end, points=points, chunkSize=chunkSize,
+                                selections=selections, windows=windows)
+
+    def gillespieStream(self, start=0, end=10, points=None, chunkSize=10000, selections=None, windows=100):
+        """ Stochastic simulation in chunks of rows.
+
+        Like :func:`simulateStream` with the gillespie integrator. The previous
+        integrator is restored when the stream is exhausted.
+        ::
+
+            stream = r.gillespieStream(0, 1e4, chunkSize=100000)
+            stream.writeTo(NPYSink('trajectory.npy'))
+
+        :returns: stream of simulation chunks
+        :rtype: tellurium.roadrunner.stream.SimulationStream
+        """
+        from .stream import streamSimulation
+        return streamSimulation(self, start, end, points=points, chunkSize=chunkSize,
+                                selections=selections, windows=windows, integrator='gillespie')
+
+    # ---------------------------------------------------------------------
+    # Ensemble Simulation Methods
+    # ---------------------------------------------------------------------
+    def simulateEnsemble(self, n, start=0, end=10, points=51, selections=None, seeds=None,
+                         workers=None, integrator=None):
+        """ Simulate n replicates of the model in parallel.
+
+        Replicates are distributed over a pool of worker processes; every worker
+        compiles the model once and reuses it for all its replicates. All replicates
+        start from the current model state. The workers use the settings of the
+        current integrator if no other integrator is given. For the gillespie
+        integrator every replicate uses its own seed and a fixed time grid.
+        ::
+
+            r = te.loada('S1 -> S2; k1*S1; k1 = 0.1; S1 = 40')
+            ens = r.simulateEnsemble(100, 0, 40, 41, integrator='gillespie', workers=4)
+            mean = ens.mean(axis=0)
+
+        :param n: number of replicates
+        :type n: int
+        :param start: start time
+        :param end: end time
+        :param points: number of time points
+        :type points: int
+        :param selections: selections to record, defaults to the timeCourseSelections
+        :param seeds: list of n seeds, random seeds are drawn if None
+        :param workers: number of worker processes, defaults to the number of CPUs
+        :type workers: int
+        :param integrator: integrator name, defaults to the current integrator
+        :type integrator: str
+        :returns: array of shape (n, points, len(selections))
+        :rtype: numpy.ndarray
+        """
+        import numpy as np
+        from .parallel import ModelPool, defaultWorkers, splitChunks, simulateReplicates, integratorSettings
+
+        if integrator is None:
+            integrator = self.integrator.getName()
+        # tolerances and step sizes only apply to the current integrator
+        settings = integratorSettings(self) if integrator == self.integrator.getName() else None
+        if selections is None:
+            selections = list(self.timeCourseSelections)
+        if seeds is None:
+            seeds = np.random.randint(1, 2**31 - 1, size=n)
+        if len(seeds) != n:
+            raise ValueError('Number of seeds ({}) does not match number of replicates ({})'.format(len(seeds), n))
+        seeds = [int(s) for s in seeds]
+        stochastic = (integrator == 'gillespie')
+
+        workers = min(defaultWorkers(workers), max(n, 1))
+        # several blocks per worker balance uneven replicate run times
+        chunks = splitChunks(n, 4 * workers if workers > 1 else 1)
+        items = [(i0, seeds[i0:i1], start, end, points, selections, stochastic) for (i0, i1) in chunks]
+
+        result = np.empty((n, points, len(selections)))
+        with ModelPool(self.getCurrentSBML(), workers=workers, integrator=integrator,
+                       integrator_settings=settings) as pool:
+            for offset, block in pool.imap_unordered(simulateReplicates, items):
+                result[offset:offset + block.shape[0]] = block
+        return result
+
+    # ---------------------------------------------------------------------
+    # Sensitivity Methods
+    # ---------------------------------------------------------------------
+    def timeCourseSensitivities(self, start=0, end=10, points=51, parameters=None, selections=None,
+                                method='auto', relativeStep=1E-4, workers=1):
+        """ Sensitivities of the time course with respect to parameters.
+
+        The sensitivity S[i, j, k] is the derivative of selection i with respect to
+        parameter j at time point k, for the simulation from the reset model state.
+        The 'forward' method integrates the forward sensitivity equations with the
+        sensitivity solver of roadrunner (roadrunner>=2.2, floating species only).
+        The 'fd' method uses central differences with 2 simulations per parameter,
+        which are distributed over a pool of worker processes. 'auto' uses the
+        forward method where available and central differences otherwise.
+        ::
+
+            S = r.timeCourseSensitivities(0, 10, 51, parameters=['k1', 'k2'], selections=['S1'])
+            dS1_dk1 = S[0, 0]
+
+        :param start: start time
+        :param end: end time
+        :param points: number of time points
+        :type points: int
+        :param parameters: parameter ids, defaults to all global parameters
+        :param selections: selections, defaults to the floating species
+        :param method: 'auto', 'forward' or 'fd'
+        :param relativeStep: relative step of the central differences, the absolute
+            step for parameters which are zero
+        :param workers: number of worker processes of the central differences,
+            1 simulates in-process, None uses all CPUs
+        :returns: array of shape (len(selections), len(parameters), points)
+        :rtype: numpy.ndarray
+        """
+        if method not in ['auto', 'forward', 'fd']:
+            raise ValueError("Unknown method '{}', use 'auto', 'forward' or 'fd'".format(method))
+        if parameters is None:
+            parameters = list(self.getGlobalParameterIds())
+        if selections is None:
+            selections = list(self.getFloatingSpeciesIds())
+        parameters = list(parameters)
+        selections = list(selections)
+
+        if method in ['auto', 'forward']:
+            sensitivities = self._forwardSensitivities(start, end, points, parameters, selections)
+            if sensitivities is not None:
+                return sensitivities
+            if method == 'forward':
+                raise ValueError('Forward sensitivities are not supported by this roadrunner version '
+                                 'or for the selections, use method="fd".')
+        return self._centralDifferenceSensitivities(start, end, points, parameters, selections,
+                                                    relativeStep, workers)
+
+    def _forwardSensitivities(self, start, end, points, parameters, selections):
+        """ Forward sensitivities of roadrunner's sensitivity solver, None if not available. """
+        import numpy as np
+        if not hasattr(self, 'timeSeriesSensitivities'):
+            return None
+        self.reset()
+        try:
+            _, sensitivities, rownames, colnames = self.timeSeriesSensitivities(start, end, points, parameters)
+        except (RuntimeError, TypeError, ValueError):
+            return None
+        rownames = list(rownames)
+        colnames = [name.strip('[]') for name in colnames]
+        species = [s.strip('[]') for s in selections]
+        if any(p not in rownames for p in parameters) or any(s not in colnames for s in species):
+            return None
+        sensitivities = np.asarray(sensitivities)
+        sensitivities = sensitivities[:, [rownames.index(p) for p in parameters]][:, :, [colnames.index(s) for s in species]]
+        # (points, parameters, selections) -> (selections, parameters, points)
+        return np.ascontiguousarray(np.transpose(sensitivities, (2, 1, 0)))
+
+    def _centralDifferenceSensitivities(self, start, end, points, parameters, selections, relativeStep, workers):
+        """ Central difference sensitivities, two simulations per parameter. """
+        import numpy as np
+        from .parallel import ModelPool, defaultWorkers, splitChunks, simulateParameterSets, resetSBML
+
+        theta = np.array([self[p] for p in parameters], dtype=float)
+        steps = np.where(theta != 0, relativeStep * np.abs(theta), relativeStep)
+        # rows 2 j and 2 j + 1 perturb parameter j up and down
+        values = np.repeat(theta[np.newaxis, :], 2 * len(parameters), axis=0)
+        for j, h in enumerate(steps):
+            values[2 * j, j] += h
+            values[2 * j + 1, j] -= h
+
+        n = values.shape[0]
+        workers = min(defaultWorkers(workers), max(n, 1))
+        result = np.empty((n, points, len(selections)))
+        if workers == 1:
+            # perturb this instance and restore the parameters and selections afterwards
+            timeCourseSelections = list(self.timeCourseSelections)
+            try:
+                offset, block = simulateParameterSets(self, (0, parameters, values, start, end, points, selections))
+                result[:] = block
+            finally:
+                for name, value in zip(parameters, theta):
+                    self[name] = value
+                self.timeCourseSelections = timeCourseSelections
+                self.reset()
+        else:
+            items = [(i0, parameters, values[i0:i1], start, end, points, selections)
+                     for (i0, i1) in splitChunks(n, 4 * workers)]
+            with ModelPool(resetSBML(self), workers=workers,
+                           integrator=self.integrator.getName()) as pool:
+                for offset, block in pool.imap_unordered(simulateParameterSets, items):
+                    result[offset:offset + block.shape[0]] = block
+
+        # (parameters, points, selections) -> (selections, parameters, points)
+        derivatives = (result[0::2] - result[1::2]) / (2 * steps[:, np.newaxis, np.newaxis])
+        return np.ascontiguousarray(np.transpose(derivatives, (2, 0, 1)))
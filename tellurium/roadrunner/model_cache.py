@@ -0,0 +1,269 @@
+"""
+Content-addressed cache of compiled models.
+
+Models are identified by a hash of their normalized source text, the
+source format, the roadrunner version and the load options. Pristine
+instances are kept in an in-process LRU and cheap copies are handed
+out via the roadrunner state serialization. Optionally the serialized
+state is stored in a cache directory with size-based eviction.
+"""
+
+from __future__ import print_function, division, absolute_import
+import os
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+
+import roadrunner
+
+STATE_SUFFIX = '.rrstate'
+
+
+def normalizeModelText(text):
+    """ Normalize model source text for hashing.
+
+    Line endings are unified and leading/trailing whitespace is stripped
+    from every line, so that indentation changes do not change the key.
+
+    :param text: model source
+    :type text: str
+    :return: normalized text
+    :rtype: str
+    """
+    if isinstance(text, bytes):
+        text = text.decode('utf-8')
+    lines = [line.strip() for line in text.splitlines()]
+    return '\n'.join(line for line in lines if line)
+
+
+def readModelSource(source):
+    """ Contents of a model given as string or file path.
+
+    :param source: model string or path to model file
+    :type source: str | file
+    :return: model text
+    :rtype: str
+    """
+    try:
+        isfile = os.path.isfile(source)
+    except (TypeError, ValueError):
+        isfile = False
+    if isfile:
+        with open(source, 'r') as f:
+            return f.read()
+    return source
+
+
+def modelKey(source, format, **options):
+    """ Content hash identifying a compiled model.
+
+    :param source: model string or path to model file
+    :param format: source format, e.g. 'antimony', 'sbml', 'cellml'
+    :param options: additional load options which influence the compiled model
+    :return: hex digest
+    :rtype: str
+    """
+    h = hashlib.sha256()
+    h.update(format.encode('utf-8'))
+    h.update(b'\0')
+    h.update(str(roadrunner.__version__).encode('utf-8'))
+    h.update(b'\0')
+    for name in sorted(options):
+        h.update('{}={!r};'.format(name, options[name]).encode('utf-8'))
+    h.update(b'\0')
+    h.update(normalizeModelText(readModelSource(source)).encode('utf-8'))
+    return h.hexdigest()
+
+
+def saveStateToFile(rr, path):
+    """ Serialize the complete roadrunner state to the given file. """
+    rr.saveState(path)
+
+
+def loadStateFromFile(path):
+    """ Create a new ExtendedRoadRunner from a serialized state file. """
+    from .extended_roadrunner import ExtendedRoadRunner
+    rr = ExtendedRoadRunner()
+    rr.loadState(path)
+    return rr
+
+
+def copyRoadRunner(rr):
+    """ Copy of a roadrunner instance without recompiling the model.
+
+    The copy is created by a round trip through the roadrunner state
+    serialization.
+
+    :param rr: roadrunner instance
+    :return: independent ExtendedRoadRunner instance
+    """
+    fd, path = tempfile.mkstemp(suffix=STATE_SUFFIX)
+    os.close(fd)
+    try:
+        saveStateToFile(rr, path)
+        return loadStateFromFile(path)
+    finally:
+        os.remove(path)
+
+
+class ModelCache(object):
+    """ LRU cache of compiled roadrunner models keyed by content hash.
+
+    ::
+
+        cache = ModelCache(maxsize=16, cache_dir='/tmp/te_models')
+        r = cache.load(ant_str, 'antimony', lambda: te.loada(ant_str))
+        print(cache.hits, cache.misses)
+
+    Instances returned by the cache are always copies, the pristine
+    instances held by the cache are never handed out.
+    """
+
+    def __init__(self, maxsize=32, cache_dir=None, max_disk_size=512*1024**2):
+        """ Create cache.
+
+        :param maxsize: maximum number of models held in memory
+        :type maxsize: int
+        :param cache_dir: directory for serialized model states, None disables the disk cache
+        :type cache_dir: str
+        :param max_disk_size: maximum total size of the disk cache in bytes
+        :type max_disk_size: int
+        """
+        if maxsize < 1:
+            raise ValueError('maxsize must be at least 1, got {}'.format(maxsize))
+        self.maxsize = maxsize
+        self.cache_dir = cache_dir
+        self.max_disk_size = max_disk_size
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self._models = OrderedDict()
+        self._lock = threading.RLock()
+        if cache_dir is not None and not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+
+    def __len__(self):
+        return len(self._models)
+
+    def __contains__(self, key):
+        if key in self._models:
+            return True
+        path = self._diskPath(key)
+        return path is not None and os.path.exists(path)
+
+    def stats(self):
+        """ Cache statistics.
+
+        :return: dictionary with hits, misses, disk_hits and number of cached models
+        :rtype: dict
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'disk_hits': self.disk_hits,
+            'size': len(self._models),
+            'maxsize': self.maxsize,
+        }
+
+    def clear(self, disk=False):
+        """ Remove all models from the cache.
+
+        :param disk: also remove the serialized states in the cache directory
+        :type disk: bool
+        """
+        with self._lock:
+            self._models.clear()
+            self.hits = 0
+            self.misses = 0
+            self.disk_hits = 0
+            if disk and self.cache_dir is not None:
+                for path, _, _ in self._diskEntries():
+                    os.remove(path)
+
+    def get(self, key):
+        """ Copy of the cached model for key, None if not cached.
+
+        :param key: model key, see :func:`modelKey`
+        :return: ExtendedRoadRunner or None
+        """
+        with self._lock:
+            rr = self._models.get(key)
+            if rr is not None:
+                self._models.pop(key)
+                self._models[key] = rr
+                self.hits += 1
+                return copyRoadRunner(rr)
+
+            path = self._diskPath(key)
+            if path is not None and os.path.exists(path):
+                rr = loadStateFromFile(path)
+                os.utime(path, None)
+                self._insert(key, rr)
+                self.hits += 1
+                self.disk_hits += 1
+                return copyRoadRunner(rr)
+
+            self.misses += 1
+            return None
+
+    def put(self, key, rr):
+        """ Store a pristine model in the cache.
+
+        The cache takes ownership of rr, callers must not modify it afterwards.
+
+        :param key: model key, see :func:`modelKey`
+        :param rr: compiled roadrunner instance
+        """
+        with self._lock:
+            self._insert(key, rr)
+            path = self._diskPath(key)
+            if path is not None and not os.path.exists(path):
+                saveStateToFile(rr, path)
+                self._evictDisk()
+
+    def load(self, source, format, factory, **options):
+        """ Load a model through the cache.
+
+        :param source: model string or path to model file
+        :param format: source format used as part of the key
+        :param factory: callable without arguments creating the compiled model on a cache miss
+        :param options: load options which are part of the key
+        :return: ExtendedRoadRunner
+        """
+        key = modelKey(source, format, **options)
+        rr = self.get(key)
+        if rr is None:
+            rr = factory()
+            self.put(key, rr)
+            rr = copyRoadRunner(rr)
+        return rr
+
+    def _insert(self, key, rr):
+        self._models.pop(key, None)
+        self._models[key] = rr
+        while len(self._models) > self.maxsize:
+            self._models.popitem(last=False)
+
+    def _diskPath(self, key):
+        if self.cache_dir is None:
+            return None
+        return os.path.join(self.cache_dir, key + STATE_SUFFIX)
+
+    def _diskEntries(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(STATE_SUFFIX):
+                path = os.path.join(self.cache_dir, name)
+                st = os.stat(path)
+                entries.append((path, st.st_size, st.st_mtime))
+        return entries
+
+    def _evictDisk(self):
+        """ Remove least recently used states until the size limit is met. """
+        entries = sorted(self._diskEntries(), key=lambda e: e[2])
+        total = sum(e[1] for e in entries)
+        while entries and total > self.max_disk_size:
+            path, size, _ = entries.pop(0)
+            os.remove(path)
+            total -= size
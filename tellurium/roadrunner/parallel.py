@@ -0,0 +1,213 @@
+"""
+Process pools of roadrunner workers.
+
+Every worker process compiles the model once when the pool starts and
+reuses the instance for all work items it receives. Work functions must
+be defined on module level so that they can be pickled; they are called
+as ``func(rr, item)`` with the worker's roadrunner instance.
+"""
+from __future__ import print_function, division, absolute_import
+
+import multiprocessing
+
+import numpy as np
+
+# roadrunner instance of the current worker process
+_worker_rr = None
+
+
+def _initWorker(sbml, integrator, integrator_settings):
+    """ Compile the model once per worker process. """
+    global _worker_rr
+    _worker_rr = createWorkerModel(sbml, integrator, integrator_settings)
+
+
+def _callWorker(args):
+    func, item = args
+    return func(_worker_rr, item)
+
+
+def createWorkerModel(sbml, integrator=None, integrator_settings=None):
+    """ Compile an independent ExtendedRoadRunner for a worker.
+
+    :param sbml: SBML string of the model
+    :param integrator: name of the integrator to use, None keeps the default
+    :param integrator_settings: dictionary of integrator settings, e.g. tolerances
+    :return: ExtendedRoadRunner
+    """
+    from .extended_roadrunner import ExtendedRoadRunner
+    rr = ExtendedRoadRunner(sbml)
+    if integrator is not None:
+        rr.setIntegrator(integrator)
+    if integrator_settings:
+        for key, value in integrator_settings.items():
+            rr.integrator.setValue(key, value)
+    return rr
+
+
+def integratorSettings(rr):
+    """ Settings of the current integrator, e.g. tolerances and step sizes.
+
+    :param rr: roadrunner instance
+    :return: dictionary of setting name to value
+    :rtype: dict
+    """
+    return dict((key, rr.integrator.getValue(key)) for key in rr.integrator.getSettings())
+
+
+def resetSBML(rr):
+    """ SBML of the model in its reset state.
+
+    getCurrentSBML() stores the current state as the initial state, so the
+    reset() of models created from it returns to the state of the SBML. The
+    model is reset first, so the workers reset to the same initial state as
+    the model itself.
+
+    :param rr: roadrunner instance, it is reset
+    :return: SBML string
+    """
+    rr.reset()
+    return rr.getCurrentSBML()
+
+
+def defaultWorkers(workers=None):
+    """ Number of workers to use, defaults to the number of CPUs. """
+    if workers is None:
+        try:
+            workers = multiprocessing.cpu_count()
+        except NotImplementedError:
+            workers = 1
+    if workers < 1:
+        raise ValueError('Number of workers must be at least 1, got {}'.format(workers))
+    return workers
+
+
+def splitChunks(n, nchunks):
+    """ Split range(n) into at most nchunks contiguous (start, stop) slices.
+
+    :param n: number of items
+    :param nchunks: number of chunks
+    :return: list of (start, stop) tuples
+    """
+    nchunks = max(1, min(n, nchunks))
+    bounds = np.linspace(0, n, nchunks + 1).astype(int)
+    return [(int(bounds[k]), int(bounds[k+1])) for k in range(nchunks) if bounds[k+1] > bounds[k]]
+
+
+class ModelPool(object):
+    """ Pool of worker processes each holding a compiled copy of a model.
+
+    With a single worker no processes are spawned and the work is done
+    in-process on a private model instance.
+    ::
+
+        with ModelPool(r.getCurrentSBML(), workers=4) as pool:
+            for result in pool.imap(simulateItem, items):
+                ...
+    """
+
+    def __init__(self, sbml, workers=None, integrator=None, integrator_settings=None):
+        """ Create pool.
+
+        :param sbml: SBML string of the model
+        :param workers: number of worker processes, defaults to the number of CPUs
+        :param integrator: name of the integrator the workers use
+        :param integrator_settings: dictionary of integrator settings the workers use
+        """
+        self.sbml = sbml
+        self.integrator = integrator
+        self.integrator_settings = integrator_settings
+        self.workers = defaultWorkers(workers)
+        self._pool = None
+        self._rr = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def start(self):
+        """ Start the worker processes. """
+        if self.workers == 1:
+            self._rr = createWorkerModel(self.sbml, self.integrator, self.integrator_settings)
+        elif self._pool is None:
+            self._pool = multiprocessing.Pool(processes=self.workers,
+                                              initializer=_initWorker,
+                                              initargs=(self.sbml, self.integrator,
+                                                        self.integrator_settings))
+
+    def close(self):
+        """ Shut down the worker processes. """
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+        self._rr = None
+
+    def terminate(self):
+        """ Stop the worker processes immediately. """
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+        self._rr = None
+
+    def imap(self, func, items):
+        """ Apply func(rr, item) to all items, yielding results in order. """
+        self.start()
+        if self._pool is None:
+            return (func(self._rr, item) for item in items)
+        return self._pool.imap(_callWorker, ((func, item) for item in items))
+
+    def imap_unordered(self, func, items):
+        """ Apply func(rr, item) to all items, yielding results as they finish. """
+        self.start()
+        if self._pool is None:
+            return (func(self._rr, item) for item in items)
+        return self._pool.imap_unordered(_callWorker, ((func, item) for item in items))
+
+    def map(self, func, items):
+        """ List of func(rr, item) for all items. """
+        return list(self.imap(func, items))
+
+
+# ---------------------------------------------------------------------
+# Ensemble simulation
+# ---------------------------------------------------------------------
+def simulateReplicates(rr, item):
+    """ Simulate a block of replicates on the worker model.
+
+    :param rr: worker roadrunner instance
+    :param item: tuple (offset, seeds, start, end, points, selections, stochastic)
+    :return: tuple (offset, array of shape (len(seeds), points, len(selections)))
+    """
+    offset, seeds, start, end, points, selections, stochastic = item
+    rr.timeCourseSelections = selections
+    if stochastic:
+        rr.integrator.variable_step_size = False
+    block = np.empty((len(seeds), points, len(selections)))
+    for k, seed in enumerate(seeds):
+        rr.reset()
+        if stochastic:
+            rr.setSeed(seed)
+        block[k] = rr.simulate(start, end, points)
+    return offset, block
+
+
+def simulateParameterSets(rr, item):
+    """ Simulate a block of parameter vectors on the worker model.
+
+    :param rr: worker roadrunner instance
+    :param item: tuple (offset, parameter ids, values (block, parameters), start, end, points, selections)
+    :return: tuple (offset, array of shape (len(values), points, len(selections)))
+    """
+    offset, names, values, start, end, points, selections = item
+    block = np.empty((len(values), points, len(selections)))
+    for k, theta in enumerate(values):
+        rr.reset()
+        for name, value in zip(names, theta):
+            rr[name] = value
+        block[k] = rr.simulate(start, end, points, selections)
+    return offset, block
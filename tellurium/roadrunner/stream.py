@@ -0,0 +1,163 @@
+"""
+Streaming of simulation results in chunks of rows.
+
+Very long time courses are integrated window by window and handed out as
+fixed-size chunks, so the full trajectory never has to be held in memory.
+Chunks can be written to sinks (see :mod:`tellurium.teio.sinks`) as they
+are produced.
+"""
+from __future__ import print_function, division, absolute_import
+
+import numpy as np
+
+
+class SimulationStream(object):
+    """ Single-pass iterator over chunks of simulation rows.
+
+    Every chunk is a 2D numpy array with the columns given by colnames.
+    All chunks except the last have exactly chunkSize rows.
+    ::
+
+        stream = r.simulateStream(0, 1e6, 10000001, chunkSize=100000)
+        for chunk in stream:
+            print(chunk[-1, 0])
+    """
+
+    def __init__(self, chunks, colnames, chunkSize, rows=None):
+        """ Create stream.
+
+        :param chunks: iterator over 2D arrays
+        :param colnames: column names
+        :param chunkSize: number of rows per chunk
+        :param rows: total number of rows if known in advance, None otherwise
+        """
+        self._chunks = iter(chunks)
+        self.colnames = list(colnames)
+        self.chunkSize = chunkSize
+        self.rows = rows
+        self.consumed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self._chunks)
+        except StopIteration:
+            self.consumed = True
+            raise
+
+    next = __next__  # Python 2
+
+    @property
+    def shape(self):
+        """ Shape (rows, columns) of the complete result, rows is None for variable step simulations. """
+        return (self.rows, len(self.colnames))
+
+    def writeTo(self, sink):
+        """ Write all remaining chunks to a sink and close it.
+
+        :param sink: sink from :mod:`tellurium.teio.sinks`
+        :return: the sink
+        """
+        with sink:
+            sink.open(self.colnames, rows=self.rows)
+            for chunk in self:
+                sink.write(chunk)
+        return sink
+
+    def toArray(self):
+        """ Materialize the remaining chunks in one array. """
+        chunks = list(self)
+        if not chunks:
+            return np.empty((0, len(self.colnames)))
+        return np.concatenate(chunks)
+
+
+def fixedStepChunks(rr, start, end, points, chunkSize):
+    """ Generator simulating a fixed time grid window by window.
+
+    Every window ends on the first grid point of the next window, the
+    duplicated row is dropped, so every chunk holds chunkSize new rows.
+    """
+    times = np.linspace(start, end, points)
+    first = 0
+    while first < points:
+        last = min(first + chunkSize, points) - 1
+        if first == 0:
+            yield np.array(rr.simulate(times[0], times[last], last + 1))
+        else:
+            block = np.array(rr.simulate(times[first - 1], times[last], last - first + 2))
+            yield block[1:]
+        first = last + 1
+
+
+def variableStepChunks(rr, start, end, chunkSize, windows):
+    """ Generator simulating with variable step sizes in time windows.
+
+    Rows of the windows are collected into a preallocated buffer, which is
+    handed out whenever chunkSize rows are filled.
+    """
+    ncol = len(rr.timeCourseSelections)
+    buf = np.empty((chunkSize, ncol))
+    filled = 0
+    bounds = np.linspace(start, end, windows + 1)
+    for k in range(windows):
+        block = np.array(rr.simulate(bounds[k], bounds[k + 1]))
+        if k > 0:
+            block = block[1:]
+        pos = 0
+        while pos < block.shape[0]:
+            n = min(chunkSize - filled, block.shape[0] - pos)
+            buf[filled:filled + n] = block[pos:pos + n]
+            filled += n
+            pos += n
+            if filled == chunkSize:
+                yield buf
+                buf = np.empty((chunkSize, ncol))
+                filled = 0
+    if filled > 0:
+        yield buf[:filled]
+
+
+def streamSimulation(rr, start, end, points=None, chunkSize=10000, selections=None, windows=100, integrator=None):
+    """ Stream a simulation of rr in chunks.
+
+    :param rr: roadrunner instance
+    :param start: start time
+    :param end: end time
+    :param points: number of points of a fixed time grid, None for variable step sizes
+    :param chunkSize: number of rows per chunk
+    :param selections: selections to record, defaults to the timeCourseSelections;
+        the timeCourseSelections of rr are restored when the stream ends
+    :param windows: number of time windows for variable step simulations
+    :param integrator: integrator used while streaming, defaults to the current integrator
+    :return: SimulationStream
+    """
+    if chunkSize < 1:
+        raise ValueError('chunkSize must be at least 1, got {}'.format(chunkSize))
+    colnames = list(selections) if selections is not None else list(rr.timeCourseSelections)
+
+    def chunks():
+        # selections and integrator settings are changed lazily and restored when the stream ends
+        previous = rr.integrator.getName()
+        if integrator is not None and integrator != previous:
+            rr.setIntegrator(integrator)
+        vss = rr.integrator.variable_step_size
+        rr.integrator.variable_step_size = points is None
+        previousSelections = list(rr.timeCourseSelections)
+        try:
+            rr.timeCourseSelections = colnames
+            if points is None:
+                for chunk in variableStepChunks(rr, start, end, chunkSize, windows):
+                    yield chunk
+            else:
+                for chunk in fixedStepChunks(rr, start, end, points, chunkSize):
+                    yield chunk
+        finally:
+            rr.integrator.variable_step_size = vss
+            if rr.integrator.getName() != previous:
+                rr.setIntegrator(previous)
+            rr.timeCourseSelections = previousSelections
+
+    return SimulationStream(chunks(), colnames, chunkSize, rows=points)
@@ -0,0 +1,271 @@
+"""
+Batch execution of COMBINE archives.
+
+Every archive is executed in its own process, so an archive which crashes,
+hangs or runs out of memory does not affect the other archives. The outcome
+of every archive is written to a summary file as soon as it finishes.
+::
+
+    import tellurium as te
+    records = te.executeCombineArchives(paths, workers=8, timeout=600, summary='summary.csv')
+
+The runner is also available from the command line
+::
+
+    python -m tellurium.sedml.batch --workers 8 --timeout 600 --summary summary.csv *.omex
+"""
+from __future__ import print_function, division, absolute_import
+
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+import warnings
+import traceback
+import multiprocessing
+
+from tellurium.roadrunner.parallel import defaultWorkers
+
+# status of an archive in the summary
+STATUS_OK = 'ok'
+STATUS_ERROR = 'error'
+STATUS_TIMEOUT = 'timeout'
+STATUS_CRASHED = 'crashed'
+
+# fields of a summary record
+SUMMARY_FIELDS = ['archive', 'status', 'runtime', 'sedml', 'dataGenerators', 'error']
+
+
+class BatchSummary(object):
+    """ Summary file written record by record.
+
+    The format is chosen by the extension: '.csv' writes a CSV table, '.jsonl'
+    one JSON object per line and '.json' a JSON list which is rewritten after
+    every record, so the file is valid while the batch is running.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.records = []
+        self.format = os.path.splitext(path)[1].lower()
+        if self.format not in ['.csv', '.json', '.jsonl']:
+            raise ValueError("Unsupported summary format '{}', use .csv, .json or .jsonl".format(self.format))
+        self._f = None
+        self._writer = None
+        if self.format == '.csv':
+            self._f = open(path, 'w')
+            self._writer = csv.DictWriter(self._f, fieldnames=SUMMARY_FIELDS)
+            self._writer.writeheader()
+            self._f.flush()
+        elif self.format == '.jsonl':
+            self._f = open(path, 'w')
+        else:
+            self._dumpJSON()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _dumpJSON(self):
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.records, f, indent=2)
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        os.rename(tmp, self.path)
+
+    def write(self, record):
+        """ Add a record to the summary. """
+        self.records.append(record)
+        if self.format == '.csv':
+            self._writer.writerow(record)
+            self._f.flush()
+        elif self.format == '.jsonl':
+            self._f.write(json.dumps(record) + '\n')
+            self._f.flush()
+        else:
+            self._dumpJSON()
+
+    def close(self):
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+
+def _limitMemory(memoryLimit):
+    """ Limit the address space of the current process to memoryLimit bytes. """
+    try:
+        import resource
+    except ImportError:
+        warnings.warn('Memory limits are not supported on this platform.')
+        return
+    resource.setrlimit(resource.RLIMIT_AS, (memoryLimit, memoryLimit))
+
+
+def _runArchive(path, options, memoryLimit, conn):
+    """ Execute a single archive in the worker process and send the outcome. """
+    try:
+        if memoryLimit:
+            _limitMemory(memoryLimit)
+        from .tesedml import executeCombineArchive
+        if options.get('saveOutputs') and options.get('outputDir'):
+            # every archive writes into its own directory
+            name = os.path.splitext(os.path.basename(path))[0]
+            options = dict(options, outputDir=os.path.join(options['outputDir'], name))
+            if not os.path.exists(options['outputDir']):
+                os.makedirs(options['outputDir'])
+        results = executeCombineArchive(path, **options)
+        # the data generators are evaluated lazily, failing data generators
+        # must fail the archive also without outputs
+        for r in results.values():
+            r['dataGenerators'].evaluate(list(r['dataGenerators']))
+        info = {
+            'sedml': len(results),
+            'dataGenerators': sum(len(r['dataGenerators']) for r in results.values()),
+        }
+        conn.send((STATUS_OK, info, None))
+    except BaseException:
+        conn.send((STATUS_ERROR, {}, traceback.format_exc()))
+    finally:
+        conn.close()
+
+
+def _record(path, status, runtime, info=None, error=None):
+    record = dict((field, None) for field in SUMMARY_FIELDS)
+    record.update(info or {})
+    record.update({'archive': path, 'status': status, 'runtime': round(runtime, 3), 'error': error})
+    return record
+
+
+class _Job(object):
+    """ Archive running in a worker process. """
+
+    def __init__(self, index, path, options, memoryLimit):
+        self.index = index
+        self.path = path
+        self.conn, child = multiprocessing.Pipe(duplex=False)
+        self.process = multiprocessing.Process(target=_runArchive, args=(path, options, memoryLimit, child))
+        self.start = time.time()
+        self.process.start()
+        child.close()
+
+    def poll(self, timeout):
+        """ Summary record if the job is finished, None otherwise. """
+        runtime = time.time() - self.start
+        if self.conn.poll():
+            try:
+                status, info, error = self.conn.recv()
+            except EOFError:
+                status, info, error = STATUS_CRASHED, {}, 'no result from worker process'
+            finally:
+                self.process.join()
+                self.conn.close()
+            return _record(self.path, status, runtime, info, error)
+        if not self.process.is_alive():
+            self.process.join()
+            self.conn.close()
+            return _record(self.path, STATUS_CRASHED, runtime,
+                           error='worker process exited with code {}'.format(self.process.exitcode))
+        if timeout is not None and runtime > timeout:
+            self.kill()
+            return _record(self.path, STATUS_TIMEOUT, runtime, error='timeout after {} s'.format(timeout))
+        return None
+
+    def kill(self):
+        self.process.terminate()
+        self.process.join()
+        self.conn.close()
+
+
+def executeCombineArchives(paths, workers=None, timeout=None, memoryLimit=None, summary=None,
+                           callback=None, createOutputs=False, saveOutputs=False, outputDir=None,
+                           plottingEngine=None):
+    """ Execute many COMBINE archives, each in its own worker process.
+
+    Failing, crashing and hanging archives are recorded in the summary and do
+    not stop the batch. Every record is a dictionary with the keys in
+    SUMMARY_FIELDS, status is one of 'ok', 'error', 'timeout' or 'crashed'.
+
+    :param paths: paths of the COMBINE archives
+    :param workers: number of archives executed at the same time, None uses all CPUs
+    :param timeout: maximal runtime per archive in seconds, None for no limit
+    :param memoryLimit: maximal address space per archive in bytes (Unix only), None for no limit
+    :param summary: path of the summary file (.csv, .json or .jsonl), written while the batch runs
+    :param callback: function called with every record as soon as the archive finished
+    :param createOutputs: create the reports and plots of the archives
+    :param saveOutputs: save the outputs, every archive in a subdirectory of outputDir
+    :param outputDir: directory for the saved outputs
+    :param plottingEngine: plotting engine used for the outputs
+    :return: list of records in the order of paths
+    """
+    workers = defaultWorkers(workers)
+    options = {
+        'createOutputs': createOutputs,
+        'saveOutputs': saveOutputs,
+        'outputDir': outputDir,
+        'plottingEngine': plottingEngine,
+    }
+    paths = list(paths)
+    pending = list(enumerate(paths))
+    running = []
+    records = [None] * len(paths)
+    writer = BatchSummary(summary) if summary is not None else None
+    try:
+        while pending or running:
+            while pending and len(running) < workers:
+                index, path = pending.pop(0)
+                running.append(_Job(index, path, options, memoryLimit))
+
+            finished = False
+            for job in list(running):
+                record = job.poll(timeout)
+                if record is None:
+                    continue
+                finished = True
+                running.remove(job)
+                records[job.index] = record
+                if writer is not None:
+                    writer.write(record)
+                if callback is not None:
+                    callback(record)
+            if not finished:
+                time.sleep(0.05)
+    finally:
+        for job in running:
+            job.kill()
+        if writer is not None:
+            writer.close()
+
+    return records
+
+
+def main(argv=None):
+    """ Command line interface of the batch runner. """
+    parser = argparse.ArgumentParser(description='Execute COMBINE archives in parallel.')
+    parser.add_argument('archives', nargs='+', help='COMBINE archives')
+    parser.add_argument('--workers', type=int, default=None, help='number of parallel archives (default: CPUs)')
+    parser.add_argument('--timeout', type=float, default=None, help='timeout per archive in seconds')
+    parser.add_argument('--memory', type=float, default=None, help='memory limit per archive in MB')
+    parser.add_argument('--summary', default=None, help='summary file (.csv, .json or .jsonl)')
+    parser.add_argument('--outputs', default=None, help='directory to save reports and plots to')
+    args = parser.parse_args(argv)
+
+    def report(record):
+        print('{status:8s} {runtime:8.2f}s  {archive}'.format(**record))
+
+    memoryLimit = int(args.memory * 1024**2) if args.memory else None
+    records = executeCombineArchives(args.archives, workers=args.workers, timeout=args.timeout,
+                                     memoryLimit=memoryLimit, summary=args.summary, callback=report,
+                                     createOutputs=args.outputs is not None,
+                                     saveOutputs=args.outputs is not None, outputDir=args.outputs)
+    failed = [r for r in records if r['status'] != STATUS_OK]
+    print('{} of {} archives failed'.format(len(failed), len(records)))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
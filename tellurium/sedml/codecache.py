@@ -0,0 +1,122 @@
+"""
+Caches for the execution of SED-ML.
+
+Parsed SED-ML documents are cached by the content hash of the SED-ML, the
+generated python code by a hash of the document content, the options of the
+code factory and the tellurium version. Compiled
+code objects are cached by the hash of the code. The jinja environment of the
+code templates is created once and reused, so repeated executions of the same
+SED-ML only pay for the simulations.
+"""
+from __future__ import print_function, division, absolute_import
+
+import threading
+
+import jinja2
+
+from ..utils.cache import LRUCache, contentHash
+
+_document_cache = LRUCache(maxsize=32)
+_code_cache = LRUCache(maxsize=64)
+
+_environments = {}
+_environments_lock = threading.Lock()
+
+
+def getSEDMLDocumentCache():
+    """ The LRU cache holding parsed SED-ML documents. """
+    return _document_cache
+
+
+def getSEDMLCodeCache():
+    """ The LRU cache holding generated and compiled python code. """
+    return _code_cache
+
+
+def setSEDMLCacheSize(maxsize):
+    """ Set the maximum number of cached documents and code objects.
+
+    A size of 0 disables the caching.
+
+    :param maxsize: maximum number of entries per cache
+    :type maxsize: int
+    """
+    _document_cache.maxsize = maxsize
+    # generated and compiled code of every document
+    _code_cache.maxsize = 2 * maxsize
+
+
+def clearSEDMLCache():
+    """ Remove all cached documents and code objects. """
+    _document_cache.clear()
+    _code_cache.clear()
+
+
+def templateEnvironment(directory):
+    """ Shared jinja environment for the templates in directory.
+
+    The environment caches the parsed templates, template specific values
+    must be passed in the render context.
+
+    :param directory: template directory
+    :return: jinja2.Environment
+    """
+    with _environments_lock:
+        env = _environments.get(directory)
+        if env is None:
+            env = jinja2.Environment(loader=jinja2.FileSystemLoader(directory),
+                                     extensions=['jinja2.ext.autoescape'],
+                                     trim_blocks=True,
+                                     lstrip_blocks=True)
+            _environments[directory] = env
+        return env
+
+
+def cachedDocument(content, read):
+    """ Cache entry of the SED-ML document with the given content.
+
+    The entry is a dictionary holding the document under 'doc' and the
+    documentKey; further information derived from the document can be
+    stored in the entry.
+
+    :param content: SED-ML string or bytes of the SED-ML file
+    :param read: function returning the SedDocument, called if not cached
+    :return: dictionary
+    """
+    key = contentHash('sedml', content)
+    entry = _document_cache.get(key)
+    if entry is None:
+        entry = {'doc': read(), 'documentKey': key}
+        _document_cache.put(key, entry)
+    return entry
+
+
+def cachedCode(key, render):
+    """ Generated python code for the key.
+
+    :param key: code key, None disables the caching
+    :param render: function returning the code, called if not cached
+    :return: python code
+    """
+    if key is None:
+        return render()
+    code = _code_cache.get(key)
+    if code is None:
+        code = render()
+        _code_cache.put(key, code)
+    return code
+
+
+def compileCode(code, filename):
+    """ Compiled code object of the python code, cached by content.
+
+    :param code: python code
+    :param filename: filename shown in tracebacks
+    :return: code object
+    """
+    key = contentHash('compiled', filename, code)
+    compiled = _code_cache.get(key)
+    if compiled is None:
+        compiled = compile(code, filename, 'exec')
+        _code_cache.put(key, compiled)
+    return compiled
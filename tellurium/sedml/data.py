@@ -3,12 +3,16 @@ Reading NUML, CSV and TSV data from DataDescriptions
 """
 from __future__ import print_function, absolute_import
 import os
+import json
+import shutil
 import logging
 import warnings
 import tempfile
 import numpy as np
 import pandas as pd
 
+from ..utils.cache import contentHash
+
 # py2 / py3
 try:
     import httplib
@@ -22,6 +26,91 @@ except ImportError:
 
 log = logging.getLogger('sedml-data')
 
+# directory of the .npy cache of loaded data files, None disables the cache
+_data_cache_dir = None
+
+
+def setDataCacheDir(directory):
+    """ Set the directory in which loaded data files are cached as .npy columns.
+
+    Cached tables are memory-mapped on the next load, so large data sets are
+    neither parsed again nor read completely into memory.
+
+    :param directory: cache directory, None disables the cache
+    """
+    global _data_cache_dir
+    if directory is not None and not os.path.exists(directory):
+        os.makedirs(directory)
+    _data_cache_dir = directory
+
+
+def getDataCacheDir():
+    """ Directory of the .npy data cache, None if disabled. """
+    return _data_cache_dir
+
+
+class DataTable(object):
+    """ Columnar table, a typed 1D numpy array per column.
+
+    Columns can be memory-mapped .npy files. Selecting columns and rows
+    returns views of the columns where possible.
+    """
+
+    def __init__(self, columns, arrays):
+        """ Create table.
+
+        :param columns: ordered column names
+        :param arrays: list of 1D arrays of equal length
+        """
+        self.columns = list(columns)
+        self.arrays = list(arrays)
+
+    @property
+    def shape(self):
+        nrows = len(self.arrays[0]) if self.arrays else 0
+        return nrows, len(self.columns)
+
+    def __getitem__(self, name):
+        return self.arrays[self.columns.index(name)]
+
+    def select(self, names):
+        """ 2D array (rows, names) of the columns, a view for a single column. """
+        missing = [name for name in names if name not in self.columns]
+        if missing:
+            raise KeyError("Columns {} not in table with columns {}".format(missing, self.columns))
+        if len(names) == 1:
+            return self[names[0]][:, np.newaxis]
+        return np.column_stack([self[name] for name in names])
+
+    def head(self, n=10):
+        return pd.DataFrame(dict((name, self[name][:n]) for name in self.columns), columns=self.columns)
+
+    @classmethod
+    def fromDataFrame(cls, df):
+        """ Table with the typed columns of the DataFrame. """
+        arrays = []
+        for name in df.columns:
+            values = df[name].values
+            if values.dtype == object:
+                values = values.astype(str)
+            arrays.append(values)
+        return cls([str(name) for name in df.columns], arrays)
+
+    def save(self, directory, prefix=''):
+        """ Save columns as .npy files in directory, returns the file names. """
+        files = []
+        for k, values in enumerate(self.arrays):
+            filename = '{}{}.npy'.format(prefix, k)
+            np.save(os.path.join(directory, filename), values)
+            files.append(filename)
+        return files
+
+    @classmethod
+    def load(cls, directory, columns, files, mmap_mode='r'):
+        """ Table of the .npy column files, memory-mapped by default. """
+        arrays = [np.load(os.path.join(directory, filename), mmap_mode=mmap_mode) for filename in files]
+        return cls(columns, arrays)
+
 
 class DataDescriptionParser(object):
     """ Class for parsing DataDescriptions. """
@@ -34,171 +123,196 @@ class DataDescriptionParser(object):
     # supported formats
     SUPPORTED_FORMATS = [FORMAT_NUML, FORMAT_CSV, FORMAT_TSV]
 
+    # numpy types of the NuML value and index types
+    NUML_DTYPES = {'double': np.float64, 'float': np.float64, 'integer': np.int64, 'int': np.int64,
+                   'string': str}
+
     @classmethod
     def parse(cls, dd, workingDir=None):
         """ Parses single DataDescription.
 
-        Returns dictionary of data sources {DataSource.id, slice_data}
+        Returns dictionary of data sources {DataSource.id, slice_data}. The
+        index sets and the NuML slices are pandas Series, the CSV and TSV
+        slices 2D numpy arrays (see :func:`load` with pandas=True).
 
         :param dd: SED-ML DataDescription
         :param workingDir: workingDir relative to which the sources are resolved
         :return:
         """
-        did = dd.getId()
-        name = dd.getName()
-        source = dd.getSource()
-
-        # -------------------------------
-        # Resolve source
-        # -------------------------------
         # FIXME: this must work for absolute paths and URL paths
         if workingDir is None:
             workingDir = '.'
+        source = dd.getSource()
+        if not (source.startswith('http') or source.startswith('HTTP')):
+            source = os.path.join(workingDir, source)
 
-        # TODO: refactor in general resource module (for resolving anyURI and resource)
-        tmp_file = None
+        log.info('-' * 80)
+        log.info('DataDescription: {}; id={}; name={}; source={}'.format(dd, dd.getId(), dd.getName(), source))
+
+        return cls.load(source, format=cls.formatOf(dd), sources=cls.dataSourceSpecs(dd), pandas=True)
+
+    @classmethod
+    def formatOf(cls, dd):
+        """ Format of the DataDescription, None if not set. """
+        if hasattr(dd, "getFormat") and dd.getFormat():
+            return dd.getFormat()
+        return None
+
+    @classmethod
+    def dataSourceSpecs(cls, dd):
+        """ The DataSources of the DataDescription as python literals.
+
+        :param dd: SED-ML DataDescription
+        :return: list of (DataSource id, indexSet, [(slice reference, slice value)])
+        """
+        specs = []
+        for ds in dd.getListOfDataSources():
+            slices = [(str(slice.getReference()), str(slice.getValue())) for slice in ds.getListOfSlices()]
+            specs.append((str(ds.getId()), str(ds.getIndexSet() or ''), slices))
+        return specs
+
+    @classmethod
+    def load(cls, source, format=None, sources=(), columns=False, pandas=False):
+        """ Loads the data sources from the data file.
+
+        The data file is read into a columnar :class:`DataTable`, cached as .npy
+        files if a data cache directory is set (see :func:`setDataCacheDir`).
+        Data sources selecting a single column are views of the table.
+
+        :param source: path or URL of the data file
+        :param format: format of the data file, determined from the file if None
+        :param sources: data sources, see :func:`dataSourceSpecs`
+        :param columns: return all data sources as 2D arrays (rows, columns)
+        :param pandas: return the index sets and NuML slices as pandas Series with
+            the row labels of the data file, as :func:`parse` does
+        :return: dictionary of {DataSource.id: array}
+        """
+        tmp_path = None
         if source.startswith('http') or source.startswith('HTTP'):
             conn = httplib.HTTPConnection(source)
             conn.request("GET", "")
             r1 = conn.getresponse()
-            # print(r1.status, r1.reason)
             data = r1.read()
             conn.close()
-            try:
-                file_str = str(data.decode("utf-8"))
-            except:
-                file_str = str(data)
-
-            tmp_file = tempfile.NamedTemporaryFile("w")
-            tmp_file.write(file_str)
-            source_path = tmp_file.name
-        else:
-            source_path = os.path.join(workingDir, source)
-
-        # -------------------------------
-        # Find the format
-        # -------------------------------
-        format = None
-        if hasattr(dd, "getFormat"):
-            format = dd.getFormat()
-        format = cls._determine_format(source_path=source_path, format=format)
-
-        # log data description
-        log.info('-' * 80)
-        log.info('DataDescription: :', dd)
-        log.info('\tid:', did)
-        log.info('\tname:', name)
-        log.info('\tsource', source)
-        log.info('\tformat', format)
-
-        # -------------------------------
-        # Parse DimensionDescription
-        # -------------------------------
-        # FIXME: uses the data_types to check the actual data type
-        dim_description = dd.getDimensionDescription()
-        if dim_description is not None:
-            data_types = cls.parse_dimension_description(dim_description)
+            with tempfile.NamedTemporaryFile("wb", delete=False) as tmp_file:
+                tmp_file.write(data)
+                tmp_path = tmp_file.name
+            source_path = tmp_path
         else:
-            data_types = None
+            source_path = source
 
-        # -------------------------------
-        # Load complete data
-        # -------------------------------
-        data = None
-        if format == cls.FORMAT_CSV:
-            data = cls._load_csv(path=source_path)
-        elif format == cls.FORMAT_TSV:
-            data = cls._load_tsv(path=source_path)
-        elif format == cls.FORMAT_NUML:
-            data = cls._load_numl(path=source_path)
+        try:
+            format = cls._determine_format(source_path=source_path, format=format)
+            tables = cls._load_tables(source_path, format, cache=tmp_path is None)
+        finally:
+            if tmp_path is not None:
+                os.remove(tmp_path)
 
         # log data
-        log.info("-" * 80)
-        log.info("Data")
-        log.info("-" * 80)
-        if format in [cls.FORMAT_CSV, cls.FORMAT_TSV]:
-            log.info(data.head(10))
-        elif format == cls.FORMAT_NUML:
-            # multiple result components via id
-            for result in data:
-                log.info(result[0])           # rc id
-                log.info(result[1].head(10))  # DataFrame
-        log.info("-" * 80)
+        for rc_id, table in tables:
+            log.info("Data {}: {}\n{}".format(rc_id or '', table.shape, table.head(10)))
 
         # -------------------------------
         # Process DataSources
         # -------------------------------
         data_sources = {}
-        for k, ds in enumerate(dd.getListOfDataSources()):
-
-            dsid = ds.getId()
-
-            # log DataSource
-            log.info('\n\t*** DataSource:', ds)
-            log.info('\t\tid:', ds.getId())
-            log.info('\t\tname:', ds.getName())
-            log.info('\t\tindexSet:', ds.getIndexSet())
-            log.info('\t\tslices')
+        for dsid, index_set, slices in sources:
 
             # CSV/TSV
             if format in [cls.FORMAT_CSV, cls.FORMAT_TSV]:
-                if len(ds.getIndexSet()) > 0:
+                table = tables[0][1]
+                if len(index_set) > 0:
                     # if index set we return the index
-                    data_sources[dsid] = pd.Series(data.index.tolist())
+                    data_sources[dsid] = np.arange(table.shape[0])
+                    if pandas:
+                        data_sources[dsid] = pd.Series(data_sources[dsid])
                 else:
-                    sids = []
-                    for slice in ds.getListOfSlices():
-                        # FIXME: this does not handle multiple slices for rows
-                        # print('\t\t\treference={}; value={}'.format(slice.getReference(), slice.getValue()))
-                        sids.append(slice.getValue())
-
-                    # slice values are columns from data frame
-                    try:
-                        data_sources[dsid] = data[sids].values
-                    except KeyError as e:
-                        # something does not fit between data and data sources
-                        print("-" * 80)
-                        print("Format:", format)
-                        print("Source:", source_path)
-                        print("-" * 80)
-                        print(data)
-                        print("-" * 80)
-                        raise
+                    # FIXME: this does not handle multiple slices for rows
+                    # slice values are columns of the table
+                    data_sources[dsid] = table.select([value for reference, value in slices])
 
             # NUML
             elif format == cls.FORMAT_NUML:
                 # Using the first results component only in SED-ML L1V3
-                rc_id, rc, data_types = data[0]
-
-                index_set = ds.getIndexSet()
-                if ds.getIndexSet() and len(ds.getIndexSet()) != 0:
-                    # data via indexSet
-                    data_source = rc[index_set].drop_duplicates()
-                    data_sources[dsid] = data_source
+                table = tables[0][1]
+                if len(index_set) > 0:
+                    # data via indexSet, unique values in order of occurence
+                    values = table[index_set]
+                    _, first = np.unique(values, return_index=True)
+                    first = np.sort(first)
+                    data_sources[dsid] = values[first]
+                    if pandas:
+                        data_sources[dsid] = pd.Series(values[first], index=first, name=index_set)
                 else:
-                    # data via slices
-                    for slice in ds.getListOfSlices():
-                        reference = slice.getReference()
-                        value = slice.getValue()
-                        df = rc.loc[rc[reference] == value]
-                        # select last column with values
-                        data_sources[dsid] = df.iloc[:, -1]
+                    # data via slices, the last column holds the values
+                    mask = np.ones(table.shape[0], dtype=bool)
+                    for reference, value in slices:
+                        column = table[reference]
+                        if column.dtype.kind in 'fiu':
+                            value = float(value)
+                        mask &= (column == value)
+                    data_sources[dsid] = table.arrays[-1][mask]
+                    if pandas:
+                        data_sources[dsid] = pd.Series(table.arrays[-1][mask], index=np.flatnonzero(mask),
+                                                       name=table.columns[-1])
+
+        if columns:
+            for dsid, data in data_sources.items():
+                if data.ndim == 1:
+                    data_sources[dsid] = np.asarray(data)[:, np.newaxis]
 
         # log data sources
-        log.info("-" * 80)
-        log.info("DataSources")
-        log.info("-" * 80)
         for key, value in data_sources.items():
             log.info('{} : {}; shape={}'.format(key, type(value), value.shape))
-        log.info("-" * 80)
-
-        # cleanup
-        # FIXME: handle in finally
-        if tmp_file is not None:
-            os.remove(tmp_file)
 
         return data_sources
 
+    @classmethod
+    def _load_tables(cls, path, format, cache=True):
+        """ Loads the data file into DataTables.
+
+        :param path: path of the data file
+        :param format: format of the data file
+        :param cache: use the .npy data cache if set
+        :return: list of (result component id, DataTable), a single entry for CSV and TSV
+        """
+        cache_dir = None
+        if cache and _data_cache_dir is not None:
+            stat = os.stat(path)
+            key = contentHash('data', os.path.abspath(path), stat.st_size, stat.st_mtime, format)
+            cache_dir = os.path.join(_data_cache_dir, key)
+            index_path = os.path.join(cache_dir, 'tables.json')
+            if os.path.exists(index_path):
+                with open(index_path) as f:
+                    index = json.load(f)
+                return [(entry['id'], DataTable.load(cache_dir, entry['columns'], entry['files']))
+                        for entry in index]
+
+        if format == cls.FORMAT_CSV:
+            tables = [(None, DataTable.fromDataFrame(cls._load_csv(path=path)))]
+        elif format == cls.FORMAT_TSV:
+            tables = [(None, DataTable.fromDataFrame(cls._load_tsv(path=path)))]
+        else:
+            tables = [(rc_id, table) for rc_id, table, _ in cls._load_numl(path=path)]
+
+        if cache_dir is not None:
+            # write to a temporary directory first, concurrent loads see complete entries only
+            tmp_dir = tempfile.mkdtemp(dir=_data_cache_dir)
+            index = []
+            for k, (rc_id, table) in enumerate(tables):
+                files = table.save(tmp_dir, prefix='{}_'.format(k))
+                index.append({'id': rc_id, 'columns': table.columns, 'files': files})
+            with open(os.path.join(tmp_dir, 'tables.json'), 'w') as f:
+                json.dump(index, f)
+            try:
+                os.rename(tmp_dir, cache_dir)
+            except OSError:
+                # cached by another process in the meantime
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+            tables = [(entry['id'], DataTable.load(cache_dir, entry['columns'], entry['files']))
+                      for entry in index]
+        return tables
+
     @classmethod
     def _determine_format(cls, source_path, format=None):
         """
@@ -328,34 +442,25 @@ class DataDescriptionParser(object):
             # data
             dimension = rc.getDimension()
             assert (isinstance(dimension, libnuml.Dimension))
-            data = [cls._parse_dimension(dimension.get(k)) for k in range(dimension.size())]
-
-            # create data frame
-            flat_data = []
-            for entry in data:
-                for part in entry:
-                    flat_data.append(part)
+            rows = []
+            for kd in range(dimension.size()):
+                rows.extend(cls._parse_dimension(dimension.get(kd)))
 
             # column ids from DimensionDescription
             column_ids = []
+            dtypes = []
             for entry in data_types:
                 for cid, dtype in entry.items():
                     column_ids.append(cid)
+                    dtypes.append(dtype)
 
-            df = pd.DataFrame(flat_data, columns=column_ids)
-
-            # convert data types to actual data types
-            for entry in data_types:
-                for cid, dtype in entry.items():
-                    if dtype == 'double':
-                        df[cid] = df[cid].astype(np.float64)
-                    elif dtype == 'string':
-                        df[cid] = df[cid].astype(str)
-
-            # convert all the individual columns to the corresponding data types
-            # df = df.apply(pd.to_numeric, errors="ignore")
+            # typed columns of the flattened entries
+            columns = list(zip(*rows)) if rows else [[] for _ in column_ids]
+            arrays = [np.array(values, dtype=cls.NUML_DTYPES.get(dtype, str))
+                      for values, dtype in zip(columns, dtypes)]
+            table = DataTable(column_ids, arrays)
 
-            results.append([rc_id, df, data_types])
+            results.append([rc_id, table, data_types])
 
         return results
 
@@ -0,0 +1,64 @@
+"""
+Lazy evaluation of SED-ML DataGenerators.
+
+The generated python code defines every DataGenerator as a function which is
+registered in a :class:`DataGenerators` mapping. A DataGenerator is evaluated
+the first time an output or the caller reads it, data generators which are not
+used are never computed.
+::
+
+    __dataGenerators__ = DataGenerators(globals())
+    __dataGenerators__.add('dg1', __compute__dg1)
+    __dataGenerators__.evaluate(['dg1'])   # defines dg1 in globals()
+"""
+from __future__ import print_function, division, absolute_import
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+
+class DataGenerators(Mapping):
+    """ Mapping of DataGenerator id to its data, evaluated on first access. """
+
+    def __init__(self, namespace=None):
+        """ Create mapping.
+
+        :param namespace: dictionary the evaluated data generators are written
+            to, i.e. the globals() of the generated code
+        """
+        self.namespace = namespace
+        self._functions = {}
+        self._values = {}
+
+    def add(self, gid, function):
+        """ Register the function computing the data generator gid. """
+        self._functions[gid] = function
+        self._values.pop(gid, None)
+
+    def isEvaluated(self, gid):
+        """ True if the data generator was already computed. """
+        return gid in self._values
+
+    def evaluate(self, gids):
+        """ Compute the data generators and write them to the namespace.
+
+        :param gids: iterable of data generator ids
+        :return: list of the data
+        """
+        return [self[gid] for gid in gids]
+
+    def __getitem__(self, gid):
+        if gid not in self._values:
+            value = self._functions[gid]()
+            self._values[gid] = value
+            if self.namespace is not None:
+                self.namespace[gid] = value
+        return self._values[gid]
+
+    def __iter__(self):
+        return iter(self._functions)
+
+    def __len__(self):
+        return len(self._functions)
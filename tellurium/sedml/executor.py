@@ -0,0 +1,298 @@
+"""
+Execution engine for SED-ML RepeatedTasks.
+
+Instead of nested python loops the task tree of a RepeatedTask is described by
+a specification (see :func:`SEDMLCodeFactory.repeatedTaskSpec`) which is
+interpreted by the :class:`RepeatedTaskExecutor`. The code of the simple tasks
+and of the range iterations is compiled once and reused in every iteration.
+The results of all simulations are written into a preallocated tensor whose
+size is known from the ranges. Iterations of tasks which reset the models are
+independent and can be distributed over worker processes.
+
+A specification is a dictionary. Simple tasks have the keys
+    type: 'task'
+    id: task id
+    code: python code running the simulation, the result is <id>[0]
+RepeatedTasks have the keys
+    type: 'repeatedTask'
+    id: task id
+    range: id of the master range
+    ranges: python code defining the ranges __range__<rangeId>
+    iteration: python code run in every iteration
+    models: ids of the models used in the task tree
+    independent: True if the iterations do not depend on each other
+    subtasks: list of specifications of the ordered subtasks
+"""
+from __future__ import print_function, division, absolute_import
+
+import multiprocessing
+
+import numpy as np
+
+from tellurium.roadrunner.parallel import createWorkerModel, defaultWorkers, splitChunks
+
+
+class SimulationView(object):
+    """ Columns of a single simulation stored in a TaskResult. """
+
+    def __init__(self, data, colnames):
+        self.data = data
+        self.colnames = colnames
+
+    @property
+    def shape(self):
+        return self.data.shape
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self.data[:, self.colnames.index(key)]
+        return self.data[key]
+
+
+class TaskResult(object):
+    """ Ordered results of all simulations of a RepeatedTask.
+
+    The results are stored in a preallocated tensor of shape
+    (simulations, points, selections). If the simulations of the task tree
+    have different shapes or selections the results are kept in a list.
+    Iteration yields the single simulations like the list of results of the
+    generated python loops.
+    """
+
+    def __init__(self, size):
+        """ Create result.
+
+        :param size: number of simulations of the task tree
+        """
+        self.size = size
+        self.data = None
+        self.colnames = None
+        self._list = None
+        self._n = 0
+
+    def __len__(self):
+        return self._n
+
+    def __getitem__(self, k):
+        if self._list is not None:
+            return self._list[k]
+        if k < 0:
+            k += self._n
+        if not 0 <= k < self._n:
+            raise IndexError('TaskResult index out of range: {}'.format(k))
+        return SimulationView(self.data[k], self.colnames)
+
+    def __iter__(self):
+        for k in range(self._n):
+            yield self[k]
+
+    @property
+    def isTensor(self):
+        """ True if the results are stored in the preallocated tensor. """
+        return self._list is None and self.data is not None
+
+    def append(self, sim, colnames=None):
+        """ Add the result of the next simulation. """
+        if colnames is None and sim is not None:
+            colnames = list(sim.colnames)
+        if self._list is None:
+            if self._n == 0 and sim is not None:
+                self.data = np.empty((self.size,) + np.shape(sim))
+                self.colnames = colnames
+            if sim is not None and self._n < self.size and np.shape(sim) == self.data.shape[1:] \
+                    and colnames == self.colnames:
+                self.data[self._n] = sim
+                self._n += 1
+                return
+            # results do not fit into the tensor
+            self._list = [self[k] for k in range(self._n)]
+        self._list.append(sim if (sim is None or hasattr(sim, 'colnames')) else SimulationView(sim, colnames))
+        self._n += 1
+
+    def __getstate__(self):
+        """ Simulations in the list are pickled as arrays with column names. """
+        state = self.__dict__.copy()
+        if self._list is not None:
+            state['_list'] = [None if sim is None else SimulationView(np.array(sim[:]), list(sim.colnames))
+                              for sim in self._list]
+        return state
+
+    def extend(self, other):
+        """ Add all results of another TaskResult. """
+        if other.isTensor and self._n == 0 and self.data is None:
+            self.data = np.empty((self.size,) + other.data.shape[1:])
+            self.colnames = other.colnames
+        if other.isTensor and self._list is None and self.data is not None \
+                and other.data.shape[1:] == self.data.shape[1:] and other.colnames == self.colnames \
+                and self._n + len(other) <= self.size:
+            self.data[self._n:self._n + len(other)] = other.data[:len(other)]
+            self._n += len(other)
+        else:
+            for sim in other:
+                self.append(sim)
+
+    def concatenate(self, key, offsets=False):
+        """ Concatenated column of all simulations.
+
+        :param key: column name
+        :param offsets: add the end value of all previous simulations, used to
+            concatenate the time of consecutive simulations
+        :return: 1D array
+        """
+        if self.isTensor:
+            column = self.data[:self._n, :, self.colnames.index(key)]
+            if offsets:
+                shifts = np.insert(np.cumsum(column[:, -1]), 0, 0)[:-1]
+                column = column + shifts[:, np.newaxis]
+            return np.ravel(column)
+        columns = [sim[key] for sim in self]
+        if offsets:
+            shifts = np.insert(np.cumsum([c[-1] for c in columns]), 0, 0)
+            columns = [c + shifts[k] for k, c in enumerate(columns)]
+        return np.concatenate(columns)
+
+
+# models of the current iteration worker process
+_worker_models = None
+
+
+def _initIterationWorker(sbmls):
+    """ Compile the models once per worker process. """
+    global _worker_models
+    _worker_models = dict((mid, createWorkerModel(sbml)) for mid, sbml in sbmls.items())
+
+
+def _runIterations(item):
+    """ Run a slice of the iterations of a RepeatedTask in a worker process. """
+    spec, start, stop = item
+    namespace = executionNamespace(_worker_models)
+    executor = RepeatedTaskExecutor(spec)
+    result = executor.runIterations(namespace, start, stop)
+    return start, result
+
+
+def executionNamespace(models):
+    """ Namespace for the execution of the task code.
+
+    :param models: dictionary of model id to roadrunner instance
+    :return: dictionary
+    """
+    namespace = {'np': np}
+    exec('from tellurium.sedml.mathml import *', namespace)
+    namespace.update(models)
+    return namespace
+
+
+class RepeatedTaskExecutor(object):
+    """ Interpreter for the task tree of a RepeatedTask.
+    ::
+
+        task1 = RepeatedTaskExecutor(spec).run(globals(), workers=4)
+    """
+
+    def __init__(self, spec):
+        """ Create executor.
+
+        :param spec: specification of the RepeatedTask
+        """
+        self.spec = spec
+        self._compiled = {}
+
+    def _exec(self, spec, key, namespace):
+        """ Execute the code of a specification, compiled only once. """
+        name = (spec['id'], key)
+        code = self._compiled.get(name)
+        if code is None:
+            code = compile(spec[key], '<sedml {} {}>'.format(spec['id'], key), 'exec')
+            self._compiled[name] = code
+        exec(code, namespace)
+
+    def _ranges(self, spec, namespace):
+        """ Define the ranges of the specification, returns the master range. """
+        self._exec(spec, 'ranges', namespace)
+        return namespace['__range__{}'.format(spec['range'])]
+
+    def count(self, spec, namespace):
+        """ Number of simulations of the task tree of the specification. """
+        if spec['type'] == 'task':
+            return 1
+        perIteration = sum(self.count(sub, namespace) for sub in spec['subtasks'])
+        return len(self._ranges(spec, namespace)) * perIteration
+
+    def _iterate(self, spec, namespace, result, start=0, stop=None):
+        """ Run the iterations start to stop of a RepeatedTask specification. """
+        rid = spec['range']
+        values = self._ranges(spec, namespace)
+        if stop is None:
+            stop = len(values)
+        for k in range(start, stop):
+            namespace['__k__{}'.format(rid)] = k
+            namespace['__value__{}'.format(rid)] = values[k]
+            self._exec(spec, 'iteration', namespace)
+            for sub in spec['subtasks']:
+                self._run(sub, namespace, result)
+
+    def _run(self, spec, namespace, result):
+        if spec['type'] == 'task':
+            self._exec(spec, 'code', namespace)
+            result.append(namespace[spec['id']][0])
+        else:
+            self._iterate(spec, namespace, result)
+
+    def runIterations(self, namespace, start, stop):
+        """ Run the iterations start to stop of the master range.
+
+        :return: TaskResult of the iterations
+        """
+        spec = self.spec
+        perIteration = sum(self.count(sub, namespace) for sub in spec['subtasks'])
+        result = TaskResult((stop - start) * perIteration)
+        self._iterate(spec, namespace, result, start=start, stop=stop)
+        return result
+
+    def run(self, namespace, workers=1):
+        """ Run the RepeatedTask.
+
+        With more than one worker the iterations of independent RepeatedTasks are
+        split in contiguous slices executed on a process pool with copies of the
+        models. The last slice runs in this process, so the models end in the
+        same state as after a serial execution.
+
+        :param namespace: namespace with the models, i.e. globals() of the generated code
+        :param workers: number of processes, None uses all CPUs
+        :return: TaskResult
+        """
+        spec = self.spec
+        workers = defaultWorkers(workers)
+        if multiprocessing.current_process().daemon:
+            # daemonic pool workers cannot start pools
+            workers = 1
+        n = len(self._ranges(spec, namespace))
+        result = TaskResult(self.count(spec, namespace))
+
+        if workers == 1 or not spec['independent'] or n < 2:
+            self._iterate(spec, namespace, result)
+            return result
+
+        slices = splitChunks(n, workers)
+        # the iterations reset the models, the workers must reset to the same state
+        # and not to the state left by previous tasks
+        sbmls = {}
+        for mid in spec['models']:
+            namespace[mid].reset()
+            sbmls[mid] = namespace[mid].getCurrentSBML()
+        pool = multiprocessing.Pool(processes=len(slices) - 1,
+                                    initializer=_initIterationWorker, initargs=(sbmls,))
+        try:
+            pending = pool.imap(_runIterations, [(spec, start, stop) for start, stop in slices[:-1]])
+            last = self.runIterations(namespace, *slices[-1])
+            for start, part in pending:
+                result.extend(part)
+            result.extend(last)
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+        return result
@@ -20,6 +20,12 @@ try:
 except:
     import libsbml
 import operator
+from functools import reduce
+
+import numpy as np
+
+def _isArray(args):
+    return any(isinstance(a, np.ndarray) for a in args)
 
 def product(*args):
     return reduce(operator.mul, args, 1)
@@ -31,78 +37,37 @@ def root(a, b):
     return a**(1/b)
 
 def xor(*args):
-    foundZero = 0
-    foundOne = 0
-    for a in args:
-        if not a:
-           foundZero = 1
-        else:
-           foundOne = 1
-    if foundZero and foundOne:
-        return 1
-    else:
-        return 0
+    """ True if an odd number of arguments is true, elementwise for arrays. """
+    if _isArray(args):
+        return reduce(np.logical_xor, args, False)
+    return sum(1 for a in args if a) % 2
 
 def piecewise(*args):
+    """ piecewise(value1, condition1, value2, condition2, ..., otherwise)
+
+    With array arguments the pieces are selected elementwise,
+    elements without a true condition and otherwise are nan.
+    """
     Nargs = len(args)
+    if _isArray(args):
+        conditions = [np.asarray(args[k+1], dtype=bool) for k in range(0, Nargs-1, 2)]
+        values = [args[k] for k in range(0, Nargs-1, 2)]
+        otherwise = args[Nargs-1] if Nargs % 2 else np.nan
+        return np.select(conditions, values, default=otherwise)
     for k in range(0, Nargs-1, 2):
         if args[k+1]:
             return args[k]
     else:
         return args[Nargs-1]
 
-"""
-def pow(x, y):
-    return x**y
-
-def gt(a, b):
-   if a > b:
-   	  return 1
-   else:
-      return 0
-
-def lt(a, b):
-   if a < b:
-   	  return 1
-   else:
-      return 0
-
-def geq(a, b):
-   if a >= b:
-   	  return 1
-   else:
-      return 0
-
-def leq(a, b):
-   if a <= b:
-   	  return 1
-   else:
-      return 0
-
-def neq(a, b):
-   if a != b:
-   	  return 1
-   else:
-      return 0
-
-def f_not(a):
-   if a == 1:
-   	  return 0
-   else:
-      return 1
-
 def f_and(*args):
-    for a in args:
-       if a != 1:
-          return 0
-    return 1
+    return reduce(np.logical_and, args, True)
 
 def f_or(*args):
-    for a in args:
-       if a != 0:
-          return  1
-    return 0
-"""
+    return reduce(np.logical_or, args, False)
+
+def f_not(a):
+    return np.logical_not(a)
 
 def evaluableMathML(astnode, variables={}, array=False):
     """ Create evaluable python string.
@@ -131,6 +96,158 @@ def evaluableMathML(astnode, variables={}, array=False):
     return formula
 
 
+# python expressions for the MathML functions on numpy arrays
+_ARRAY_FUNCTIONS = {
+    'AST_FUNCTION_ABS': 'np.abs({0})',
+    'AST_FUNCTION_ARCCOS': 'np.arccos({0})',
+    'AST_FUNCTION_ARCCOSH': 'np.arccosh({0})',
+    'AST_FUNCTION_ARCSIN': 'np.arcsin({0})',
+    'AST_FUNCTION_ARCSINH': 'np.arcsinh({0})',
+    'AST_FUNCTION_ARCTAN': 'np.arctan({0})',
+    'AST_FUNCTION_ARCTANH': 'np.arctanh({0})',
+    'AST_FUNCTION_CEILING': 'np.ceil({0})',
+    'AST_FUNCTION_COS': 'np.cos({0})',
+    'AST_FUNCTION_COSH': 'np.cosh({0})',
+    'AST_FUNCTION_COT': '(1/np.tan({0}))',
+    'AST_FUNCTION_CSC': '(1/np.sin({0}))',
+    'AST_FUNCTION_EXP': 'np.exp({0})',
+    'AST_FUNCTION_FLOOR': 'np.floor({0})',
+    'AST_FUNCTION_LN': 'np.log({0})',
+    'AST_FUNCTION_SEC': '(1/np.cos({0}))',
+    'AST_FUNCTION_SIN': 'np.sin({0})',
+    'AST_FUNCTION_SINH': 'np.sinh({0})',
+    'AST_FUNCTION_TAN': 'np.tan({0})',
+    'AST_FUNCTION_TANH': 'np.tanh({0})',
+    'AST_LOGICAL_NOT': 'f_not({0})',
+}
+
+_ARRAY_OPERATORS = {
+    'AST_PLUS': ' + ',
+    'AST_MINUS': ' - ',
+    'AST_TIMES': ' * ',
+    'AST_DIVIDE': ' / ',
+    'AST_POWER': '**',
+    'AST_FUNCTION_POWER': '**',
+}
+
+_ARRAY_RELATIONS = {
+    'AST_RELATIONAL_EQ': 'np.equal',
+    'AST_RELATIONAL_NEQ': 'np.not_equal',
+    'AST_RELATIONAL_GT': 'np.greater',
+    'AST_RELATIONAL_LT': 'np.less',
+    'AST_RELATIONAL_GEQ': 'np.greater_equal',
+    'AST_RELATIONAL_LEQ': 'np.less_equal',
+}
+
+_ARRAY_VARIADIC = {
+    'AST_LOGICAL_AND': 'f_and',
+    'AST_LOGICAL_OR': 'f_or',
+    'AST_LOGICAL_XOR': 'xor',
+    'AST_FUNCTION_PIECEWISE': 'piecewise',
+}
+
+# SED-ML aggregate functions on a single vector, elementwise otherwise
+_ARRAY_AGGREGATES = {
+    'max': ('np.nanmax({0})', 'reduce(np.fmax, [{0}])'),
+    'min': ('np.nanmin({0})', 'reduce(np.fmin, [{0}])'),
+    'sum': ('np.nansum({0})', 'reduce(operator.add, [{0}])'),
+    'product': ('np.nanprod({0})', 'product({0})'),
+}
+
+
+def _astTypes(names):
+    """ Dictionary of libsbml AST type to value for the known type names. """
+    return dict((getattr(libsbml, name), value) for name, value in names.items() if hasattr(libsbml, name))
+
+
+def vectorizedMathML(astnode, variables={}):
+    """ Python expression evaluating the MathML elementwise on numpy arrays.
+
+    The expression is built from the AST, so logical and relational operators,
+    piecewise and the SED-ML aggregate functions (max, min, sum, product) work on
+    arrays. Unsupported MathML falls back to :func:`evaluableMathML`.
+    The astnode is not changed.
+
+    :param astnode: astnode of MathML
+    :type astnode: libsbml.ASTNode
+    :param variables: dictionary of name : python expression or value
+    :type variables: dict
+    :return: python expression
+    :rtype: str
+    """
+    try:
+        return _VectorizedMathML(variables).toPython(astnode)
+    except NotImplementedError:
+        return evaluableMathML(astnode.deepCopy(), variables=variables, array=True)
+
+
+class _VectorizedMathML(object):
+    """ Translates a libsbml AST to a numpy expression. """
+
+    def __init__(self, variables):
+        self.variables = variables
+        self.functions = _astTypes(_ARRAY_FUNCTIONS)
+        self.operators = _astTypes(_ARRAY_OPERATORS)
+        self.relations = _astTypes(_ARRAY_RELATIONS)
+        self.variadic = _astTypes(_ARRAY_VARIADIC)
+        self.constants = _astTypes({
+            'AST_CONSTANT_E': 'np.e',
+            'AST_CONSTANT_PI': 'np.pi',
+            'AST_CONSTANT_TRUE': 'True',
+            'AST_CONSTANT_FALSE': 'False',
+            'AST_NAME_AVOGADRO': '6.02214179e23',
+        })
+        self.names = _astTypes({'AST_NAME': True, 'AST_NAME_TIME': True})
+        self.aggregates = _astTypes({'AST_FUNCTION_MAX': 'max', 'AST_FUNCTION_MIN': 'min'})
+
+    def toPython(self, node):
+        t = node.getType()
+        children = [self.toPython(node.getChild(k)) for k in range(node.getNumChildren())]
+
+        if t == libsbml.AST_INTEGER:
+            return repr(node.getInteger())
+        if t in (libsbml.AST_REAL, libsbml.AST_REAL_E):
+            return repr(node.getReal())
+        if t == libsbml.AST_RATIONAL:
+            return '({}/{})'.format(float(node.getNumerator()), float(node.getDenominator()))
+        if t in self.names:
+            name = node.getName()
+            return str(self.variables.get(name, name))
+        if t in self.constants:
+            return self.constants[t]
+        if t in self.operators:
+            if t == libsbml.AST_MINUS and len(children) == 1:
+                return '(-{})'.format(children[0])
+            if not children:
+                return '1' if t == libsbml.AST_TIMES else '0'
+            return '(' + self.operators[t].join('({})'.format(c) for c in children) + ')'
+        if t in self.relations:
+            pairs = ['{}({}, {})'.format(self.relations[t], children[k], children[k+1])
+                     for k in range(len(children)-1)]
+            return pairs[0] if len(pairs) == 1 else 'f_and({})'.format(', '.join(pairs))
+        if t in self.variadic:
+            return '{}({})'.format(self.variadic[t], ', '.join(children))
+        if t in self.functions and len(children) == 1:
+            return self.functions[t].format(children[0])
+        if t == libsbml.AST_FUNCTION_ROOT:
+            if len(children) == 1:
+                return 'np.sqrt({})'.format(children[0])
+            return '({})**(1.0/({}))'.format(children[1], children[0])
+        if t == libsbml.AST_FUNCTION_LOG:
+            if len(children) == 1:
+                return 'np.log10({})'.format(children[0])
+            return '(np.log({})/np.log({}))'.format(children[1], children[0])
+        if t in self.aggregates or t == libsbml.AST_FUNCTION:
+            name = self.aggregates.get(t, node.getName())
+            if name in _ARRAY_AGGREGATES:
+                single, elementwise = _ARRAY_AGGREGATES[name]
+                if len(children) == 1:
+                    return single.format(children[0])
+                return elementwise.format(', '.join(children))
+
+        raise NotImplementedError('MathML not supported on arrays: {}'.format(libsbml.formulaToL3String(node)))
+
+
 def evaluateMathML(astnode, variables={}, array=False):
     """ Evaluate MathML string with given set of variable and parameter values.
 
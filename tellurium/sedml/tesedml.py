@@ -106,9 +106,11 @@ import warnings
 import datetime
 import zipfile
 import re
+import functools
+import pprint
+import multiprocessing
 import numpy as np
 from collections import namedtuple
-import jinja2
 
 try:
     import tesedml as libsedml
@@ -116,14 +118,18 @@ except ImportError:
     import libsedml
 
 from tellurium.utils import omex
-from .mathml import evaluableMathML
+from .mathml import evaluableMathML, vectorizedMathML
+from .executor import TaskResult
+from . import codecache
+from ..utils.cache import contentHash
+from ..utils import profiling
+from ..utils.profiling import timed
 import tellurium as te
 
 try:
-    # required imports in generated python code
+    # required imports in generated python code, matplotlib is only imported
+    # by the code of documents with outputs
     import pandas
-    import matplotlib.pyplot as plt
-    import mpl_toolkits.mplot3d
 except ImportError:
     warnings.warn("Dependencies for SEDML code execution not fulfilled.")
     print(traceback.format_exc())
@@ -233,6 +239,11 @@ KISAOS_ALGORITHMPARAMETERS = {
 }
 
 
+def _processTrace():
+    """ True if the generated code processes the traces, see PROCESS_TRACE. """
+    return bool(os.environ.get('PROCESS_TRACE'))
+
+
 ######################################################################################################################
 # Interface functions
 ######################################################################################################################
@@ -249,23 +260,24 @@ def sedmlToPython(inputStr, workingDir=None):
     :type inputStr: path
     :return: generated python code
     """
-    factory = SEDMLCodeFactory(inputStr, workingDir=workingDir)
-    return factory.toPython()
+    with SEDMLCodeFactory(inputStr, workingDir=workingDir) as factory:
+        return factory.toPython()
 
 
-def executeSEDML(inputStr, workingDir=None):
+def executeSEDML(inputStr, workingDir=None, workers=1):
     """ Run a SED-ML file or combine archive with results.
 
     If a workingDir is provided the files and results are written in the workingDir.
 
     :param inputStr:
     :type inputStr:
+    :param workers: number of processes executing independent tasks, None uses all CPUs
     :return:
     :rtype:
     """
     # execute the sedml
-    factory = SEDMLCodeFactory(inputStr, workingDir=workingDir)
-    factory.executePython()
+    with SEDMLCodeFactory(inputStr, workingDir=workingDir) as factory:
+        factory.executePython(workers=workers)
 
 
 def combineArchiveToPython(omexPath):
@@ -277,14 +289,12 @@ def combineArchiveToPython(omexPath):
     tmp_dir = tempfile.mkdtemp()
     pycode = {}
     try:
-        omex.extractCombineArchive(omexPath, directory=tmp_dir, method="zip")
-        locations = omex.getLocationsByFormat(omexPath, "sed-ml")
-        sedml_files = [os.path.join(tmp_dir, loc) for loc in locations]
-
-        for k, sedml_file in enumerate(sedml_files):
-            pystr = sedmlToPython(sedml_file)
-            pycode[locations[k]] = pystr
-
+        with omex.OmexReader(omexPath) as archive:
+            for location in archive.locationsByFormat("sed-ml"):
+                factory = SEDMLCodeFactory(archive.readString(location),
+                                           workingDir=os.path.dirname(os.path.join(tmp_dir, location)),
+                                           archive=archive, archiveLocation=location)
+                pycode[location] = factory.toPython()
     finally:
         shutil.rmtree(tmp_dir)
     return pycode
@@ -296,11 +306,14 @@ def executeCombineArchive(omexPath,
                           createOutputs=True,
                           saveOutputs=False,
                           outputDir=None,
-                          plottingEngine=None):
+                          plottingEngine=None,
+                          workers=1):
     """ Run all SED-ML simulations in given COMBINE archive.
 
-    If no workingDir is provided execution is performed in temporary directory
-    which is cleaned afterwards.
+    If no workingDir is provided the archive is not extracted: the SED-ML files
+    and models are read from the archive in memory, only the data files used by
+    the SED-ML are written to a temporary directory which is cleaned afterwards.
+    If a workingDir is provided the archive is extracted to the workingDir.
     The executed code can be printed via the 'printPython' flag.
 
     :param omexPath: OMEX Combine archive
@@ -310,11 +323,13 @@ def executeCombineArchive(omexPath,
     :param saveOutputs: flag if the outputs should be saved to file
     :param outputDir: directory where the outputs should be written
     :param plottingEngin: string of which plotting engine to use; uses set plotting engine otherwise
+    :param workers: number of processes executing independent tasks of a SED-ML file, None uses all CPUs
     :return dictionary of sedmlFile:data generators
     """
 
     # combine archives are zip format
     if zipfile.is_zipfile(omexPath):
+        archive = omex.OmexReader(omexPath)
         try:
             tmp_dir = tempfile.mkdtemp()
             if workingDir is None:
@@ -323,39 +338,44 @@ def executeCombineArchive(omexPath,
                 if not os.path.exists(workingDir):
                     raise IOError("workingDir does not exist, make sure to create the directoy: '{}'".format(workingDir))
                 extractDir = workingDir
+                # extract
+                omex.extractCombineArchive(omexPath=omexPath, directory=extractDir)
 
-            # extract
-            omex.extractCombineArchive(omexPath=omexPath, directory=extractDir)
-
-            # get sedml locations by omex
-            sedml_locations = omex.getLocationsByFormat(omexPath=omexPath, formatKey="sed-ml", method="omex")
-            if len(sedml_locations) == 0:
-
-                # falling back to zip archive
-                sedml_locations = omex.getLocationsByFormat(omexPath=omexPath, formatKey="sed-ml", method="zip")
-                warnings.warn(
-                    "No SED-ML files in COMBINE archive based on manifest '{}'; Guessed SED-ML {}".format(omexPath, sedml_locations))
-
+            # get sedml locations by manifest, guessed from the files otherwise
+            sedml_locations = archive.locationsByFormat(formatKey="sed-ml")
 
             # run all sedml files
             results = {}
-            sedml_paths = [os.path.join(extractDir, loc) for loc in sedml_locations]
-            for sedmlFile in sedml_paths:
-                factory = SEDMLCodeFactory(sedmlFile,
-                                           workingDir=os.path.dirname(sedmlFile),
-                                           createOutputs=createOutputs,
-                                           saveOutputs=saveOutputs,
-                                           outputDir=outputDir,
-                                           plottingEngine=plottingEngine
-                                           )
+            for location in sedml_locations:
+                sedmlFile = os.path.join(extractDir, location)
+                if workingDir is None:
+                    # read from the archive in memory
+                    factory = SEDMLCodeFactory(archive.readString(location),
+                                               workingDir=os.path.dirname(sedmlFile),
+                                               createOutputs=createOutputs,
+                                               saveOutputs=saveOutputs,
+                                               outputDir=outputDir,
+                                               plottingEngine=plottingEngine,
+                                               archive=archive,
+                                               archiveLocation=location
+                                               )
+                else:
+                    factory = SEDMLCodeFactory(sedmlFile,
+                                               workingDir=os.path.dirname(sedmlFile),
+                                               createOutputs=createOutputs,
+                                               saveOutputs=saveOutputs,
+                                               outputDir=outputDir,
+                                               plottingEngine=plottingEngine
+                                               )
                 if printPython:
                     code = factory.toPython()
                     print(code)
 
-                results[sedmlFile] = factory.executePython()
+                results[sedmlFile] = factory.executePython(workers=workers)
 
             return results
         finally:
+            archive.close()
             shutil.rmtree(tmp_dir)
     else:
         if not os.path.exists(omexPath):
@@ -376,13 +396,25 @@ class SEDMLCodeFactory(object):
                  createOutputs=True,
                  saveOutputs=False,
                  outputDir=None,
-                 plottingEngine=None
+                 plottingEngine=None,
+                 nativeRepeatedTasks=True,
+                 iterationWorkers=1,
+                 archive=None,
+                 archiveLocation=None
                  ):
         """ Create CodeFactory for given input.
 
         :param inputStr:
         :param workingDir:
         :param createOutputs: if outputs should be created
+        :param nativeRepeatedTasks: execute RepeatedTasks with the RepeatedTaskExecutor
+            instead of generated python loops
+        :param iterationWorkers: number of processes running the iterations of
+            RepeatedTasks which reset the models, None uses all CPUs
+        :param archive: OmexReader of the COMBINE archive containing the SED-ML;
+            models are read from the archive in memory, data files used by the
+            SED-ML are extracted to the workingDir.
+        :param archiveLocation: location of the SED-ML in the archive
 
         :return:
         :rtype:
@@ -396,8 +428,15 @@ class SEDMLCodeFactory(object):
         self.outputDir = outputDir
         self.plotFormat = "pdf"
         self.reportFormat = "csv"
-
-        if not plottingEngine:
+        self.nativeRepeatedTasks = nativeRepeatedTasks
+        self.iterationWorkers = iterationWorkers
+        self.archive = archive
+        self.archiveLocation = archiveLocation
+        # archive and temporary directory opened by the factory, see close
+        self._ownedArchive = None
+        self._tempDir = None
+
+        if not plottingEngine and createOutputs:
             plottingEngine = te.getPlottingEngine()
         self.plottingEngine = plottingEngine
 
@@ -410,12 +449,68 @@ class SEDMLCodeFactory(object):
         self.doc = info['doc']
         self.inputType = info['inputType']
         self.workingDir = info['workingDir']
+        if 'archive' in info:
+            self.archive = info['archive']
+            self.archiveLocation = info['archiveLocation']
+            self._ownedArchive = self.archive
+        self._tempDir = info.get('tempDir')
+        # content key of the document, None if not cached
+        entry = info.get('cacheEntry')
+        self.documentKey = entry['documentKey'] if entry is not None else None
 
         # parse the models (resolve the source models & the applied changes for all models)
-        model_sources, model_changes = SEDMLTools.resolveModelChanges(self.doc)
+        if entry is not None and 'model_sources' in entry:
+            model_sources, model_changes = entry['model_sources'], entry['model_changes']
+        else:
+            model_sources, model_changes = SEDMLTools.resolveModelChanges(self.doc)
+            if entry is not None:
+                entry['model_sources'], entry['model_changes'] = model_sources, model_changes
         self.model_sources = model_sources
         self.model_changes = model_changes
 
+        if self.archive is not None:
+            try:
+                self._extractDataSources()
+            except Exception:
+                self.close()
+                raise
+
+    def close(self):
+        """ Closes the archive and removes the temporary working directory.
+
+        Only the archive and the directory created by the factory for a COMBINE
+        archive input are released, an archive passed to the factory is closed
+        by the caller. The factory can not execute archives after closing.
+        """
+        if self._ownedArchive is not None:
+            self._ownedArchive.close()
+            self._ownedArchive = None
+        if self._tempDir is not None:
+            shutil.rmtree(self._tempDir, ignore_errors=True)
+            self._tempDir = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _extractDataSources(self):
+        """ Extracts the data files of the DataDescriptions from the archive.
+
+        Only the referenced entries are decompressed, existing files are kept.
+        """
+        if not os.path.exists(self.workingDir):
+            os.makedirs(self.workingDir)
+        for dataDescription in self.doc.getListOfDataDescriptions():
+            source = dataDescription.getSource()
+            if source.startswith('http') or source.startswith('HTTP'):
+                continue
+            location = self.archive.resolve(source, self.archiveLocation)
+            path = os.path.join(self.workingDir, source)
+            if location in self.archive and not os.path.exists(path):
+                self.archive.extract(location, path)
+
     def __str__(self):
         """ Print.
 
@@ -440,31 +535,61 @@ class SEDMLCodeFactory(object):
         """
         return libsedml.writeSedMLToString(self.doc)
 
-    def toPython(self, python_template='tesedml_template.template'):
+    # sections of the generated code
+    SECTIONS = ['models', 'dataDescriptions', 'tasks', 'dataGenerators', 'outputs']
+
+    def _sections(self, sections=None):
+        """ Elements of the SED-ML document rendered in the code sections.
+
+        :param sections: dictionary of section name to list of SED-ML elements;
+            sections not in the dictionary contain all elements of the document
+        :return: dictionary of all sections
+        """
+        doc = self.doc
+        parts = {
+            'models': list(doc.getListOfModels()),
+            'dataDescriptions': list(doc.getListOfDataDescriptions()),
+            'tasks': list(doc.getListOfTasks()),
+            'dataGenerators': list(doc.getListOfDataGenerators()),
+            'outputs': list(doc.getListOfOutputs()),
+        }
+        if sections is not None:
+            for key, elements in sections.items():
+                if key not in parts:
+                    raise KeyError("Unknown code section '{}', use one of {}".format(key, self.SECTIONS))
+                parts[key] = list(elements)
+        return parts
+
+    @timed('sedml.toPython')
+    def toPython(self, python_template='tesedml_template.template', sections=None):
         """ Create python code by rendering the python template.
         Uses the information in the SED-ML document to create
         python code
 
         Renders the respective template.
 
+        :param python_template: name of the template
+        :param sections: optional dictionary restricting the rendered elements. Keys are
+            the names in SECTIONS, values lists of SED-ML elements. Sections which are
+            not in the dictionary contain all elements of the document.
+        The code is cached (see :mod:`tellurium.sedml.codecache`), repeated calls
+        for the same document and options return the cached code.
+
         :return: returns the rendered template
         :rtype: str
         """
-        # template environment
-        env = jinja2.Environment(loader=jinja2.FileSystemLoader(self.TEMPLATE_DIR),
-                          extensions=['jinja2.ext.autoescape'],
-                          trim_blocks=True,
-                          lstrip_blocks=True)
+        return codecache.cachedCode(self._codeKey(python_template, sections),
+                                    lambda: self._renderPython(python_template, sections))
+
+    def _renderPython(self, python_template, sections):
+        """ Render the template, see :func:`toPython`. """
+        # template environment (shared, the factory is passed in the context)
+        env = codecache.templateEnvironment(self.TEMPLATE_DIR)
 
         # additional filters
         # for key in sedmlfilters.filters:
         #      env.filters[key] = getattr(sedmlfilters, key)
         template = env.get_template(python_template)
-        env.globals['modelToPython'] = self.modelToPython
-        env.globals['dataDescriptionToPython'] = self.dataDescriptionToPython
-        env.globals['taskToPython'] = self.taskToPython
-        env.globals['dataGeneratorToPython'] = self.dataGeneratorToPython
-        env.globals['outputToPython'] = self.outputToPython
 
         # timestamp
         time = datetime.datetime.now()
@@ -478,38 +603,95 @@ class SEDMLCodeFactory(object):
             'doc': self.doc,
             'model_sources': self.model_sources,
             'model_changes': self.model_changes,
+            'sections': self._sections(sections),
+            'modelToPython': self.modelToPython,
+            'dataDescriptionToPython': self.dataDescriptionToPython,
+            'taskToPython': functools.partial(self.taskToPython, native=self.nativeRepeatedTasks,
+                                              workers=self.iterationWorkers),
+            'dataGeneratorToPython': functools.partial(self.dataGeneratorToPython,
+                                                       native=self.nativeRepeatedTasks),
+            'outputToPython': self.outputToPython,
         }
         pysedml = template.render(c)
 
         return pysedml
 
-    def executePython(self):
+    @property
+    def plottingEngineName(self):
+        """ Name of the plotting engine, None if not set. """
+        engine = self.plottingEngine
+        if engine is None or isinstance(engine, str):
+            return engine
+        return type(engine).__name__
+
+    def _codeKey(self, python_template, sections):
+        """ Cache key of the generated code, None if the document is not cached.
+
+        The key covers the document content, the content of the archive, the
+        options of the factory and the tellurium version. The working directory
+        and the archive are not part of the code, they are provided to the code
+        on execution, so runs from other directories reuse the code.
+        """
+        if self.documentKey is None:
+            return None
+        parts = ['code', te.getTelluriumVersion(), self.documentKey, python_template, self.inputType,
+                 self.createOutputs, self.saveOutputs, self.outputDir, self.plottingEngineName,
+                 self.plotFormat, self.reportFormat, self.nativeRepeatedTasks, self.iterationWorkers,
+                 os.environ.get('PROCESS_TRACE', ''), self.archiveLocation,
+                 self.archive.contentKey() if self.archive is not None else None]
+        if sections is not None:
+            for key in sorted(sections):
+                parts.append(key)
+                parts.extend(element.getId() for element in sections[key])
+        return contentHash(*parts)
+
+    @timed('sedml.executePython')
+    def executePython(self, workers=1):
         """ Executes python code.
 
         The python code is created during the function call.
         See :func:`createpython`
 
+        With more than one worker the tasks are split in groups of independent tasks
+        (see :func:`independentTaskGroups`). Every group is executed on a process pool
+        with its own model instances, the data generators and outputs are created
+        from the gathered task results in the calling process.
+
+        :param workers: number of worker processes for the tasks, None uses all CPUs
         :return: returns dictionary of information with keys
         """
+        from tellurium.roadrunner.parallel import defaultWorkers
+        workers = defaultWorkers(workers)
+        groups = self.independentTaskGroups() if workers > 1 else []
+        if len(groups) > 1:
+            return self._executeParallel(groups, workers)
+
         result = {}
         code = self.toPython()
         result['code'] = code
         result['platform'] = platform.platform()
+        return self._executeCode(code, symbols={}, result=result)
+
+    def _executeCode(self, code, symbols, result):
+        """ Executes the code in the given symbols and reads the data generators.
 
+        :param code: python code
+        :param symbols: global symbols of the execution
+        :param result: dictionary the data generators are added to
+        :return: result
+        """
         # FIXME: better solution for exec traceback
         filename = os.path.join(tempfile.gettempdir(), 'te-generated-sedml.py')
 
         try:
             # Use of exec carries the usual security warnings
-            symbols = {}
-            exec(compile(code, filename, 'exec'), symbols)
-
-            # read information from exec symbols
-            dg_data = {}
-            for dg in self.doc.getListOfDataGenerators():
-                dg_id = dg.getId()
-                dg_data[dg_id] = symbols[dg_id]
-            result['dataGenerators'] = dg_data
+            symbols['__workingDir__'] = self.workingDir
+            symbols['__archive__'] = self.archive
+            with profiling.span('sedml.exec'):
+                exec(codecache.compileCode(code, filename), symbols)
+
+            # data generators are evaluated lazily on access
+            result['dataGenerators'] = symbols['__dataGenerators__']
             return result
 
         except:
@@ -518,6 +700,102 @@ class SEDMLCodeFactory(object):
                 f.write(code)
             raise
 
+    def _executeParallel(self, groups, workers):
+        """ Executes the groups of independent tasks on a process pool.
+
+        Every worker runs the code of one group, i.e. loads the models of the group
+        and runs its tasks. The task results are sent back as columns and the
+        data generators and outputs are evaluated on them in this process.
+
+        :param groups: list of (model ids, tasks) from :func:`independentTaskGroups`
+        :param workers: maximal number of worker processes
+        :return: returns dictionary of information with keys
+        """
+        taskCode = []
+        for mids, tasks in groups:
+            models = [m for m in self.doc.getListOfModels() if m.getId() in mids]
+            code = self.toPython(sections={'models': models, 'dataDescriptions': [], 'tasks': tasks,
+                                           'dataGenerators': [], 'outputs': []})
+            taskCode.append((code, [t.getId() for t in tasks], self.workingDir, self.archive))
+
+        result = {}
+        code = self.toPython(sections={'models': [], 'tasks': []})
+        result['code'] = code
+        result['taskCode'] = [item[0] for item in taskCode]
+        result['platform'] = platform.platform()
+
+        symbols = {}
+        pool = multiprocessing.Pool(processes=min(workers, len(taskCode)))
+        try:
+            for taskResults in pool.imap_unordered(_executeTaskCode, taskCode):
+                symbols.update(taskResults)
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+
+        return self._executeCode(code, symbols=symbols, result=result)
+
+    @staticmethod
+    def modelsForTask(doc, task):
+        """ Ids of all models used by the task and its subtasks.
+
+        Besides the models of the simple tasks these are the models changed by
+        SetValues and the models read by the variables of SetValues and ranges.
+
+        :param doc: sedml document
+        :param task: SedTask or SedRepeatedTask
+        :return: set of model ids
+        """
+        mids = set()
+        for node in SEDMLCodeFactory.createTaskTree(doc, rootTask=task):
+            t = node.task
+            if t.getTypeCode() == libsedml.SEDML_TASK:
+                mids.add(t.getModelReference())
+            elif t.getTypeCode() == libsedml.SEDML_TASK_REPEATEDTASK:
+                for setValue in t.getListOfTaskChanges():
+                    mids.add(setValue.getModelReference())
+                    for var in setValue.getListOfVariables():
+                        mids.add(var.getModelReference())
+                for r in t.getListOfRanges():
+                    if r.getTypeCode() == libsedml.SEDML_RANGE_FUNCTIONALRANGE:
+                        for var in r.getListOfVariables():
+                            mids.add(var.getModelReference())
+        mids.discard('')
+        return mids
+
+    def independentTaskGroups(self):
+        """ Groups of tasks which can be executed independently of each other.
+
+        This is the dependency graph of tasks and models reduced to its connected
+        components: tasks sharing a model are in the same group, because changes
+        of the model state by one task are seen by the following tasks. Within a
+        group the tasks are in document order. Tasks not referenced by any
+        DataGenerator are not executed and not part of any group.
+
+        :return: list of (set of model ids, list of tasks)
+        """
+        doc = self.doc
+        groups = []
+        for task in doc.getListOfTasks():
+            if len(SEDMLCodeFactory.getDataGeneratorsForTask(doc, task)) == 0:
+                continue
+            mids = SEDMLCodeFactory.modelsForTask(doc, task)
+            tasks = [task]
+            # merge all groups sharing a model with the task
+            for group in [g for g in groups if g[0] & mids]:
+                groups.remove(group)
+                mids = mids | group[0]
+                tasks = group[1] + tasks
+
+            groups.append((mids, tasks))
+
+        order = dict((t.getId(), k) for k, t in enumerate(doc.getListOfTasks()))
+        groups = [(mids, sorted(tasks, key=lambda t: order[t.getId()])) for mids, tasks in groups]
+        return sorted(groups, key=lambda g: order[g[1][0].getId()])
+
     def modelToPython(self, model):
         """ Python code for SedModel.
 
@@ -548,6 +826,9 @@ class SEDMLCodeFactory(object):
                 lines.append("{} = te.loadSBMLModel(__{}_sbml)".format(mid, mid))
             elif isHttp():
                 lines.append("{} = te.loadSBMLModel('{}')".format(mid, source))
+            elif self.archive is not None:
+                lines.append("{} = te.loadSBMLModel(__archive__.readString('{}'))".format(
+                    mid, self.archive.resolve(source, self.archiveLocation)))
             else:
                 lines.append("{} = te.loadSBMLModel(os.path.join(workingDir, '{}'))".format(mid, source))
         # read CellML
@@ -555,6 +836,9 @@ class SEDMLCodeFactory(object):
             warnings.warn("CellML model encountered. Tellurium CellML support is very limited.".format(language))
             if isHttp():
                 lines.append("{} = te.loadCellMLModel('{}')".format(mid, source))
+            elif self.archive is not None:
+                lines.append("{} = te.loadCellMLModel(__archive__.readString('{}'))".format(
+                    mid, self.archive.resolve(source, self.archiveLocation)))
             else:
                 lines.append("{} = te.loadCellMLModel(os.path.join(workingDir, '{}'))".format(mid, self.model_sources[mid]))
         # other
@@ -625,6 +909,10 @@ class SEDMLCodeFactory(object):
     def dataDescriptionToPython(self, dataDescription):
         """ Python code for DataDescription.
 
+        The data is loaded when the code is executed and the data sources are
+        bound by reference (see :func:`DataDescriptionParser.load`), the code
+        does not contain the data.
+
         :param dataDescription: SedModel instance
         :type dataDescription: DataDescription
         :return: python str
@@ -633,21 +921,19 @@ class SEDMLCodeFactory(object):
         lines = []
 
         from tellurium.sedml.data import DataDescriptionParser
-        data_sources = DataDescriptionParser.parse(dataDescription, self.workingDir)
-
-        def data_to_string(data):
-            info = np.array2string(data)
-            # cleaner string and NaN handling
-            info = info.replace('\n', ', ').replace('\r', '').replace('nan', 'np.nan')
-            return info
-
-        for sid, data in data_sources.items():
-            # handle the 1D shapes
-            if len(data.shape) == 1:
-                data = np.reshape(data.values, (data.shape[0], 1))
+        did = dataDescription.getId()
+        source = dataDescription.getSource()
+        if source.startswith('http') or source.startswith('HTTP'):
+            path = repr(str(source))
+        else:
+            path = "os.path.join(workingDir, {})".format(repr(str(source)))
+        sources = DataDescriptionParser.dataSourceSpecs(dataDescription)
 
-            array_str = data_to_string(data)
-            lines.append("{} = np.array({})".format(sid, array_str))
+        lines.append("from tellurium.sedml.data import DataDescriptionParser")
+        lines.append("__data__{} = DataDescriptionParser.load({}, format={}, sources={}, columns=True)".format(
+            did, path, repr(DataDescriptionParser.formatOf(dataDescription)), pprint.pformat(sources)))
+        for sid, indexSet, slices in sources:
+            lines.append("{} = __data__{}['{}']".format(sid, did, sid))
 
         return '\n'.join(lines)
 
@@ -657,13 +943,15 @@ class SEDMLCodeFactory(object):
     # transformation of tasks to python code
     ################################################################################################
     @staticmethod
-    def taskToPython(doc, task):
+    def taskToPython(doc, task, native=False, workers=1):
         """ Create python for arbitrary task (repeated or simple).
 
         :param doc:
         :type doc:
         :param task:
         :type task:
+        :param native: RepeatedTasks are run by the RepeatedTaskExecutor
+        :param workers: number of processes of the RepeatedTaskExecutor
         :return:
         :rtype:
         """
@@ -679,6 +967,13 @@ class SEDMLCodeFactory(object):
 
         # resolve task tree (order & dependency of tasks) & generate code
         taskTree = SEDMLCodeFactory.createTaskTree(doc, rootTask=task)
+        if native and task.getTypeCode() == libsedml.SEDML_TASK_REPEATEDTASK:
+            tid = task.getId()
+            spec = SEDMLCodeFactory.repeatedTaskSpec(doc, taskTree)
+            return "\n".join([
+                "__spec__{} = {}".format(tid, pprint.pformat(spec)),
+                "{} = RepeatedTaskExecutor(__spec__{}).run(globals(), workers={})".format(tid, tid, workers),
+            ])
         return SEDMLCodeFactory.taskTreeToPython(doc, tree=taskTree)
 
     class TaskNode(object):
@@ -764,6 +1059,54 @@ class SEDMLCodeFactory(object):
         add_children(root)
         return root
 
+    @staticmethod
+    def repeatedTaskSpec(doc, node):
+        """ Specification of a task tree for the RepeatedTaskExecutor.
+
+        See :mod:`tellurium.sedml.executor` for the keys. The iterations are
+        independent if the models are reset in every iteration and no value
+        in the tree is computed from the model state.
+
+        :param doc: sedml document
+        :param node: taskNode of the task
+        :return: dictionary
+        """
+        task = node.task
+        if task.getTypeCode() == libsedml.SEDML_TASK:
+            return {
+                'type': 'task',
+                'id': task.getId(),
+                'code': "\n".join(SEDMLCodeFactory.simpleTaskToPython(doc, node)),
+            }
+        elif task.getTypeCode() != libsedml.SEDML_TASK_REPEATEDTASK:
+            raise IOError('Unsupported task type: {}'.format(task.getElementName()))
+
+        rangeLines, forLines = SEDMLCodeFactory.repeatedTaskParts(doc, node)
+        independent = task.getResetModel()
+        for r in task.getListOfRanges():
+            if r.getTypeCode() == libsedml.SEDML_RANGE_FUNCTIONALRANGE and r.getNumVariables() > 0:
+                independent = False
+        for child in node:
+            t = child.task
+            if t.getTypeCode() == libsedml.SEDML_TASK_REPEATEDTASK:
+                for setValue in t.getListOfTaskChanges():
+                    if setValue.getNumVariables() > 0:
+                        independent = False
+                for r in t.getListOfRanges():
+                    if r.getTypeCode() == libsedml.SEDML_RANGE_FUNCTIONALRANGE and r.getNumVariables() > 0:
+                        independent = False
+
+        return {
+            'type': 'repeatedTask',
+            'id': task.getId(),
+            'range': task.getRangeId(),
+            'ranges': "\n".join(rangeLines),
+            'iteration': "\n".join(forLines),
+            'models': sorted(SEDMLCodeFactory.modelsForTask(doc, task)),
+            'independent': bool(independent),
+            'subtasks': [SEDMLCodeFactory.repeatedTaskSpec(doc, child) for child in node.children],
+        }
+
     @staticmethod
     def getOrderedSubtasks(task):
         """ Ordered list of subtasks for task."""
@@ -1071,6 +1414,35 @@ class SEDMLCodeFactory(object):
         task = node.task
         lines = ["", "{} = []".format(task.getId())]
 
+        rangeLines, forLines = SEDMLCodeFactory.repeatedTaskParts(doc, node)
+        lines.extend(rangeLines)
+
+        # <Range Iteration>
+        # iterate master range
+        rangeId = task.getRangeId()
+        lines.append("for __k__{}, __value__{} in enumerate(__range__{}):".format(rangeId, rangeId, rangeId))
+
+        # add lines
+        lines.extend('    ' + line for line in forLines)
+
+        return lines
+
+    @staticmethod
+    def repeatedTaskParts(doc, node):
+        """ Python for the ranges and the iterations of a RepeatedTask.
+
+        The range lines define the ranges before the iteration starts. The
+        iteration lines are executed in every iteration of the master range
+        with __k__<rangeId> and __value__<rangeId> set, they define the
+        values of the lock-in ranges and reset the models.
+
+        :param doc: sedml document
+        :param node: taskNode of the RepeatedTask
+        :return: tuple (range lines, iteration lines)
+        """
+        task = node.task
+        lines = []
+
         # <Range Definition>
         # master range
         rangeId = task.getRangeId()
@@ -1089,10 +1461,6 @@ class SEDMLCodeFactory(object):
                 elif r.getTypeCode() == libsedml.SEDML_RANGE_VECTORRANGE:
                     lines.extend(SEDMLCodeFactory.vectorRangeToPython(r))
 
-        # <Range Iteration>
-        # iterate master range
-        lines.append("for __k__{}, __value__{} in enumerate(__range__{}):".format(rangeId, rangeId, rangeId))
-
         # Everything from now on is done in every iteration of the range
         # We have to collect & intent all lines in the loop)
         forLines = []
@@ -1123,7 +1491,8 @@ class SEDMLCodeFactory(object):
                         expr = selection.id
                         if selection.type == 'concentration':
                             expr = "[{}]".format(selection.id)
-                        lines.append("__value__{} = {}['{}']".format(vid, mid, expr))
+                        # read the current state of the model in every iteration
+                        forLines.append("__value__{} = {}['{}']".format(vid, mid, expr))
                         variables[vid] = "__value__{}".format(vid)
 
                     # value is calculated with the current state of model
@@ -1147,10 +1516,7 @@ class SEDMLCodeFactory(object):
                 forLines.append("if __k__{} == 0:".format(rangeId))
                 forLines.append("    {}.reset()".format(mid))
 
-        # add lines
-        lines.extend('    ' + line for line in forLines)
-
-        return lines
+        return lines, forLines
 
     ################################################################################################
 
@@ -1397,7 +1763,7 @@ class SEDMLCodeFactory(object):
 
 
     @staticmethod
-    def dataGeneratorToPython(doc, generator):
+    def dataGeneratorToPython(doc, generator, native=False):
         """ Create variable from the data generators and the simulation results and data sources.
 
             The data of repeatedTasks is handled differently depending
@@ -1406,6 +1772,13 @@ class SEDMLCodeFactory(object):
                 every repeat is a single curve, i.e. the data is a list of data
             reset=False:
                 all curves belong to a single simulation and are concatenated to one dataset
+
+            With native=True the repeatedTasks are TaskResults of the RepeatedTaskExecutor,
+            which concatenate the columns directly from the result tensor.
+
+            The data generator is defined as function registered in __dataGenerators__
+            and only evaluated when an output or the caller reads it. The math is
+            evaluated elementwise on the numpy arrays (see :func:`vectorizedMathML`).
         """
         lines = []
         gid = generator.getId()
@@ -1442,8 +1815,12 @@ class SEDMLCodeFactory(object):
                 if selection.type == "concentration":
                     sid = "[{}]".format(selection.id)
 
+                isNative = native and task.getTypeCode() == libsedml.SEDML_TASK_REPEATEDTASK
+                if isNative and not _processTrace():
+                    lines.append("__var__{} = {}.concatenate('{}', offsets={})".format(
+                        varId, taskId, sid, (not resetModel) and isTime))
                 # Series of curves
-                if resetModel is True:
+                elif resetModel is True:
                     # If each entry in the task consists of a single point (e.g. steady state scan)
                     # , concatenate the points. Otherwise, plot as separate curves.
                     import os
@@ -1474,16 +1851,43 @@ class SEDMLCodeFactory(object):
                     warnings.warn("Unknown target in variable, no reference to SId: {}".format(target))
 
         # calculate data generator
-        value = evaluableMathML(mathml, variables=variables, array=True)
-        lines.append("{} = {}".format(gid, value))
+        value = vectorizedMathML(mathml, variables=variables)
+        lines.append("return {}".format(value))
 
-        return "\n".join(lines)
+        code = ["def __compute__{}():".format(gid)]
+        code.extend("    " + line for line in lines)
+        code.append("__dataGenerators__.add('{}', __compute__{})".format(gid, gid))
+        return "\n".join(code)
 
 
+    @staticmethod
+    def dataGeneratorsForOutput(output):
+        """ Ids of the data generators used by the output.
+
+        :param output: SedOutput
+        :return: list of data generator ids
+        """
+        typeCode = output.getTypeCode()
+        dgIds = []
+        if typeCode == libsedml.SEDML_OUTPUT_REPORT:
+            for dataSet in output.getListOfDataSets():
+                dgIds.append(dataSet.getDataReference())
+        elif typeCode == libsedml.SEDML_OUTPUT_PLOT2D:
+            for curve in output.getListOfCurves():
+                dgIds.extend([curve.getXDataReference(), curve.getYDataReference()])
+        elif typeCode == libsedml.SEDML_OUTPUT_PLOT3D:
+            for surf in output.getListOfSurfaces():
+                dgIds.extend([surf.getXDataReference(), surf.getYDataReference(), surf.getZDataReference()])
+        return [dgId for k, dgId in enumerate(dgIds) if dgId and dgId not in dgIds[:k]]
+
     def outputToPython(self, doc, output):
         """ Create output """
         lines = []
         typeCode = output.getTypeCode()
+        # evaluate only the data generators of the output
+        dgIds = SEDMLCodeFactory.dataGeneratorsForOutput(output)
+        if dgIds:
+            lines.append("__dataGenerators__.evaluate({})".format(dgIds))
         if typeCode == libsedml.SEDML_OUTPUT_REPORT:
             lines.extend(SEDMLCodeFactory.outputReportToPython(self, doc, output))
         elif typeCode == libsedml.SEDML_OUTPUT_PLOT2D:
@@ -1775,17 +2179,27 @@ class SEDMLTools(object):
     def readSEDMLDocument(cls, inputStr, workingDir):
         """ Parses SedMLDocument from given input.
 
-        :return: dictionary of SedDocument, inputType and working directory.
-        :rtype: {doc, inputType, workingDir}
+        :return: dictionary of SedDocument, inputType, working directory and the
+            cache entry of the document (None if not cached). For archives the
+            OmexReader and the location of the SED-ML are added, and the temporary
+            directory if no working directory is given. The caller closes the
+            archive and removes the temporary directory.
+        :rtype: {doc, inputType, workingDir, cacheEntry[, archive, archiveLocation, tempDir]}
         """
 
+        # parsed documents are cached by content
+        cacheEntry = None
+        archive = None
+        tempDir = None
+
         # SEDML-String
         if not os.path.exists(inputStr):
             try:
                 from xml.etree import ElementTree
                 x = ElementTree.fromstring(inputStr)
                 # is parsable xml string
-                doc = libsedml.readSedMLFromString(inputStr)
+                cacheEntry = codecache.cachedDocument(inputStr, lambda: libsedml.readSedMLFromString(inputStr))
+                doc = cacheEntry['doc']
                 inputType = cls.INPUT_TYPE_STR
                 if workingDir is None:
                     workingDir = os.getcwd()
@@ -1803,34 +2217,35 @@ class SEDMLTools(object):
                 omexPath = inputStr
                 inputType = cls.INPUT_TYPE_FILE_COMBINE
 
-                # in case of sedx and combine a working directory is created
-                # in which the files are extracted
-                if workingDir is None:
-                    extractDir = os.path.join(os.path.dirname(os.path.realpath(omexPath)), '_te_{}'.format(filename))
-                else:
-                    extractDir = workingDir
-
-
-                # TODO: refactor this
-                # extract the archive to working directory
-                CombineArchive.extractArchive(omexPath, extractDir)
-                # get SEDML files from archive
-                sedmlFiles = CombineArchive.filePathsFromExtractedArchive(extractDir, filetype='sed-ml')
+                # the SED-ML and models are read from the archive in memory,
+                # only data files are extracted to the working directory
+                archive = omex.OmexReader(omexPath)
+                try:
+                    sedmlLocations = archive.locationsByFormat('sed-ml')
+
+                    if len(sedmlLocations) == 0:
+                        raise IOError("No SEDML files found in archive.")
+
+                    # FIXME: there could be multiple SEDML files in archive (currently only first used)
+                    # analogue to executeOMEX
+                    if len(sedmlLocations) > 1:
+                        warnings.warn("More than one sedml file in archive, only processing first one.")
+
+                    archiveLocation = sedmlLocations[0]
+                    content = archive.read(archiveLocation)
+                    cacheEntry = codecache.cachedDocument(content, lambda: libsedml.readSedMLFromString(
+                        content.decode('utf-8')))
+                    doc = cacheEntry['doc']
+                    cls.checkSEDMLDocument(doc)
+                except Exception:
+                    archive.close()
+                    raise
 
-                if len(sedmlFiles) == 0:
-                    raise IOError("No SEDML files found in archive.")
-
-                # FIXME: there could be multiple SEDML files in archive (currently only first used)
-                # analogue to executeOMEX
-                if len(sedmlFiles) > 1:
-                    warnings.warn("More than one sedml file in archive, only processing first one.")
-
-                sedmlFile = sedmlFiles[0]
-                doc = libsedml.readSedMLFromFile(sedmlFile)
+                if workingDir is None:
+                    tempDir = tempfile.mkdtemp(prefix='te_{}_'.format(filename))
+                    workingDir = tempDir
                 # we have to work relative to the SED-ML file
-                workingDir = os.path.dirname(sedmlFile)
-
-                cls.checkSEDMLDocument(doc)
+                workingDir = os.path.join(workingDir, os.path.dirname(archiveLocation))
 
 
             # SEDML single file
@@ -1838,15 +2253,25 @@ class SEDMLTools(object):
                 if extension not in [".sedml", '.xml']:
                     raise IOError("SEDML file should have [.sedml|.xml] extension:", inputStr)
                 inputType = cls.INPUT_TYPE_FILE_SEDML
-                doc = libsedml.readSedMLFromFile(inputStr)
+                with open(inputStr, 'rb') as f:
+                    content = f.read()
+                cacheEntry = codecache.cachedDocument(content, lambda: libsedml.readSedMLFromFile(inputStr))
+                doc = cacheEntry['doc']
                 cls.checkSEDMLDocument(doc)
                 # working directory is where the sedml file is
                 if workingDir is None:
                     workingDir = os.path.dirname(os.path.realpath(inputStr))
 
-        return {'doc': doc,
+        info = {'doc': doc,
                 'inputType': inputType,
-                'workingDir': workingDir}
+                'workingDir': workingDir,
+                'cacheEntry': cacheEntry}
+        if archive is not None:
+            info['archive'] = archive
+            info['archiveLocation'] = archiveLocation
+        if tempDir is not None:
+            info['tempDir'] = tempDir
+        return info
 
     @staticmethod
     def resolveModelChanges(doc):
@@ -1904,6 +2329,37 @@ class SEDMLTools(object):
         return model_sources, all_changes
 
 
+def _taskResultToColumns(sim):
+    """ Picklable dictionary of columns for a task result (NamedArray). """
+    if sim is None:
+        return None
+    return dict((name, np.array(sim[:, k])) for k, name in enumerate(sim.colnames))
+
+
+def _executeTaskCode(item):
+    """ Executes the code of a group of tasks in a worker process.
+
+    :param item: tuple (code, list of task ids, working directory, OmexReader or None)
+    :return: dictionary of task id to list of task results as columns
+    """
+    code, taskIds, workingDir, archive = item
+    filename = os.path.join(tempfile.gettempdir(), 'te-generated-sedml-tasks-{}.py'.format(os.getpid()))
+    try:
+        symbols = {'__workingDir__': workingDir, '__archive__': archive}
+        exec(codecache.compileCode(code, filename), symbols)
+    except:
+        with open(filename, 'w') as f:
+            f.write(code)
+        raise
+    results = {}
+    for tid in taskIds:
+        if isinstance(symbols[tid], TaskResult):
+            results[tid] = symbols[tid]
+        else:
+            results[tid] = [_taskResultToColumns(sim) for sim in symbols[tid]]
+    return results
+
+
 def process_trace(trace):
     """ If each entry in the task consists of a single point
     (e.g. steady state scan), concatenate the points.
@@ -1992,16 +2448,15 @@ if __name__ == "__main__":
         print('\n', '*'*100)
         print(sedmlInput)
         print('*'*100)
-        factory = SEDMLCodeFactory(sedmlInput)
-
-        # create python file
-        python_str = factory.toPython()
-        realPath = os.path.realpath(sedmlInput)
-        with open(sedmlInput + '.py', 'w') as f:
-            f.write(python_str)
-
-        # execute python
-        factory.executePython()
+        with SEDMLCodeFactory(sedmlInput) as factory:
+            # create python file
+            python_str = factory.toPython()
+            realPath = os.path.realpath(sedmlInput)
+            with open(sedmlInput + '.py', 'w') as f:
+                f.write(python_str)
+
+            # execute python
+            factory.executePython()
 
     # testInput(os.path.join(sedmlDir, "sedMLBIOM21.sedml"))
 
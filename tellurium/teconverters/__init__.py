@@ -1,13 +1,18 @@
-
 from __future__ import absolute_import
 
-# converts Antimony to/from SBML
-from .convert_antimony import antimonyConverter
-
-from .convert_omex import inlineOmexImporter, OmexFormatDetector
-
-from .convert_phrasedml import phrasedmlImporter
+# the conversion cache is used by the core model loading, the converters are
+# imported on first use (see tellurium.utils.lazy)
+from .conversion_cache import getConversionCache, setConversionCacheSize, clearConversionCache
 
-from .antimony_sbo import SBOError
+from ..utils.lazy import lazyAttributes
 
-from .inline_omex import inlineOmex, saveInlineOMEX
+__getattr__, __dir__ = lazyAttributes(__name__, globals(), {
+    # converts Antimony to/from SBML
+    'antimonyConverter': '.convert_antimony',
+    'inlineOmexImporter': '.convert_omex',
+    'OmexFormatDetector': '.convert_omex',
+    'phrasedmlImporter': '.convert_phrasedml',
+    'SBOError': '.antimony_sbo',
+    'inlineOmex': '.inline_omex',
+    'saveInlineOMEX': '.inline_omex',
+})
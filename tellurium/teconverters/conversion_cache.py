@@ -0,0 +1,94 @@
+"""
+Memoization of the Antimony/SBML/CellML interconversion functions.
+
+Results are cached by direction and content hash of the input, so repeated
+exports and SED-ML/OMEX round trips skip the reparsing. Antimony keeps its
+loaded modules in global library state, therefore all calls into the
+antimony library are serialized with :data:`ANTIMONY_LOCK`.
+"""
+from __future__ import print_function, division, absolute_import
+
+import os
+import functools
+import threading
+
+from ..utils.cache import LRUCache, contentHash
+from ..utils.profiling import timed
+
+# guards the global state of the antimony library
+ANTIMONY_LOCK = threading.RLock()
+
+_conversion_cache = LRUCache(maxsize=64)
+
+
+def getConversionCache():
+    """ The LRU cache holding conversion results. """
+    return _conversion_cache
+
+
+def setConversionCacheSize(maxsize):
+    """ Set the maximum number of cached conversion results.
+
+    A size of 0 disables the memoization of conversions.
+
+    :param maxsize: maximum number of cached results
+    :type maxsize: int
+    """
+    _conversion_cache.maxsize = maxsize
+
+
+def clearConversionCache():
+    """ Remove all cached conversion results. """
+    _conversion_cache.clear()
+
+
+def conversionKey(direction, source):
+    """ Cache key for converting source in the given direction.
+
+    Files are keyed by absolute path and content, because Antimony
+    resolves imports relative to the file location.
+
+    :param direction: conversion direction, e.g. 'antimony->sbml'
+    :param source: model string or path to model file
+    :return: hex digest
+    """
+    try:
+        isfile = os.path.isfile(source)
+    except (TypeError, ValueError):
+        isfile = False
+    if isfile:
+        with open(source, 'rb') as f:
+            return contentHash(direction, 'file', os.path.abspath(source), f.read())
+    return contentHash(direction, 'str', source)
+
+
+def synchronizedAntimony(func):
+    """ Decorator serializing calls of func on the antimony library lock. """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with ANTIMONY_LOCK:
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def memoizeConversion(direction):
+    """ Decorator memoizing a converter function with a single source argument.
+
+    :param direction: conversion direction used as part of the cache key
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        @timed('convert.' + direction)
+        def wrapper(source):
+            if _conversion_cache.maxsize == 0:
+                with ANTIMONY_LOCK:
+                    return func(source)
+            key = conversionKey(direction, source)
+            result = _conversion_cache.get(key)
+            if result is None:
+                with ANTIMONY_LOCK:
+                    result = func(source)
+                _conversion_cache.put(key, result)
+            return result
+        return wrapper
+    return decorator
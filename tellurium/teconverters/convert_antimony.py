@@ -1,12 +1,14 @@
 from __future__ import print_function, division, absolute_import
 
 from .antimony_sbo import antimonySBOConverter, antimonySBOParser
+from .conversion_cache import synchronizedAntimony
 
 class antimonyConverter(object):
     def checkAntimonyReturnCode(self, code):
         """Negative return code (usu. -1) from Antimony signifies error"""
         return (code < 0)
 
+    @synchronizedAntimony
     def sbmlToAntimony(self, sbml, addSBO=False):
         """ Converts a raw SBML string to Antimony source.
 
@@ -29,6 +31,7 @@ class antimonyConverter(object):
             sb_source = self.tryAddSBOTerms(sb_source, sbml_str=sbml)
         return (module, sb_source)
 
+    @synchronizedAntimony
     def sbmlFileToAntimony(self, sbml_path, addSBO=False):
         """ Converts a SBML file to Antimony source.
 
@@ -51,6 +54,7 @@ class antimonyConverter(object):
             sb_source = self.tryAddSBOTerms(sb_source, sbml_file=sbml_path)
         return (module, sb_source)
 
+    @synchronizedAntimony
     def cellmlFileToAntimony(self, sbml_path):
         """ Converts a CellML file to Antimony source.
 
@@ -71,6 +75,7 @@ class antimonyConverter(object):
         sb_source = sb.getAntimonyString(module)
         return (module, sb_source)
 
+    @synchronizedAntimony
     def antimonyToSBML(self, sb_str, SBO=False):
         """ Converts an Antimony string to raw SBML.
 
@@ -5,6 +5,16 @@ Write to latex.
 
 from __future__ import print_function, division
 import os.path
+import shutil
+import tempfile
+import numpy as np
+
+
+def _resultChunks(result):
+    """ Number of data columns and chunks of rows of a result array or simulation stream. """
+    if isinstance(result, np.ndarray):
+        return result.shape[1] - 1, [result]
+    return len(result.colnames) - 1, result
 
 
 class LatexExport(object):
@@ -89,19 +99,24 @@ class LatexExport(object):
             result = self.rr.getSimulationData()
 
         # write one data file per column
-        Ncol = result.shape[1] - 1
+        Ncol, chunks = _resultChunks(result)
         if len (self.color) < Ncol:
            raise StandardError ('The number of specified colors does not match the number of data columns') 
+        dataFiles = []
         for i in range(Ncol):
             dataPath = self._getPath(suffix='_data', count=i+1)
             print("writing data document: " + dataPath)
-
-            with open(dataPath, 'w') as f:
-                r = result[:, [0, (i+1)]]
-                for row in r:
-                    row.tolist()
-                    row = ' '.join(str(e) for e in row)
-                    f.write("{0}\n".format(row))
+            dataFiles.append(open(dataPath, 'w'))
+        try:
+            for chunk in chunks:
+                for i, f in enumerate(dataFiles):
+                    r = chunk[:, [0, (i+1)]]
+                    for row in r:
+                        row = ' '.join(str(e) for e in row)
+                        f.write("{0}\n".format(row))
+        finally:
+            for f in dataFiles:
+                f.close()
 
         # write one latex document
         latexPath = self._getPath(suffix='_code').replace('txt', 'tex')
@@ -133,44 +148,68 @@ class LatexExport(object):
             if self.exportComplete:
                 f.write('\\end{document}')
 
+    def _writeCoordinates(self, f, r, count):
+        """ Writes coordinates of a two column array, returns the updated coordinate count. """
+        for row in r:
+            coor = ', '.join(str(e) for e in row)
+            coor = '({})'.format(coor)
+            if count % self.coorPerRow == 0:
+                f.write('{}\n'.format(coor))
+            else:
+                f.write('{}'.format(coor))
+            count += 1
+        return count
+
     def saveToOneFile(self, result=None):
         """ Creates one .txt file with LaTeX code and results.
         Takes two arguments, results of
         simulation and name of file to be created. Same options as for saveToFile method.
+
+        The result can be a simulation stream (see :func:`ExtendedRoadRunner.simulateStream`),
+        in which case the coordinates are spooled to temporary files chunk by chunk.
         """
         if result is None:
             result = self.rr.getSimulationData()
 
-        Ncol = result.shape[1] - 1
+        Ncol, chunks = _resultChunks(result)
         if len (self.color) < Ncol:
            raise StandardError ('The number of specified colors does not match the number of data columns') 
+
+        spools = None
+        if not isinstance(result, np.ndarray):
+            # the stream can only be read once, collect the coordinates per column
+            spools = [tempfile.TemporaryFile(mode='w+') for i in range(Ncol)]
+            counts = [1] * Ncol
+            for chunk in chunks:
+                for i in range(Ncol):
+                    counts[i] = self._writeCoordinates(spools[i], chunk[:, [0, (i + 1)]], counts[i])
+
         latexPath = self._getPath(suffix='')
         print("writing latex document: " + latexPath)
-        with open(latexPath, 'w') as f:
-            if self.exportComplete is True:
-                f.write('\\documentclass{article}\n')
-                f.write('\\usepackage[usenames,dvipsnames]{color}\n')
-                f.write('\\usepackage{pgfplots}\n')
-                f.write('\\begin{document}\n\n')
-                
-            f.write('\\begin{tikzpicture}[scale = 1.0]\n')
-            f.write('\\begin{{axis}}[xlabel=${}$, ylabel=${}$, axis lines = middle, xlabel near'
-                    ' ticks, ylabel near ticks]\n'.format(self.xlabel, self.ylabel))
-            for i in range(Ncol):
-                f.write('\\addplot[line width = 2pt, %s] coordinates {\n' % (self.color[i]))
-                r = result[:, [0,(i + 1)]]
-                count = 1
-                for row in r:
-                    row.tolist()
-                    coor = ', '.join(str(e) for e in row)
-                    coor = '({})'.format(coor)
-                    if count % self.coorPerRow == 0:
-                        f.write('{}\n'.format(coor))
+        try:
+            with open(latexPath, 'w') as f:
+                if self.exportComplete is True:
+                    f.write('\\documentclass{article}\n')
+                    f.write('\\usepackage[usenames,dvipsnames]{color}\n')
+                    f.write('\\usepackage{pgfplots}\n')
+                    f.write('\\begin{document}\n\n')
+
+                f.write('\\begin{tikzpicture}[scale = 1.0]\n')
+                f.write('\\begin{{axis}}[xlabel=${}$, ylabel=${}$, axis lines = middle, xlabel near'
+                        ' ticks, ylabel near ticks]\n'.format(self.xlabel, self.ylabel))
+                for i in range(Ncol):
+                    f.write('\\addplot[line width = 2pt, %s] coordinates {\n' % (self.color[i]))
+                    if spools is None:
+                        self._writeCoordinates(f, result[:, [0, (i + 1)]], 1)
                     else:
-                        f.write('{}'.format(coor))
-                    count += 1
-                f.write('\n};\n')
-            f.write('\\end{axis}\n')
-            f.write('\\end{tikzpicture}\n\n')
-            if self.exportComplete is True:
-                f.write('\\end{document}')
+                        spools[i].seek(0)
+                        shutil.copyfileobj(spools[i], f)
+                    f.write('\n};\n')
+                f.write('\\end{axis}\n')
+                f.write('\\end{tikzpicture}\n\n')
+                if self.exportComplete is True:
+                    f.write('\\end{document}')
+        finally:
+            if spools is not None:
+                for spool in spools:
+                    spool.close()
@@ -0,0 +1,159 @@
+"""
+Sinks for chunked simulation results.
+
+A sink receives the chunks of a :class:`tellurium.roadrunner.stream.SimulationStream`
+one after the other and writes them to disk, so the complete trajectory is never
+materialized in memory.
+::
+
+    stream = r.simulateStream(0, 1e5, 1000001, chunkSize=50000)
+    stream.writeTo(CSVSink('result.csv'))
+"""
+
+from __future__ import print_function, division, absolute_import
+
+import struct
+import numpy as np
+
+
+class StreamSink(object):
+    """ Base class of all sinks. """
+
+    def __init__(self, path):
+        self.path = path
+        self.colnames = None
+        self.rows = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def open(self, colnames, rows=None):
+        """ Prepare the sink for the given columns.
+
+        :param colnames: column names
+        :param rows: total number of rows if known, None otherwise
+        """
+        self.colnames = list(colnames)
+
+    def write(self, chunk):
+        """ Write a 2D chunk of rows. """
+        self.rows += chunk.shape[0]
+
+    def close(self):
+        """ Finish writing. """
+
+
+class CSVSink(StreamSink):
+    """ Writes chunks to a CSV file with a header line of the column names. """
+
+    def __init__(self, path, delimiter=',', fmt='%.18e'):
+        super(CSVSink, self).__init__(path)
+        self.delimiter = delimiter
+        self.fmt = fmt
+        self._f = None
+
+    def open(self, colnames, rows=None):
+        super(CSVSink, self).open(colnames, rows=rows)
+        self._f = open(self.path, 'w')
+        self._f.write(self.delimiter.join(self.colnames) + '\n')
+
+    def write(self, chunk):
+        np.savetxt(self._f, chunk, delimiter=self.delimiter, fmt=self.fmt)
+        super(CSVSink, self).write(chunk)
+
+    def close(self):
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+
+# fixed header size, large enough for any 2D float shape
+NPY_HEADER_SIZE = 128
+
+
+def _npyHeader(shape, dtype):
+    """ NPY version 1.0 header padded to NPY_HEADER_SIZE bytes. """
+    magic = b'\x93NUMPY\x01\x00'
+    header = "{{'descr': {!r}, 'fortran_order': False, 'shape': {!r}, }}".format(
+        np.lib.format.dtype_to_descr(np.dtype(dtype)), tuple(shape))
+    hlen = NPY_HEADER_SIZE - len(magic) - 2
+    header = header.ljust(hlen - 1) + '\n'
+    return magic + struct.pack('<H', hlen) + header.encode('latin1')
+
+
+class NPYSink(StreamSink):
+    """ Writes chunks to a .npy file.
+
+    The number of rows does not have to be known in advance, the header is
+    rewritten with the final shape when the sink is closed. The result can be
+    opened without loading it via ``np.load(path, mmap_mode='r')``.
+    """
+
+    def __init__(self, path, dtype=np.float64):
+        super(NPYSink, self).__init__(path)
+        self.dtype = np.dtype(dtype)
+        self._f = None
+
+    def open(self, colnames, rows=None):
+        super(NPYSink, self).open(colnames, rows=rows)
+        self._f = open(self.path, 'wb')
+        self._f.write(_npyHeader((0, len(self.colnames)), self.dtype))
+
+    def write(self, chunk):
+        self._f.write(np.ascontiguousarray(chunk, dtype=self.dtype).tobytes())
+        super(NPYSink, self).write(chunk)
+
+    def close(self):
+        if self._f is not None:
+            self._f.seek(0)
+            self._f.write(_npyHeader((self.rows, len(self.colnames)), self.dtype))
+            self._f.close()
+            self._f = None
+
+
+class MemmapSink(StreamSink):
+    """ Writes chunks into a memory-mapped .npy file of known size.
+
+    Requires the total number of rows, i.e. a stream on a fixed time grid or
+    an explicit rows argument. After closing, the data is available as
+    memory-mapped array via :attr:`array`. Closing the sink with fewer rows
+    than expected raises a ValueError, the missing rows would be zeros.
+    """
+
+    def __init__(self, path, rows=None, dtype=np.float64):
+        super(MemmapSink, self).__init__(path)
+        self.expected_rows = rows
+        self.dtype = np.dtype(dtype)
+        self.array = None
+
+    def open(self, colnames, rows=None):
+        super(MemmapSink, self).open(colnames, rows=rows)
+        if self.expected_rows is None:
+            self.expected_rows = rows
+        if self.expected_rows is None:
+            raise ValueError('MemmapSink requires the number of rows, use NPYSink for variable step simulations.')
+        self.array = np.lib.format.open_memmap(self.path, mode='w+', dtype=self.dtype,
+                                               shape=(self.expected_rows, len(self.colnames)))
+
+    def write(self, chunk):
+        if self.rows + chunk.shape[0] > self.expected_rows:
+            raise ValueError('More rows written than expected ({})'.format(self.expected_rows))
+        self.array[self.rows:self.rows + chunk.shape[0]] = chunk
+        super(MemmapSink, self).write(chunk)
+
+    def close(self):
+        if self.array is not None:
+            self.array.flush()
+            if self.rows < self.expected_rows:
+                raise ValueError('Only {} of {} rows written to {}'.format(self.rows, self.expected_rows, self.path))
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            self.close()
+        except ValueError:
+            # the short write is a consequence of the exception raised while writing
+            if exc_type is None:
+                raise
@@ -20,30 +20,19 @@ import importlib
 import json
 import numpy as np
 import antimony
-import matplotlib
 
 PLOTTING_ENGINE_NULL = 'null'
 PLOTTING_ENGINE_MATPLOTLIB = 'matplotlib'
 PLOTTING_ENGINE_PLOTLY = 'plotly'
 
-__default_plotting_engine = PLOTTING_ENGINE_MATPLOTLIB
+# resolved on first use, see getDefaultPlottingEngine
+__default_plotting_engine = None
 
 # enable fixes for non-IPython environment
 IPYTHON = False
 if any('IPYTHONDIR' in name for name in os.environ):
     IPYTHON = True
 
-# use Agg backend in notebooks or when Tkinter is not present
-try:
-    get_ipython()
-    if IPYTHON:
-        matplotlib.use('Agg', warn=False)
-except:
-    try:
-        import Tkinter
-    except ImportError:
-        matplotlib.use('Agg', warn=False)
-
 
 ##############################################
 # Ipython helpers
@@ -51,21 +40,31 @@ except:
 
 # determine if we're running in IPython
 __in_ipython = True
-__plotly_enabled = False
 if IPYTHON:
     try:
         get_ipython()
+    except:
+        __in_ipython = False
+
+# plotly notebook mode, None until initialized on first use
+__plotly_enabled = None
+
+
+def _initPlotly():
+    """ Init the plotly notebook mode once.
 
-        # init plotly notebook mode
+    :return: True if plotly can be used for plotting
+    """
+    global __plotly_enabled
+    if __plotly_enabled is None:
+        __plotly_enabled = False
         try:
             import plotly
             plotly.offline.init_notebook_mode(connected=True)
             __plotly_enabled = True
-            __default_plotting_engine = PLOTTING_ENGINE_PLOTLY
         except:
             warnings.warn("plotly could not be initialized. Unable to use Plotly for plotting.")
-    except:
-        __in_ipython = False
+    return __plotly_enabled
 
 
 def inIPython():
@@ -82,9 +81,16 @@ def inIPython():
 def getDefaultPlottingEngine():
     """ Get the default plotting engine.
     Options are 'matplotlib' or 'plotly'.
+
+    Unless set, the default is resolved on the first call: 'plotly' in
+    notebooks with a working plotly, 'matplotlib' otherwise.
     :return:
     """
     global __default_plotting_engine
+    if __default_plotting_engine is None:
+        __default_plotting_engine = PLOTTING_ENGINE_MATPLOTLIB
+        if IPYTHON and __in_ipython and _initPlotly():
+            __default_plotting_engine = PLOTTING_ENGINE_PLOTLY
     return __default_plotting_engine
 
 
@@ -102,6 +108,7 @@ def setDefaultPlottingEngine(engine):
 
 
 def disablePlotting():
+    """ Use the null engine, plot calls return without building figures. """
     setDefaultPlottingEngine(PLOTTING_ENGINE_NULL)
 
 
@@ -117,19 +124,16 @@ def setSavePlotsToPDF(value):
 ##############################################
 # Plotting helpers
 ##############################################
-import matplotlib.pyplot as plt
-
-# make this the default style for matplotlib
-# plt.style.use('fivethirtyeight')
-
-from .plotting import getPlottingEngineFactory as __getPlottingEngineFactory, plot, show, nextFigure, tiledFigure, newTiledFigure, newLowerTriFigure, clearTiledFigure
+# the plotting package is imported on first use
 
 
 def getPlottingEngineFactory(engine=None):
+    """ Factory of the plotting engine, defaults to the default plotting engine. """
     global __save_plots_to_pdf
+    from .plotting import getPlottingEngineFactory as _getPlottingEngineFactory
     if engine is None:
         engine = getDefaultPlottingEngine()
-    factory = __getPlottingEngineFactory(engine)
+    factory = _getPlottingEngineFactory(engine)
     factory.save_plots_to_pdf = __save_plots_to_pdf
     return factory
 
@@ -142,59 +146,37 @@ def getPlottingEngine(engine=None):
     if engine is None:
         engine = getDefaultPlottingEngine()
     if not engine in __plotting_engines:
+        if engine == PLOTTING_ENGINE_PLOTLY and IPYTHON and __in_ipython:
+            _initPlotly()
         __plotting_engines[engine] = getPlottingEngineFactory(engine)()
     return __plotting_engines[engine]
 
 
-getPlottingEngineFactory.__doc__ = __getPlottingEngineFactory.__doc__
-
 
 ##############################################
 # Remaining imports
 ##############################################
 import roadrunner
 
-try:
-    import tesedml as libsedml
-except ImportError as e:
-    try:
-        import libsedml
-    except ImportError:
-        libsedml = None
-        roadrunner.Logger.log(roadrunner.Logger.LOG_WARNING, str(e))
-        warnings.warn("'libsedml' could not be imported", ImportWarning, stacklevel=2)
 
-try:
-    try:
-        import tesbml as libsbml
-    except ImportError:
-        import libsbml
-except ImportError as e:
-    libsbml = None
-    roadrunner.Logger.log(roadrunner.Logger.LOG_WARNING, str(e))
-    warnings.warn("'libsbml' could not be imported", ImportWarning, stacklevel=2)
-
-try:
-    import phrasedml
-except ImportError as e:
-    phrasedml = None
-    roadrunner.Logger.log(roadrunner.Logger.LOG_WARNING, str(e))
-    warnings.warn("'phrasedml' could not be imported", ImportWarning, stacklevel=2)
-
-try:
-    import sbol
-except ImportError as e:
-    sbol = None
-    warnings.warn("'pySBOL' could not be imported, cannot import/export SBOL files", ImportWarning, stacklevel=2)
-
-try:
-    from sbml2matlab import sbml2matlab
-except ImportError as e:
-    sbml2matlab = None
-    roadrunner.Logger.log(roadrunner.Logger.LOG_WARNING, str(e))
-    warnings.warn("'sbml2matlab' could not be imported", ImportWarning)
-
-from . import teconverters
+def _optionalModule(*names):
+    """ Import the first available of the module names, None if none is available.
+
+    The optional libraries are only needed for SED-ML, OMEX, SBOL and the
+    version information, they are imported on first use.
+    """
+    for name in names:
+        try:
+            return importlib.import_module(name)
+        except ImportError as e:
+            error = e
+    roadrunner.Logger.log(roadrunner.Logger.LOG_WARNING, str(error))
+    warnings.warn("'{}' could not be imported".format(names[-1]), ImportWarning, stacklevel=2)
+    return None
+
+
+from .teconverters.conversion_cache import memoizeConversion
+from .utils.profiling import timed
 
 
 # ---------------------------------------------------------------------
@@ -211,6 +193,10 @@ def getVersionInfo():
         ('roadrunner', roadrunner.__version__),
         ('antimony', antimony.__version__),
     ]
+    libsbml = _optionalModule('tesbml', 'libsbml')
+    libsedml = _optionalModule('tesedml', 'libsedml')
+    phrasedml = _optionalModule('phrasedml')
+    sbol = _optionalModule('sbol')
     if libsbml:
         versions.append(('libsbml', libsbml.getLibSBMLDottedVersion()))
     if libsedml:
@@ -302,6 +288,8 @@ def colorCycle(color,polyNumber):
     return color
 
 def sample_plot(result):
+    from .plotting.backend import pyplot
+    plt = pyplot()
     color = ['#0F0F3D', '#141452', '#1A1A66', '#1F1F7A', '#24248F', '#2929A3',
              '#2E2EB8', '#3333CC', '#4747D1', '#5C5CD6']
     if len(color) != result.shape[1]:
@@ -316,11 +304,15 @@ def sample_plot(result):
     plt.show()
 
 def plotImage(img):
+    from .plotting.backend import pyplot
+    plt = pyplot()
     imgplot = plt.imshow(img)
     plt.show()
     plt.close()
 
 def custom_plot(x, y, min_y,max_y, label_name , **kwargs):
+    from .plotting.backend import pyplot
+    plt = pyplot()
     ax = kwargs.pop('ax', plt.gca())
     base_line, = ax.plot(x, y, label=label_name,**kwargs)
     ax.fill_between(x, min_y, max_y, facecolor=base_line.get_color(), alpha=0.3)
@@ -328,6 +320,8 @@ def custom_plot(x, y, min_y,max_y, label_name , **kwargs):
 
 
 def plot_stochastic_result(result):
+    from .plotting.backend import pyplot
+    plt = pyplot()
     plt.close()
     if(len(result) < 1):
         return
@@ -372,10 +366,11 @@ def distributed_stochastic_simulation(sc,stochastic_model_object, num_simulation
 def plot_distributed_stochastic(plot_data):
     fig = getPlottingEngine().newFigure(title='Stochastic Result')
     for each_data in plot_data:
+        data = np.asarray(each_data[1], dtype=float)
         for i_column in range(1,len(each_data[0])):
             name = each_data[0][i_column]
-            fig.addXYDataset([i_data[0] for i_data in each_data[1]],[i_data[i_column] for i_data in each_data[1]],  name=name)
-    fig.plot()
+            fig.addXYDataset(data[:, 0], data[:, i_column], name=name)
+    fig.render()
 
 def distributed_parameter_scanning(sc,list_of_models, function_name,antimony="antimony"):
     def spark_work(model_with_parameters):
@@ -391,114 +386,129 @@ def distributed_parameter_scanning(sc,list_of_models, function_name,antimony="an
     return(sc.parallelize(list_of_models,len(list_of_models)).map(spark_work).collect())
 
 def distributed_sensitivity_analysis(sc,senitivity_analysis_model,calculation=None):
-    def spark_sensitivity_analysis(model_with_parameters):
-        import tellurium as te
+    """ Sensitivity analysis on a Spark cluster.
+
+    Every Spark partition loads the model and the simulation once, see
+    :class:`tellurium.analysis.sensitivityexecutor.SensitivityExecutor` for
+    the local backends.
+
+    :param sc: SparkContext
+    :param senitivity_analysis_model: SensitivityAnalysis
+    :param calculation: None, "avg" or dictionary of bins
+    """
+    from .analysis.sensitivityexecutor import SensitivityExecutor
+    if(senitivity_analysis_model.bounds is  None):
+        print("Bounds are Undefined.")
+        return
+    return SensitivityExecutor(backend='spark', context=sc, workers=sc.defaultParallelism).run(
+        senitivity_analysis_model, calculation=calculation)
 
-        sa_model = model_with_parameters[0]
 
-        parameters = model_with_parameters[1]
-        class_name = importlib.import_module(sa_model.filename)
+def perform_sampling(mesh):
+    mesh = [items.ravel() for items in mesh]
+    return np.column_stack(mesh).tolist()
 
-        user_defined_simulator = getattr(class_name, dir(class_name)[0])
-        sa_model.simulation = user_defined_simulator()
 
-        if(sa_model.sbml):
-            model_roadrunner = te.loadAntimonyModel(te.sbmlToAntimony(sa_model.model))
-        else:
-            model_roadrunner = te.loadAntimonyModel(sa_model.model)
+# ---------------------------------------------------------------------
+# Group: Model cache
+# ---------------------------------------------------------------------
 
-        model_roadrunner.conservedMoietyAnalysis = sa_model.conservedMoietyAnalysis
+__model_cache = None
 
 
-        #Running PreSimulation
-        model_roadrunner = sa_model.simulation.presimulator(model_roadrunner)
+def enableModelCache(maxsize=32, cache_dir=None, max_disk_size=512*1024**2):
+    """ Enable the content-addressed cache of compiled models.
 
-        #Running Analysis
-        computations = {}
-        model_roadrunner = sa_model.simulation.simulator(model_roadrunner,computations)
+    With the cache enabled :func:`loada`, :func:`loadSBMLModel` and :func:`loadCellMLModel`
+    compile every distinct model only once and return cheap copies on subsequent loads.
+    ::
 
-        _analysis = [None,None]
+        cache = te.enableModelCache(maxsize=16, cache_dir='/tmp/te_models')
+        r1 = te.loada('S1 -> S2; k1*S1; k1=0.1; S1=10.0; S2 = 0.0')
+        r2 = te.loada('S1 -> S2; k1*S1; k1=0.1; S1=10.0; S2 = 0.0')  # cache hit
+        print(cache.stats())
+
+    :param maxsize: maximum number of models held in memory
+    :type maxsize: int
+    :param cache_dir: directory for serialized model states, None keeps the cache in memory only
+    :type cache_dir: str
+    :param max_disk_size: maximum size of the cache directory in bytes
+    :type max_disk_size: int
+    :returns: the model cache
+    :rtype: tellurium.roadrunner.ModelCache
+    """
+    from .roadrunner import ModelCache
+    global __model_cache
+    __model_cache = ModelCache(maxsize=maxsize, cache_dir=cache_dir, max_disk_size=max_disk_size)
+    return __model_cache
 
-        #Setting the Parameter Variables
-        _analysis[0] = {}
-        for i_param,param_names in enumerate(sa_model.bounds.keys()):
 
-            _analysis[0][param_names] = parameters[i_param]
-            setattr(model_roadrunner, param_names, parameters[i_param])
+def disableModelCache():
+    """ Disable the model cache. Models are compiled on every load again.
 
-        _analysis[1] = computations
+    See also: :func:`enableModelCache`
+    """
+    global __model_cache
+    __model_cache = None
 
-        return _analysis
 
+def getModelCache():
+    """ The active model cache or None if caching is disabled.
 
-    if(senitivity_analysis_model.bounds is  None):
-        print("Bounds are Undefined.")
-        return
+    See also: :func:`enableModelCache`
+    """
+    global __model_cache
+    return __model_cache
 
-    #Get the Filename
-    sc.addPyFile(senitivity_analysis_model.filename)
-    senitivity_analysis_model.filename = os.path.basename(senitivity_analysis_model.filename).split(".")[0]
-
-
-    params = []
-    if(senitivity_analysis_model.allowLog):
-        for bound_values in senitivity_analysis_model.bounds.values():
-            if(len(bound_values) > 2):
-                params.append(np.logspace(bound_values[0], bound_values[1], bound_values[2]))
-            elif(len(bound_values == 2)):
-                params.append(np.logspace(bound_values[0], bound_values[1], 3))
-            else:
-                print("Improper Boundaries Defined")
-                return;
-    else:
-        for bound_values in senitivity_analysis_model.bounds.values():
-            if(len(bound_values) > 2):
-                params.append(np.linspace(bound_values[0], bound_values[1], bound_values[2]))
-            elif(len(bound_values == 2)):
-                params.append(np.linspace(bound_values[0], bound_values[1], 3))
-            else:
-                print("Improper Boundaries Defined")
-                return;
-
-    samples = perform_sampling(np.meshgrid(*params))
-    samples = zip([senitivity_analysis_model]*len(samples),samples)
-    if(calculation is "avg"):
-        group_rdd = sc.parallelize(samples,len(samples)).map(spark_sensitivity_analysis).\
-            flatMap(lambda x: x[1].items()).groupByKey()
-
-        KEYS = group_rdd.map(lambda x: (x[0])).collect()
-        VALUES = group_rdd.map(lambda x: np.array(list(x[1])))
-        values_array = np.array(VALUES.collect())
-        MEANS = (np.average(values_array, axis=1))
-        STD =  (np.std(values_array, axis=1))
-
-        stats = {}
-        for key_i,each_key in enumerate(KEYS):
-            stats[each_key] = {}
-            stats[each_key]["mean"] = MEANS[key_i]
-            stats[each_key]["stdev"] = STD[key_i]
-        return stats
-
-    elif(type(calculation) is dict):
-        bins = sc.broadcast(calculation)
-        group_rdd = sc.parallelize(samples,len(samples)).map(spark_sensitivity_analysis)\
-            .flatMap(lambda x: x[1].items()).map(
-            lambda x: (x[0], [int(items[0] <= x[1] <= items[1]) for items in bins.value[x[0]]])).reduceByKey(
-            lambda first, second: [x + y for x, y in zip(first, second)])
-
-        return group_rdd.collect()
 
-    else:
-        return(sc.parallelize(samples,len(samples)).map(spark_sensitivity_analysis).collect())
+@timed('compile')
+def _compile(sbml):
+    """ Compile the SBML model into a RoadRunner instance. """
+    return roadrunner.RoadRunner(sbml)
 
 
+# global roadrunner settings which change the compiled model, part of the model cache key
+_CACHED_LOAD_SETTINGS = (
+    'LOADSBMLOPTIONS_CONSERVED_MOIETIES',
+    'LOADSBMLOPTIONS_MUTABLE_INITIAL_CONDITIONS',
+    'LOADSBMLOPTIONS_READ_ONLY',
+    'LOADSBMLOPTIONS_OPTIMIZE_GVN',
+    'LOADSBMLOPTIONS_OPTIMIZE_CFG_SIMPLIFICATION',
+    'LOADSBMLOPTIONS_OPTIMIZE_INSTRUCTION_COMBINING',
+    'LOADSBMLOPTIONS_OPTIMIZE_DEAD_INST_ELIMINATION',
+    'LOADSBMLOPTIONS_OPTIMIZE_DEAD_CODE_ELIMINATION',
+    'LOADSBMLOPTIONS_OPTIMIZE_INSTRUCTION_SIMPLIFIER',
+    'LOADSBMLOPTIONS_USE_MCJIT',
+    'LLVM_BACKEND',
+    'LLJIT_OPTIMIZATION_LEVEL',
+)
 
-def perform_sampling(mesh):
-    samples = []
-    mesh = [items.flatten() for items in mesh]
-    for i in range(len(mesh[0])):
-        samples.append([items[i] for items in mesh])
-    return(samples)
+
+def _loadSettings():
+    """ Current values of the roadrunner.Config settings used when compiling models.
+
+    Settings not available in the installed roadrunner version are skipped.
+
+    :return: dictionary of setting name to value
+    :rtype: dict
+    """
+    settings = {}
+    for name in _CACHED_LOAD_SETTINGS:
+        key = getattr(roadrunner.Config, name, None)
+        if key is not None:
+            settings[name] = roadrunner.Config.getValue(key)
+    return settings
+
+
+def _loadCached(source, format, factory):
+    """ Load model via the model cache if enabled, otherwise call factory.
+
+    The global roadrunner load settings are part of the cache key.
+    """
+    cache = getModelCache()
+    if cache is None:
+        return factory()
+    return cache.load(source, format, factory, **_loadSettings())
 
 
 def loada(ant):
@@ -517,6 +527,7 @@ def loada(ant):
     return loadAntimonyModel(ant)
 
 
+@timed('load.antimony')
 def loadAntimonyModel(ant):
     """Load Antimony model with tellurium.
 
@@ -530,8 +541,7 @@ def loadAntimonyModel(ant):
     :returns: RoadRunner instance with model loaded
     :rtype: roadrunner.ExtendedRoadRunner
     """
-    sbml = antimonyToSBML(ant)
-    return roadrunner.RoadRunner(sbml)
+    return _loadCached(ant, 'antimony', lambda: _compile(antimonyToSBML(ant)))
 
 
 def loads(ant):
@@ -547,6 +557,7 @@ def loads(ant):
     return loadSBMLModel(ant)
 
 
+@timed('load.sbml')
 def loadSBMLModel(sbml):
     """ Load SBML model from a string or file.
 
@@ -555,9 +566,10 @@ def loadSBMLModel(sbml):
     :returns: RoadRunner instance with model loaded
     :rtype: roadrunner.ExtendedRoadRunner
     """
-    return roadrunner.RoadRunner(sbml)
+    return _loadCached(sbml, 'sbml', lambda: _compile(sbml))
 
 
+@timed('load.cellml')
 def loadCellMLModel(cellml):
     """ Load CellML model with tellurium.
 
@@ -566,8 +578,7 @@ def loadCellMLModel(cellml):
     :returns: RoadRunner instance with model loaded
     :rtype: roadrunner.ExtendedRoadRunner
     """
-    sbml = cellmlToSBML(cellml)
-    return roadrunner.RoadRunner(sbml)
+    return _loadCached(cellml, 'cellml', lambda: _compile(cellmlToSBML(cellml)))
 
 
 # ---------------------------------------------------------------------
@@ -579,6 +590,7 @@ def antimonyTosbml(ant):
     return antimonyToSBML(ant)
 
 
+@memoizeConversion('antimony->sbml')
 def antimonyToSBML(ant):
     """ Convert Antimony to SBML string.
 
@@ -601,6 +613,7 @@ def antimonyToSBML(ant):
 
 
 
+@memoizeConversion('antimony->cellml')
 def antimonyToCellML(ant):
     """ Convert Antimony to CellML string.
 
@@ -618,6 +631,7 @@ def antimonyToCellML(ant):
     return antimony.getCellMLString(mid)
 
 
+@memoizeConversion('sbml->antimony')
 def sbmlToAntimony(sbml):
     """ Convert SBML to antimony string.
 
@@ -639,6 +653,7 @@ def sbmlToAntimony(sbml):
     return antimony.getAntimonyString(None)
 
 
+@memoizeConversion('sbml->cellml')
 def sbmlToCellML(sbml):
     """ Convert SBML to CellML string.
 
@@ -654,6 +669,7 @@ def sbmlToCellML(sbml):
     _checkAntimonyReturnCode(code)
     return antimony.getCellMLString(None)
 
+@memoizeConversion('cellml->antimony')
 def cellmlToAntimony(cellml):
     """ Convert CellML to antimony string.
 
@@ -670,6 +686,7 @@ def cellmlToAntimony(cellml):
     return antimony.getAntimonyString(None)
 
 
+@memoizeConversion('cellml->sbml')
 def cellmlToSBML(cellml):
     """ Convert CellML to SBML string.
 
@@ -700,7 +717,8 @@ def executeInlineOmex(inline_omex, comp=False):
 
     :param inline_omex: String containing inline phrasedml and antimony.
     """
-    in_omex = teconverters.inlineOmex.fromString(inline_omex, comp=comp)
+    from .teconverters import inlineOmex
+    in_omex = inlineOmex.fromString(inline_omex, comp=comp)
     in_omex.executeOmex()
 
 
@@ -897,6 +915,8 @@ def plotArray(result, loc='upper right', show=True, resetColorCycle=True,
                      yscale='log', linestyle='dashed')
     """
     warnings.warn("plotArray is deprecated, use plot instead", DeprecationWarning)
+    from .plotting.backend import pyplot
+    plt = pyplot()
 
     # FIXME: unify r.plot & te.plot (lots of code duplication)
     # reset color cycle (columns in repeated simulations have same color)
@@ -1058,13 +1078,13 @@ roadrunner.RoadRunner = ExtendedRoadRunner
 
 def VersionDict():
     '''Return dict of version strings.'''
-    import tesbml, tesedml, tecombine
+    import tesbml, tesedml, tecombine, phrasedml
     return {
         'tellurium': getTelluriumVersion(),
         'roadrunner': roadrunner.getVersionStr(roadrunner.VERSIONSTR_BASIC),
         'antimony': antimony.__version__,
         'phrasedml': phrasedml.__version__,
-        'tesbml': libsbml.getLibSBMLDottedVersion(),
+        'tesbml': tesbml.getLibSBMLDottedVersion(),
         'tesedml': tesedml.__version__,
         'tecombine': tecombine.__version__
         }
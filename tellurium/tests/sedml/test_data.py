@@ -6,6 +6,8 @@ from __future__ import print_function, absolute_import
 import os
 import pytest
 import matplotlib
+import numpy as np
+import pandas as pd
 
 from tellurium.tests.testdata import TESTDATA_DIR
 
@@ -150,6 +152,11 @@ def test_parse_csv_parameters():
     assert "dataMu" in data_sources
     assert len(data_sources["dataIndex"]) == 10
     assert len(data_sources["dataMu"]) == 10
+    # index sets are Series of the row index, slices arrays of the columns
+    assert isinstance(data_sources["dataIndex"], pd.Series)
+    assert list(data_sources["dataIndex"]) == list(range(10))
+    assert isinstance(data_sources["dataMu"], np.ndarray)
+    assert data_sources["dataMu"].shape == (10, 1)
 
 
 
@@ -167,6 +174,10 @@ def test_parse_numl():
     assert "dataS1" in data_sources
     assert len(data_sources["dataTime"]) == 200
     assert len(data_sources["dataS1"]) == 200
+    # Series with the row labels of the NuML result component
+    assert isinstance(data_sources["dataTime"], pd.Series)
+    assert isinstance(data_sources["dataS1"], pd.Series)
+    assert data_sources["dataS1"].index.is_monotonic_increasing
 
 
 def test_parse_numl_1D():
@@ -266,3 +277,34 @@ def test_omex_csv_parameters(tmpdir):
     assert "dgDataMu" in dg_dict
     assert len(dg_dict["dgDataIndex"]) == 10
     assert len(dg_dict["dgDataMu"]) == 10
+
+
+def test_load_table_columns():
+    data_sources = DataDescriptionParser.load(SOURCE_CSV, sources=[('dataS1', '', [('', 'S1')])], columns=True)
+    data = data_sources['dataS1']
+    assert data.shape == (200, 1)
+    # single columns are views of the table
+    assert data.base is not None
+
+
+def test_load_data_cache(tmpdir):
+    from tellurium.sedml import data as sedml_data
+    cache_dir = os.path.join(str(tmpdir), 'cache')
+    sedml_data.setDataCacheDir(cache_dir)
+    try:
+        sources = [('dataS1', '', [('', 'S1')]), ('dataIndex', 'Time', [])]
+        first = DataDescriptionParser.load(SOURCE_CSV, sources=sources)
+        assert len(os.listdir(cache_dir)) == 1
+        second = DataDescriptionParser.load(SOURCE_CSV, sources=sources)
+        assert (first['dataS1'] == second['dataS1']).all()
+        assert len(second['dataIndex']) == 200
+    finally:
+        sedml_data.setDataCacheDir(None)
+
+
+def test_sedml_code_without_data(tmpdir):
+    factory = tesedml.SEDMLCodeFactory(SEDML_READ_CSV, workingDir=BASE_DIR, createOutputs=False)
+    code = factory.toPython()
+    # the data is loaded on execution, not embedded in the code
+    assert 'DataDescriptionParser.load(' in code
+    assert 'np.array(' not in code
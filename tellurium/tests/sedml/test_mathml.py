@@ -0,0 +1,80 @@
+"""
+Testing the evaluation of MathML on arrays and the lazy data generators.
+"""
+from __future__ import absolute_import, print_function
+
+import numpy as np
+try:
+    import tesbml as libsbml
+except ImportError:
+    import libsbml
+
+from tellurium.sedml import mathml
+from tellurium.sedml.mathml import *
+from tellurium.sedml.datagenerators import DataGenerators
+
+
+def evaluate(formula, **variables):
+    """ Evaluates the vectorized formula with the given arrays. """
+    astnode = libsbml.parseL3Formula(formula)
+    expr = mathml.vectorizedMathML(astnode, variables=dict((key, key) for key in variables))
+    return eval(expr, dict(globals(), **variables))
+
+
+def test_piecewise_array():
+    x = np.arange(8.0)
+    res = piecewise(8, x < 4, 0.1, (4 <= x) & (x < 6), 2)
+    assert np.allclose(res, [8, 8, 8, 8, 0.1, 0.1, 2, 2])
+
+
+def test_piecewise_scalar():
+    assert piecewise(8, 3 < 4, 0.1) == 8
+    assert piecewise(8, 5 < 4, 0.1) == 0.1
+
+
+def test_xor():
+    assert xor(1, 0) == 1
+    assert xor(1, 1) == 0
+    assert xor(1, 1, 1) == 1
+    res = xor(np.array([True, True, False]), np.array([True, False, False]))
+    assert list(res) == [False, True, False]
+
+
+def test_vectorized_logical():
+    x = np.arange(8.0)
+    res = evaluate("piecewise(8, x < 4, 0.1, 4 <= x && x < 6, 2)", x=x)
+    assert np.allclose(res, [8, 8, 8, 8, 0.1, 0.1, 2, 2])
+
+
+def test_vectorized_aggregates():
+    x = np.array([1.0, np.nan, 3.0])
+    assert evaluate("max(x)", x=x) == 3.0
+    assert evaluate("sum(x)", x=x) == 4.0
+    assert np.allclose(evaluate("x^2 + exp(0)", x=np.arange(3.0)), [1, 2, 5])
+
+
+def test_vectorized_ast_unchanged():
+    astnode = libsbml.parseL3Formula("2 * x")
+    mathml.vectorizedMathML(astnode, variables={'x': '__var__x'})
+    assert libsbml.formulaToL3String(astnode) == "2 * x"
+
+
+def test_datagenerators_lazy():
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return np.ones(3)
+
+    namespace = {}
+    dgs = DataGenerators(namespace)
+    dgs.add('dg1', compute)
+    dgs.add('dg2', lambda: 1 / 0)
+    assert len(dgs) == 2
+    assert not dgs.isEvaluated('dg1')
+    dgs.evaluate(['dg1'])
+    dgs.evaluate(['dg1'])
+    assert len(calls) == 1
+    assert 'dg1' in namespace
+    # unused data generators are never computed
+    assert 'dg2' not in namespace
@@ -14,6 +14,7 @@ import tempfile
 import unittest
 import pytest
 import matplotlib
+import numpy as np
 
 import tellurium as te
 try:
@@ -25,6 +26,7 @@ import phrasedml
 from tellurium.sedml.utils import run_case
 from tellurium import temiriam
 from tellurium.utils import omex
+from tellurium.sedml import tesedml
 from tellurium.sedml.tesedml import executeSEDML, executeCombineArchive
 
 
@@ -162,6 +164,95 @@ class PhrasedmlTestCase(unittest.TestCase):
         inline_omex = '\n'.join([self.a1, self.a2, p1, p2])
         te.executeInlineOmex(inline_omex)
 
+    def test_parallelTasks(self):
+        """ Test execution of independent tasks on a process pool. """
+        p1 = """
+            model1 = model "m1"
+            model2 = model "m2"
+            sim1 = simulate uniform(0, 6, 100)
+            task1 = run sim1 on model1
+            task2 = run sim1 on model2
+            task3 = run sim1 on model1
+            plot task1.time vs task1.S1, task2.X1, task3.S2
+        """
+        tmpdir = tempfile.mkdtemp()
+        try:
+            omex_path = os.path.join(tmpdir, 'archive.omex')
+            te.exportInlineOmex('\n'.join([self.a1, self.a2, p1]), omex_path)
+            serial = executeCombineArchive(omex_path, createOutputs=False)
+            parallel = executeCombineArchive(omex_path, createOutputs=False, workers=2)
+        finally:
+            shutil.rmtree(tmpdir)
+
+        serial, parallel = list(serial.values())[0], list(parallel.values())[0]
+        # task1 and task3 share model1
+        self.assertEqual(len(parallel['taskCode']), 2)
+        self.assertEqual(set(serial['dataGenerators']), set(parallel['dataGenerators']))
+        for key, data in serial['dataGenerators'].items():
+            self.assertTrue(np.allclose(data, parallel['dataGenerators'][key]))
+
+    def test_repeatedTaskExecutor(self):
+        """ Test the RepeatedTaskExecutor against the generated python loops. """
+        p1 = """
+            model1 = model "m1"
+            sim1 = simulate uniform(0, 6, 50)
+            task0 = run sim1 on model1
+            task1 = repeat task0 for k1 in [0.1, 0.2, 0.5, 1.0], reset=true
+            task2 = repeat task0 for k1 in [0.1, 0.2, 0.5], reset=false
+            plot task1.time vs task1.S1, task2.time vs task2.S2
+        """
+        tmpdir = tempfile.mkdtemp()
+        try:
+            omex_path = os.path.join(tmpdir, 'archive.omex')
+            te.exportInlineOmex('\n'.join([self.a1, p1]), omex_path)
+            omex.extractCombineArchive(omex_path, directory=tmpdir)
+            location = omex.getLocationsByFormat(omex_path, "sed-ml")[0]
+            sedml_path = os.path.join(tmpdir, location)
+
+            results = []
+            for native, workers in [(False, 1), (True, 1), (True, 2)]:
+                factory = tesedml.SEDMLCodeFactory(sedml_path, createOutputs=False,
+                                                   nativeRepeatedTasks=native, iterationWorkers=workers)
+                results.append(factory.executePython()['dataGenerators'])
+        finally:
+            shutil.rmtree(tmpdir)
+
+        loops, native, parallel = results
+        for key, data in loops.items():
+            self.assertEqual(data.shape, native[key].shape)
+            self.assertTrue(np.allclose(data, native[key]))
+            self.assertTrue(np.allclose(data, parallel[key]))
+
+    def test_repeatedTaskWorkersAfterTask(self):
+        """ Test parallel iterations after a task changed the model state. """
+        p1 = """
+            model1 = model "m1"
+            sim1 = simulate uniform(0, 20, 50)
+            sim2 = simulate uniform(0, 6, 50)
+            task0 = run sim1 on model1
+            task1 = run sim2 on model1
+            task2 = repeat task1 for k1 in [0.1, 0.2, 0.5, 1.0], reset=true
+            plot task2.time vs task2.S1, task2.S2
+        """
+        tmpdir = tempfile.mkdtemp()
+        try:
+            omex_path = os.path.join(tmpdir, 'archive.omex')
+            te.exportInlineOmex('\n'.join([self.a1, p1]), omex_path)
+            omex.extractCombineArchive(omex_path, directory=tmpdir)
+            location = omex.getLocationsByFormat(omex_path, "sed-ml")[0]
+            sedml_path = os.path.join(tmpdir, location)
+
+            results = []
+            for workers in [1, 2]:
+                factory = tesedml.SEDMLCodeFactory(sedml_path, createOutputs=False, iterationWorkers=workers)
+                results.append(factory.executePython()['dataGenerators'])
+        finally:
+            shutil.rmtree(tmpdir)
+
+        serial, parallel = results
+        for key, data in serial.items():
+            self.assertTrue(np.allclose(data, parallel[key]))
+
     ############################################
     # Real world tests
     ############################################
@@ -1,10 +1,13 @@
 
 from __future__ import absolute_import, print_function
 
+import os
+import csv
 import unittest
 import tempfile
 import shutil
-from tellurium.sedml import tesedml
+from tellurium.sedml import tesedml, codecache, batch
+from tellurium.utils import omex
 import matplotlib
 
 # -------------------------------------------------------------
@@ -34,6 +37,110 @@ class OmexSedmlTestCase(unittest.TestCase):
         assert pycode is not None
         assert len(pycode) == 2
 
+    def test_omex_cachedCode(self):
+        codecache.clearSEDMLCache()
+        pycode = tesedml.combineArchiveToPython(omexPath=OMEX_SHOWCASE)
+        misses = codecache.getSEDMLCodeCache().misses
+        # extracted to a new directory, but same content
+        pycode2 = tesedml.combineArchiveToPython(omexPath=OMEX_SHOWCASE)
+        self.assertEqual(pycode, pycode2)
+        self.assertEqual(codecache.getSEDMLCodeCache().misses, misses)
+        self.assertEqual(codecache.getSEDMLDocumentCache().hits, 2)
+        # the working directory is provided on execution
+        for code in pycode.values():
+            self.assertNotIn(tempfile.gettempdir(), code)
+
+    def test_omex_cachedExecution(self):
+        codecache.clearSEDMLCache()
+        tesedml.executeCombineArchive(omexPath=OMEX_SHOWCASE, createOutputs=False)
+        misses = codecache.getSEDMLCodeCache().misses
+        hits = codecache.getSEDMLCodeCache().hits
+        # generated and compiled code are reused, although the data is extracted to a new directory
+        tesedml.executeCombineArchive(omexPath=OMEX_SHOWCASE, createOutputs=False)
+        self.assertEqual(codecache.getSEDMLCodeCache().misses, misses)
+        self.assertEqual(codecache.getSEDMLCodeCache().hits, hits + misses)
+
+    def test_omex_cacheDisabled(self):
+        codecache.setSEDMLCacheSize(0)
+        try:
+            tesedml.combineArchiveToPython(omexPath=OMEX_SHOWCASE)
+            self.assertEqual(len(codecache.getSEDMLCodeCache()), 0)
+        finally:
+            codecache.setSEDMLCacheSize(32)
+
+    def test_omex_factoryClose(self):
+        with tesedml.SEDMLCodeFactory(OMEX_SHOWCASE, createOutputs=False) as factory:
+            archive = factory.archive
+            tmp_dir = factory._tempDir
+            self.assertTrue(os.path.isdir(tmp_dir))
+            factory.toPython()
+        self.assertFalse(os.path.exists(tmp_dir))
+        self.assertIsNone(archive._zip.fp)
+
+    def test_omex_factoryCloseArchivePassed(self):
+        # an archive passed to the factory is closed by the caller
+        with omex.OmexReader(OMEX_SHOWCASE) as archive:
+            location = archive.locationsByFormat('sed-ml')[0]
+            with tesedml.SEDMLCodeFactory(archive.readString(location), workingDir=self.test_dir,
+                                          createOutputs=False, archive=archive,
+                                          archiveLocation=location) as factory:
+                factory.toPython()
+            self.assertIsNotNone(archive._zip.fp)
+
+    def test_executeCombineArchives(self):
+        broken = os.path.join(self.test_dir, 'broken.omex')
+        with open(broken, 'w') as f:
+            f.write('not an archive')
+        summary = os.path.join(self.test_dir, 'summary.csv')
+        records = batch.executeCombineArchives([OMEX_SHOWCASE, broken], workers=2, summary=summary)
+        self.assertEqual([r['status'] for r in records], ['ok', 'error'])
+        self.assertEqual(records[0]['sedml'], 2)
+        with open(summary) as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual(len(rows), 2)
+
+    def test_executeCombineArchives_brokenDataGenerator(self):
+        import zipfile
+        import tellurium as te
+        try:
+            import tesedml as libsedml
+        except ImportError:
+            import libsedml
+        valid = os.path.join(self.test_dir, 'valid.omex')
+        te.exportInlineOmex('''
+            model test
+                J0: S1 -> S2; k1*S1
+                S1 = 10.0; S2 = 0.0; k1 = 0.1
+            end
+            model0 = model "test"
+            sim0 = simulate uniform(0, 10, 100)
+            task0 = run sim0 on model0
+            plot task0.time vs task0.S1
+        ''', valid)
+
+        # data generators referencing an undefined symbol fail on evaluation
+        broken = os.path.join(self.test_dir, 'broken_dg.omex')
+        with omex.OmexReader(valid) as archive:
+            sedmlLocations = archive.locationsByFormat('sed-ml')
+        with zipfile.ZipFile(valid) as source, zipfile.ZipFile(broken, 'w') as target:
+            for info in source.infolist():
+                content = source.read(info.filename)
+                if omex.OmexReader.normalize(info.filename) in sedmlLocations:
+                    doc = libsedml.readSedMLFromString(content.decode('utf-8'))
+                    for dg in doc.getListOfDataGenerators():
+                        dg.setMath(libsedml.parseL3Formula('undefinedSymbol'))
+                    content = libsedml.writeSedMLToString(doc).encode('utf-8')
+                target.writestr(info, content)
+
+        records = batch.executeCombineArchives([valid, broken], workers=2)
+        self.assertEqual([r['status'] for r in records], ['ok', 'error'])
+        self.assertIn('undefinedSymbol', records[1]['error'])
+
+    def test_executeCombineArchives_timeout(self):
+        records = batch.executeCombineArchives([OMEX_SHOWCASE], workers=1, timeout=0.01)
+        self.assertEqual(records[0]['status'], 'timeout')
+
+
 
 if __name__ == "__main__":
     unittest.main()
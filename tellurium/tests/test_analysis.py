@@ -1,5 +1,27 @@
 import unittest
-import matplotlib
+import matplotlib.pyplot
+
+
+class SteadyStateSimulation(object):
+    """ Simulation of the sensitivity analysis tests. """
+
+    def presimulator(self, rr):
+        return rr
+
+    def simulator(self, rr, computations):
+        rr.steadyState()
+        computations['S2'] = rr['S2']
+        return rr
+
+
+def linearOutput(rr):
+    """ Output of the global sensitivity tests, y = a + 2 b. """
+    return [rr['a'] + 2 * rr['b']]
+
+
+def offsetOutput(rr):
+    """ Output of the global sensitivity tests, y = a + 2 b + 1. """
+    return [rr['a'] + 2 * rr['b'] + 1]
 
 
 class MyTestCase(unittest.TestCase):
@@ -32,6 +54,267 @@ class MyTestCase(unittest.TestCase):
                             p2='Vmax', p2Range=np.linspace(0.1, 1.0, num=5),
                             start=0, end=50, points=101)
 
+    def test_ParameterScanEngine(self):
+        """Test N-dimensional scan tensor."""
+        import numpy as np
+        import tellurium as te
+        from tellurium.analysis.parameterscan import ParameterScanEngine, scanRange
+        r = te.loada("""
+            S1 -> S2; k1*S1
+            S1 = 10; S2 = 0; k1 = 0.1
+        """)
+        engine = ParameterScanEngine(r, [('k1', scanRange(0.01, 1, 4, log=True)), ('S1', [5, 10])],
+                                     startTime=0, endTime=10, numberOfPoints=11,
+                                     selections=['time', 'S1'], workers=1)
+        result = engine.run()
+        self.assertEqual(result.shape, (4, 2, 11, 2))
+        self.assertTrue(np.allclose(result[:, 0, 0, 1], 5))
+        self.assertTrue(np.allclose(result[:, 1, 0, 1], 10))
+        # faster decay for larger k1
+        self.assertTrue(np.all(np.diff(result[:, 1, -1, 1]) < 0))
+
+        # the scan starts from the initial state, in process and on the workers
+        r.simulate(0, 10, 11)
+        engine.workers = 2
+        self.assertTrue(np.allclose(engine.run(), result))
+        self.assertEqual(r.k1, 0.1)
+
+    def test_graduatedSim(self):
+        """Graduated scan tensor and flattened layout are consistent."""
+        import numpy as np
+        import tellurium as te
+        r = te.loada("""
+            S1 -> S2; k1*S1
+            S1 = 10; S2 = 0; k1 = 0.1
+        """)
+        p = te.ParameterScan(r, endTime=10, numberOfPoints=11, polyNumber=3,
+                             value='k1', startValue=0.1, endValue=1, selection=['S1', 'S2'])
+        flat = p.collect_plotGraduatedArray_result()
+        self.assertEqual(flat.shape, (11, 1 + 3*2))
+        tensor = p._graduatedTensor(flat)
+        self.assertEqual(tensor.shape, (3, 11, 3))
+        self.assertTrue(np.allclose(p._flattenGraduated(tensor), flat))
+
+    def test_SteadyStateScan_continuation(self):
+        """Continuation scan gives the same steady states as the reset scan."""
+        import numpy as np
+        import tellurium as te
+        r = te.loada("""
+            $X0 -> S1; k1*X0
+            S1 -> $X1; k2*S1
+            X0 = 10; S1 = 0; k1 = 0.1; k2 = 0.5
+        """)
+        kwargs = dict(value='k1', startValue=0.1, endValue=1.0, numberOfPoints=10, selection=['S1'])
+        p1 = te.SteadyStateScan(r, **kwargs)
+        res1 = p1.steadyStateSim()
+        r.reset()
+        p2 = te.SteadyStateScan(r, continuation=True, **kwargs)
+        res2 = p2.steadyStateSim()
+        self.assertEqual(res2.shape, (10, 2))
+        self.assertTrue(np.allclose(res1, res2, rtol=1E-5))
+        self.assertEqual(len(p2.solverStats['walltime']), 10)
+        self.assertTrue(np.all(p2.solverStats['attempts'] >= 1))
+
+    def test_ParameterEstimation(self):
+        """Fit of a decay rate with serial and parallel population evaluation."""
+        import numpy as np
+        import tellurium as te
+        from tellurium.analysis.parameterestimation import ParameterEstimation, _supportsWorkers
+        from tellurium.analysis.stochasticmodel import StochasticSimulationModel
+        model = """
+            S1 -> ; k1*S1
+            S1 = 10; k1 = 0.3
+        """
+        r = te.loada(model)
+        data = r.simulate(0, 10, 21)
+        data = np.array(data)
+
+        sim = StochasticSimulationModel(model=model, integrator="cvode", variable_step_size=False,
+                                        from_time=0, to_time=10, step_points=101)
+        pe = ParameterEstimation(sim, {'k1': (0.01, 1.0)}, data=data)
+        k1 = pe.run(seed=1, maxiter=20, polish=False)
+        self.assertAlmostEqual(k1[0], 0.3, places=2)
+        self.assertTrue(pe.counters['evaluations'] > 0)
+        self.assertTrue(pe.counters['simulateTime'] <= pe.counters['objectiveTime'])
+
+        if _supportsWorkers():
+            pe.resetCounters()
+            k1 = pe.run(workers=2, seed=1, maxiter=20, polish=False)
+            self.assertAlmostEqual(k1[0], 0.3, places=2)
+            self.assertTrue(pe.counters['evaluations'] > 0)
+
+        # differential evolution does not use the gradient
+        import warnings
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            pe.run(jac=True, seed=1, maxiter=2, polish=False)
+        self.assertTrue(any('jac is ignored' in str(w.message) for w in caught))
+
+    def test_MultiExperimentEstimation(self):
+        """Shared parameter fitted to two conditions, resumed from the checkpoint."""
+        import os
+        import shutil
+        import tempfile
+        import numpy as np
+        import tellurium as te
+        model = """
+            S1 -> ; k1*S1
+            S1 = 10; k1 = 0.3
+        """
+        r = te.loada(model)
+        data1 = r.simulate(0, 10, 21)
+        r.reset()
+        r.S1 = 5
+        data2 = r.simulate(0, 10, 21)
+
+        sim = te.StochasticSimulationModel(model=model, integrator="cvode", from_time=0, to_time=10, step_points=101)
+        experiments = [te.Experiment(data1), te.Experiment(data2, values={'S1': 5.0})]
+        fit = te.MultiExperimentEstimation(sim, {'k1': (0.01, 1.0)}, experiments)
+        tmpdir = tempfile.mkdtemp()
+        try:
+            checkpoint = os.path.join(tmpdir, 'fit.json')
+            table = fit.run(restarts=3, workers=2, seed=1, checkpoint=checkpoint)
+            self.assertEqual(len(table), 3)
+            self.assertAlmostEqual(table['k1'][0], 0.3, places=2)
+            self.assertTrue(table['objective'].is_monotonic_increasing)
+            self.assertTrue(os.path.exists(checkpoint))
+
+            # finished restarts are read from the checkpoint
+            evaluations = fit.counters['evaluations']
+            resumed = fit.run(restarts=3, seed=1, checkpoint=checkpoint)
+            self.assertEqual(fit.counters['evaluations'], evaluations)
+            self.assertTrue(np.allclose(resumed['objective'], table['objective']))
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_MultiExperimentSelections(self):
+        """Experiments without selections use the default selections on a shared worker."""
+        import tellurium as te
+        model = """
+            S1 -> S2; k1*S1
+            S1 = 10; S2 = 0; k1 = 0.3
+        """
+        r = te.loada(model)
+        data1 = r.simulate(0, 10, 21, ['time', 'S2'])
+        r.reset()
+        data2 = r.simulate(0, 10, 21, ['time', 'S1', 'S2'])
+
+        sim = te.StochasticSimulationModel(model=model, integrator="cvode", from_time=0, to_time=10, step_points=101)
+        experiments = [te.Experiment(data1, selections=['S2']), te.Experiment(data2)]
+        fit = te.MultiExperimentEstimation(sim, {'k1': (0.01, 1.0)}, experiments)
+        table = fit.run(restarts=2, workers=1, seed=1)
+        self.assertAlmostEqual(table['k1'][0], 0.3, places=2)
+
+        # fitted parameters can not be set by an experiment
+        with self.assertRaises(ValueError):
+            te.MultiExperimentEstimation(sim, {'k1': (0.01, 1.0)}, [te.Experiment(data2, values={'k1': 0.5})])
+
+    def test_UncertaintyEnsemble(self):
+        """Percentile bands of the batched ensemble with early stopping."""
+        import numpy as np
+        import tellurium as te
+        from tellurium.utils.uncertainty import sampleUnitCube
+        r = te.loada("""
+            S1 -> ; k1*S1
+            S1 = 10; k1 = 0.3
+        """)
+        u = sampleUnitCube(10, 2, sampling="lhs", seed=1)
+        # one point per stratum in every dimension
+        self.assertEqual(sorted(np.floor(u[:, 0] * 10).astype(int)), list(range(10)))
+
+        ens = te.UncertaintyEnsemble(r, ['k1'], ['S1'], simulation=(0, 10, 11), sampling="lhs", seed=1)
+        bands = ens.run(200, workers=2)
+        self.assertEqual(bands.shape, (3, 11, 1))
+        self.assertEqual(ens.data.shape, (200, 11, 1))
+        self.assertTrue(np.all(bands[0] <= bands[1]) and np.all(bands[1] <= bands[2]))
+        self.assertAlmostEqual(bands[1, 0, 0], 10.0)
+
+        ens.run(1000, tolerance=1.0, batchSize=100)
+        self.assertEqual(ens.size, 200)
+
+    def test_SensitivityExecutor(self):
+        """Grid evaluation and streamed aggregation on local backends."""
+        import numpy as np
+        import tellurium as te
+        sa = te.SensitivityAnalysis(model="""
+            J0: -> S1; k0
+            J1: S1 -> S2; k1*S1
+            J2: S2 -> ; k2*S2
+            k0 = 1; k1 = 0.5; k2 = 0.1
+        """)
+        sa.bounds = {'k0': [1.0, 2.0, 3], 'k2': [0.1, 0.2]}
+        sa.simulation = SteadyStateSimulation()
+
+        results = te.SensitivityExecutor(backend='serial').run(sa)
+        self.assertEqual(len(results), 9)
+        for parameters, computations in results:
+            self.assertAlmostEqual(computations['S2'], parameters['k0'] / parameters['k2'], places=5)
+
+        values = np.array([c['S2'] for _, c in results])
+        for backend in ['thread', 'process']:
+            stats = te.SensitivityExecutor(backend=backend, workers=2, chunkSize=2).run(sa, calculation='avg')
+            self.assertAlmostEqual(stats['S2']['mean'], values.mean(), places=5)
+            self.assertAlmostEqual(stats['S2']['stdev'], values.std(), places=5)
+
+        counts = te.SensitivityExecutor(backend='serial').run(sa, calculation={'S2': [(0, 12), (12, 100)]})
+        self.assertEqual(dict(counts)['S2'], [int(np.sum(values < 12)), int(np.sum(values > 12))])
+
+        # partial aggregates of the spark partitions
+        from tellurium.analysis.sensitivityexecutor import _Average, _Histogram
+        for aggregate in [_Average, lambda: _Histogram({'S2': [(0, 12), (12, 100)]})]:
+            first, second, total = aggregate(), aggregate(), aggregate()
+            first.update(0, results[:4])
+            second.update(4, results[4:])
+            total.update(0, results)
+            merged = first.merge(second).result()
+            expected = total.result()
+            if isinstance(expected, dict):
+                self.assertAlmostEqual(merged['S2']['mean'], expected['S2']['mean'], places=8)
+                self.assertAlmostEqual(merged['S2']['stdev'], expected['S2']['stdev'], places=8)
+            else:
+                self.assertEqual(merged, expected)
+
+    def test_GlobalSensitivity(self):
+        """Sobol indices and Morris effects of an additive output."""
+        import numpy as np
+        import tellurium as te
+        r = te.loada("""
+            S1 -> ; a*S1
+            S1 = 1; a = 0.5; b = 0.5; c = 0.5
+        """)
+        gsa = te.GlobalSensitivity(r, {'a': (0, 1), 'b': (0, 1), 'c': (0, 1)}, linearOutput, workers=2)
+
+        morris = gsa.morris(trajectories=10, seed=1)
+        # points shared by trajectories are simulated once
+        self.assertLessEqual(morris.evaluations, 10 * 4)
+        self.assertTrue(np.allclose(morris.mu_star[:, 0], [1, 2, 0]))
+        self.assertEqual(morris.ranking(), ['b', 'a', 'c'])
+
+        sobol = gsa.sobol(512, seed=1)
+        self.assertEqual(sobol.S1.shape, (3, 1))
+        # Var(a) = 1/12, Var(2 b) = 4/12
+        self.assertTrue(np.allclose(sobol.S1[:, 0], [0.2, 0.8, 0.0], atol=0.05))
+        self.assertTrue(np.allclose(sobol.ST[:, 0], [0.2, 0.8, 0.0], atol=0.05))
+        self.assertEqual(len(sobol.toDataFrame()), 3)
+
+        # the design is evaluated from the cache
+        evaluations = gsa.evaluations
+        gsa.sobol(512, seed=1)
+        self.assertEqual(gsa.evaluations, evaluations)
+
+        # a new output or model state is evaluated again
+        point = np.array([[0.5, 0.5, 0.5]])
+        gsa.output = offsetOutput
+        self.assertTrue(np.allclose(gsa.evaluate(point), 2.5))
+        self.assertEqual(gsa.evaluations, evaluations + 1)
+        # the simulation does not change the reset state
+        r.simulate(0, 10, 11)
+        gsa.evaluate(point)
+        self.assertEqual(gsa.evaluations, evaluations + 1)
+        r.c = 0.7
+        gsa.evaluate(point)
+        self.assertEqual(gsa.evaluations, evaluations + 2)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,48 @@
+"""
+Unittests for parallel ensemble simulation.
+"""
+from __future__ import absolute_import, print_function, division
+import unittest
+import numpy as np
+
+import tellurium as te
+
+
+class EnsembleTestCase(unittest.TestCase):
+    def setUp(self):
+        self.r = te.loada('''
+            S1 -> S2; k1*S1;
+            k1 = 0.1; S1 = 40; S2 = 0;
+        ''')
+
+    def test_shape(self):
+        ens = self.r.simulateEnsemble(5, 0, 10, 11, selections=['time', 'S1'], workers=1)
+        self.assertEqual(ens.shape, (5, 11, 2))
+        self.assertAlmostEqual(ens[0, -1, 0], 10.0)
+
+    def test_ode_replicates_identical(self):
+        ens = self.r.simulateEnsemble(3, 0, 10, 11, workers=1)
+        self.assertTrue(np.allclose(ens[0], ens[2]))
+
+    def test_integrator_settings(self):
+        self.r.integrator.relative_tolerance = 1e-3
+        self.r.integrator.absolute_tolerance = 1e-3
+        self.r.integrator.variable_step_size = True
+        ens = self.r.simulateEnsemble(2, 0, 10, 11, selections=['time', 'S1'], workers=2)
+        self.r.timeCourseSelections = ['time', 'S1']
+        s = self.r.simulate(0, 10, 11)
+        self.assertTrue(np.allclose(ens[0], s, rtol=0, atol=1e-12))
+
+    def test_gillespie_seeds(self):
+        seeds = [1, 2, 1]
+        ens = self.r.simulateEnsemble(3, 0, 40, 41, seeds=seeds, integrator='gillespie', workers=2)
+        self.assertTrue(np.allclose(ens[0], ens[2]))
+        self.assertEqual(self.r.integrator.getName(), 'cvode')
+
+    def test_seed_count(self):
+        with self.assertRaises(ValueError):
+            self.r.simulateEnsemble(3, 0, 10, 11, seeds=[1, 2], workers=1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -32,7 +32,7 @@ class PythonExampleTestCase(unittest.TestCase):
 
     def setUp(self):
         # switch the backend of matplotlib, so plots can be tested
-        import matplotlib
+        import matplotlib.pyplot
         matplotlib.pyplot.switch_backend("Agg")
 
 
@@ -0,0 +1,105 @@
+"""
+Import time benchmark of tellurium.
+
+`import tellurium` must only load the core of loading and simulating models,
+the subsystems are imported on first use. The tests run the imports in fresh
+interpreters; run the module to print the import times
+::
+
+    python -m tellurium.tests.test_import
+"""
+from __future__ import absolute_import, print_function, division
+import os
+import sys
+import json
+import unittest
+import subprocess
+
+# modules which must not be imported by `import tellurium`
+DEFERRED_MODULES = [
+    'tellurium.analysis',
+    'tellurium.notebooks',
+    'tellurium.plotting',
+    'tellurium.sedml',
+    'tellurium.teio',
+    'tellurium.visualization',
+    'tellurium.utils.uncertainty',
+    'matplotlib',
+    'plotly',
+    'pandas',
+    'jinja2',
+    'tesedml',
+    'libsedml',
+    'phrasedml',
+    'tecombine',
+    'libcombine',
+]
+
+# import time of tellurium on top of its core dependencies, override with the
+# environment variable TELLURIUM_IMPORT_BUDGET (seconds)
+IMPORT_BUDGET = float(os.environ.get('TELLURIUM_IMPORT_BUDGET', 1.0))
+
+
+def _run(code):
+    """ Output of the python code in a fresh interpreter. """
+    env = dict(os.environ)
+    env.pop('TELLURIUM_PROFILE', None)
+    return subprocess.check_output([sys.executable, '-c', code], env=env).decode('utf-8')
+
+
+def importedModules(statement='import tellurium'):
+    """ Modules in sys.modules after the statement in a fresh interpreter. """
+    code = 'import sys, json; {}; print(json.dumps(sorted(sys.modules)))'.format(statement)
+    return json.loads(_run(code).strip().splitlines()[-1])
+
+
+def importTime(statement, repeat=3):
+    """ Best wall time of the statement in fresh interpreters in seconds. """
+    code = 'import time; t = time.time(); {}; print(time.time() - t)'.format(statement)
+    return min(float(_run(code).strip().splitlines()[-1]) for _ in range(repeat))
+
+
+class ImportTestCase(unittest.TestCase):
+
+    def test_deferred_modules(self):
+        modules = set(importedModules())
+        self.assertIn('tellurium', modules)
+        loaded = [m for m in DEFERRED_MODULES if m in modules]
+        self.assertEqual(loaded, [])
+
+    def test_lazy_attributes(self):
+        modules = set(importedModules('import tellurium as te; te.executeSEDML; te.ParameterScan'))
+        self.assertIn('tellurium.sedml.tesedml', modules)
+        self.assertIn('tellurium.analysis.parameterscan', modules)
+        self.assertNotIn('tellurium.visualization', modules)
+
+    def test_disabled_plotting(self):
+        modules = set(importedModules(
+            'import tellurium as te; te.disablePlotting(); '
+            'r = te.loada("S1 -> S2; k1*S1; k1=0.1; S1=10"); r.simulate(0, 10, 11); r.plot(); '
+            'te.plot(r.getSimulationData()[:, 0], r.getSimulationData()[:, 1])'))
+        self.assertIn('tellurium.plotting.engine_null', modules)
+        self.assertNotIn('matplotlib', modules)
+        self.assertNotIn('plotly', modules)
+
+    def test_dir(self):
+        import tellurium as te
+        names = dir(te)
+        for name in ['loada', 'executeSEDML', 'plot', 'SBMLDiagram']:
+            self.assertIn(name, names)
+        with self.assertRaises(AttributeError):
+            te.doesNotExist
+
+    def test_import_time(self):
+        baseline = importTime('import numpy, roadrunner, antimony')
+        tellurium = importTime('import tellurium')
+        self.assertLess(tellurium - baseline, IMPORT_BUDGET,
+                        'import tellurium takes {:.3f} s on top of its dependencies'.format(tellurium - baseline))
+
+
+if __name__ == '__main__':
+    baseline = importTime('import numpy, roadrunner, antimony')
+    print('core dependencies: {:.3f} s'.format(baseline))
+    print('tellurium:         {:.3f} s'.format(importTime('import tellurium')))
+    print('tellurium + sedml: {:.3f} s'.format(importTime('import tellurium as te; te.executeSEDML')))
+    unittest.main()
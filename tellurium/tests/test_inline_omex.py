@@ -4,7 +4,7 @@ Tests for the inline omex functionality.
 from __future__ import absolute_import, print_function
 import unittest
 import pytest
-import matplotlib
+import matplotlib.pyplot
 
 import tellurium as te
 from tellurium.teconverters import inline_omex, convert_omex
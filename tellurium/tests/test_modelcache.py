@@ -0,0 +1,88 @@
+"""
+Unittests for the compiled model cache.
+"""
+from __future__ import absolute_import, print_function, division
+import os
+import shutil
+import tempfile
+import unittest
+
+import tellurium as te
+from tellurium.roadrunner import ModelCache, modelKey
+
+
+class ModelCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.ant_str = '''
+        model pathway()
+             S1 -> S2; k1*S1
+             S1 = 10; S2 = 0
+             k1 = 1
+        end
+        '''
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        te.disableModelCache()
+        shutil.rmtree(self.cache_dir)
+
+    def test_key_normalization(self):
+        k1 = modelKey(self.ant_str, 'antimony')
+        k2 = modelKey(self.ant_str.replace('        ', '    '), 'antimony')
+        self.assertEqual(k1, k2)
+        self.assertNotEqual(k1, modelKey(self.ant_str, 'sbml'))
+        self.assertNotEqual(k1, modelKey(self.ant_str, 'antimony', conservedMoietyAnalysis=True))
+
+    def test_hits_and_misses(self):
+        cache = te.enableModelCache(maxsize=4)
+        r1 = te.loada(self.ant_str)
+        r2 = te.loada(self.ant_str)
+        self.assertEqual(cache.misses, 1)
+        self.assertEqual(cache.hits, 1)
+        self.assertEqual(len(cache), 1)
+
+        # copies are independent
+        r1.k1 = 5.0
+        self.assertAlmostEqual(r2.k1, 1.0)
+        s = r2.simulate(0, 10, 11)
+        self.assertEqual(s.shape[0], 11)
+
+    def test_load_settings(self):
+        import roadrunner
+        cache = te.enableModelCache(maxsize=4)
+        key = roadrunner.Config.LOADSBMLOPTIONS_CONSERVED_MOIETIES
+        value = roadrunner.Config.getValue(key)
+        te.loada(self.ant_str)
+        try:
+            roadrunner.Config.setValue(key, not value)
+            te.loada(self.ant_str)
+        finally:
+            roadrunner.Config.setValue(key, value)
+        self.assertEqual(cache.misses, 2)
+        self.assertEqual(cache.hits, 0)
+
+    def test_lru_eviction(self):
+        cache = ModelCache(maxsize=1)
+        cache.load(self.ant_str, 'antimony', lambda: te.loada(self.ant_str))
+        cache.load('S1 -> S2; k1*S1; k1=2; S1=5', 'antimony', lambda: te.loada('S1 -> S2; k1*S1; k1=2; S1=5'))
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.misses, 2)
+
+    def test_disk_cache(self):
+        cache = ModelCache(maxsize=1, cache_dir=self.cache_dir)
+        cache.load(self.ant_str, 'antimony', lambda: te.loada(self.ant_str))
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+
+        cache = ModelCache(maxsize=1, cache_dir=self.cache_dir)
+        r = cache.load(self.ant_str, 'antimony', lambda: te.loada(self.ant_str))
+        self.assertEqual(cache.disk_hits, 1)
+        self.assertAlmostEqual(r.k1, 1.0)
+
+    def test_disk_eviction(self):
+        cache = ModelCache(maxsize=1, cache_dir=self.cache_dir, max_disk_size=0)
+        cache.load(self.ant_str, 'antimony', lambda: te.loada(self.ant_str))
+        self.assertEqual(len(os.listdir(self.cache_dir)), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
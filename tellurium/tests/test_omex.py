@@ -107,3 +107,31 @@ def test_createCombineArchiveFromDirectory():
 
 
 
+
+
+# in-memory reader
+def test_OmexReader_locationsByFormat():
+    with omex.OmexReader(OMEX_SHOWCASE) as archive:
+        locations = archive.locationsByFormat("sed-ml")
+        assert len(locations) == 2
+        assert locations[0].endswith("Calzone2007-simulation-figure-1B.xml")
+        assert len(archive.locationsByFormat("sbml")) == 1
+
+
+def test_OmexReader_read():
+    with omex.OmexReader(OMEX_SHOWCASE) as archive:
+        location = archive.locationsByFormat("sbml")[0]
+        assert "./" + location in archive
+        sbml = archive.readString(location)
+        assert "<sbml" in sbml
+        assert archive.resolve("../model/BIOMD0000000144.xml", base="experiment/sim.xml") == "model/BIOMD0000000144.xml"
+
+
+def test_OmexReader_extract(tmpdir):
+    with omex.OmexReader(OMEX_SHOWCASE) as archive:
+        location = archive.locationsByFormat("sbml")[0]
+        path = archive.extract(location, os.path.join(str(tmpdir), "model.xml"))
+        # only the requested entry is written
+        assert os.listdir(str(tmpdir)) == ["model.xml"]
+        with open(path, "rb") as f:
+            assert f.read() == archive.read(location)
@@ -5,7 +5,8 @@ Here we make sure the different plotting alternatives work.
 """
 from __future__ import absolute_import, print_function
 import os
-import matplotlib
+import matplotlib.pyplot
+import numpy as np
 from tellurium.tests.testdata import OMEX_TEST_DIR
 import tellurium as te
 
@@ -42,3 +43,179 @@ def test_plotly1(tmpdir):
     dgs = te.executeCombineArchive(OMEX1, printPython=True, outputDir=str(tmpdir), saveOutputs=True)
     assert dgs is not None
 
+
+def test_null_engine():
+    engine = te.getPlottingEngine('null')
+    x = np.linspace(0, 10, 11)
+    fig = engine.plot(x, np.column_stack([x, x**2]), show=False)
+    fig.addXYDataset(x, x)
+    assert list(fig.getDatasets()) == []
+    assert engine.fig is None
+    assert engine.show() is None
+
+    tiled = engine.newTiledFigure(rows=2, cols=2)
+    assert list(tiled.nextFigure().getDatasets()) == []
+    assert not tiled.renderIfExhausted()
+
+
+def test_null_engine_timecourse():
+    r = te.loada('S1 -> S2; k1*S1; k1=0.1; S1=10')
+    s = r.simulate(0, 10, 11)
+    engine = te.getPlottingEngine('null')
+    engine.plotTimecourse(s)
+    engine.accumulateTimecourse(s)
+    assert engine.fig is None
+
+
+def test_decimation_minmax():
+    from tellurium.plotting.decimation import decimationIndices
+    x = np.linspace(0, 1, 100001)
+    y = np.sin(50 * x) + np.where(np.arange(len(x)) == 12345, 5.0, 0.0)
+    index = decimationIndices(x, y, points=1000, method='minmax')
+    assert len(index) <= 1000
+    assert np.all(np.diff(index) > 0)
+    assert index[0] == 0 and index[-1] == len(x) - 1
+    assert y[index].max() == y.max() and y[index].min() == y.min()
+
+
+def test_decimation_lttb():
+    from tellurium.plotting.decimation import decimate
+    x = np.linspace(0, 1, 50001)
+    y = np.cos(20 * x)
+    x2, y2 = decimate(x, y, points=500, method='lttb')
+    assert len(x2) <= 500
+    assert np.allclose(np.interp(x, x2, y2), y, atol=1E-2)
+
+
+def test_decimated_datasets():
+    from tellurium.plotting.engine import PlottingFigure
+    fig = PlottingFigure()
+    x = np.linspace(0, 1, 20001)
+    for k in range(3):
+        fig.addXYDataset(x, x * k, tag='traces')
+    fig.addXYDataset(x[:10], x[:10], text=['a'] * 10)
+    datasets = list(fig.getRenderDatasets(points=1000))
+    merged = datasets[0]
+    assert len(merged['x']) <= 1000 + 2
+    # the separators of the merged traces are kept
+    assert np.isnan(merged['y']).sum() == 2
+    assert len(datasets[1]['x']) == 10
+
+
+def test_percentile_bands():
+    from tellurium.plotting.decimation import percentileBands
+    x = np.linspace(0, 10, 11)
+    ensemble = np.arange(101)[:, None] * np.ones(11)
+    bands = percentileBands(x, ensemble, percentiles=(5, 50, 95))
+    assert bands.shape == (3, 11)
+    assert np.allclose(bands[:, 0], [5, 50, 95])
+
+    traces = [(np.array([0.0, 5.0]), np.array([k, k + 1.0])) for k in range(101)]
+    bands = percentileBands(x, traces, percentiles=(50,))
+    assert np.allclose(bands[0, :5], 50) and np.allclose(bands[0, 5:], 51)
+
+
+def ensembleFigure(batch, traces=200, points=1000):
+    """ Matplotlib figure of an ensemble of non overlapping traces in two colors. """
+    from tellurium.plotting.engine_mpl import MatplotlibFigure
+    fig = MatplotlibFigure(batch=batch, title='Ensemble')
+    x = np.linspace(0, 10, points)
+    for k in range(traces):
+        name = 'trace {}'.format(k) if k < 2 else None
+        fig.addXYDataset(x, k + 0.3 * np.sin(x + k), color=['red', 'blue'][k % 2], name=name)
+    return fig
+
+
+def renderTime(batch, traces=200, points=1000, repeat=3):
+    """ Best time to render and draw the ensemble figure in seconds. """
+    import time
+    best = None
+    for _ in range(repeat):
+        fig = ensembleFigure(batch, traces=traces, points=points)
+        t = time.time()
+        mpl_fig = fig.render()
+        mpl_fig.canvas.draw()
+        t = time.time() - t
+        matplotlib.pyplot.close(mpl_fig)
+        best = t if best is None else min(best, t)
+    return best
+
+
+def test_batched_render():
+    fig = ensembleFigure(batch=True).render()
+    ax = fig.axes[0]
+    assert len(ax.lines) == 0
+    assert len(ax.collections) == 2
+    assert [text.get_text() for text in ax.get_legend().get_texts()] == ['trace 0', 'trace 1']
+    matplotlib.pyplot.close(fig)
+
+
+def test_batched_render_pixels():
+    images = []
+    for batch in [False, True]:
+        fig = ensembleFigure(batch=batch, traces=20)
+        # the 'best' legend location depends on the artist types
+        fig.use_legend = False
+        fig = fig.render()
+        fig.canvas.draw()
+        images.append(np.asarray(fig.canvas.buffer_rgba(), dtype=float))
+        matplotlib.pyplot.close(fig)
+    assert images[0].shape == images[1].shape
+    assert np.mean(np.abs(images[0] - images[1]).max(axis=2) > 0) < 0.01
+
+
+def test_plotly_traces():
+    from tellurium.plotting.engine_plotly import PlotlyFigure
+    fig = PlotlyFigure()
+    fig.webgl_threshold = 1000
+    t = np.linspace(0, 10, 101)
+    data = np.column_stack([t, np.sin(t), np.cos(t)])
+    fig.addXYDataset(data[:, 0], data[:, 1], name='S1')
+    fig.addXYDataset(data[:, 0], data[:, 2], name='S2')
+    traces = list(fig.getTraces())
+    assert [trace['type'] for trace in traces] == ['scatter', 'scatter']
+    # evenly spaced time points are sent as x0 and dx
+    assert 'x' not in traces[0]
+    assert np.allclose([traces[0]['x0'], traces[0]['dx']], [0.0, 0.1])
+
+    for k in range(10):
+        fig.addXYDataset(t, t * k)
+    assert set(trace['type'] for trace in fig.getTraces()) == {'scattergl'}
+
+
+def test_plotly_tagged_traces():
+    from tellurium.plotting.engine_plotly import PlotlyFigure, uniformSpacing
+    fig = PlotlyFigure()
+    t = np.linspace(0, 10, 11)
+    fig.addXYDataset(t, t, tag='S1')
+    fig.addXYDataset(t, 2 * t, tag='S1')
+    traces = list(fig.getTraces())
+    assert len(traces) == 1
+    # the merged x values contain the NaN separator and are sent as array
+    assert 'x0' not in traces[0]
+    assert len(traces[0]['x']) == 23
+    assert uniformSpacing(np.array([0.0, np.nan, 2.0])) is None
+
+
+def test_plotly_binary_arrays():
+    import base64
+    from tellurium.plotting.engine_plotly import PlotlyFigure
+    fig = PlotlyFigure()
+    x = np.array([0.0, 1.0, 3.0, 7.0])
+    fig.addXYDataset(x, x ** 2)
+    fig.addXYDataset(x, x ** 3)
+    traces = list(fig.getTraces(binary=True))
+    # the shared x array is encoded once
+    assert traces[0]['x'] is traces[1]['x']
+    decoded = np.frombuffer(base64.b64decode(traces[1]['y']['bdata']), dtype='<f8')
+    assert np.allclose(decoded, x ** 3)
+
+
+if __name__ == '__main__':
+    # rendering benchmark of the matplotlib engine
+    matplotlib.pyplot.switch_backend("Agg")
+    for traces in [100, 1000]:
+        single = renderTime(batch=False, traces=traces)
+        batched = renderTime(batch=True, traces=traces)
+        print('{:5d} traces: plt.plot {:.3f} s, LineCollection {:.3f} s ({:.1f}x)'.format(
+            traces, single, batched, single / batched))
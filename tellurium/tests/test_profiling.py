@@ -0,0 +1,78 @@
+"""
+Unittests for the profiling instrumentation.
+"""
+from __future__ import absolute_import, print_function, division
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+import tellurium as te
+from tellurium.utils import profiling
+
+
+class ProfilingTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        te.disableProfiling()
+        shutil.rmtree(self.tmpdir)
+
+    def test_disabled(self):
+        self.assertIsNone(te.getProfiler())
+        r = te.loada('S1 -> S2; k1*S1; k1 = 0.1; S1 = 10')
+        r.simulate(0, 10, 11)
+        self.assertIsNone(te.getProfiler())
+
+    def test_phases(self):
+        with te.profile() as prof:
+            r = te.loada('S1 -> S2; k1*S1; k1 = 0.2; S1 = 10')
+            r.simulate(0, 10, 11)
+            r.simulate(0, 10, 11)
+            r.steadyState()
+        self.assertIsNone(te.getProfiler())
+        rows = dict((row['phase'], row) for row in prof.summary())
+        self.assertEqual(rows['simulate']['calls'], 2)
+        self.assertEqual(rows['steadyState']['calls'], 1)
+        self.assertEqual(rows['load.antimony']['calls'], 1)
+        # the conversion is nested in the load
+        paths = [e['path'] for e in prof.events if e['name'] == 'convert.antimony->sbml']
+        self.assertEqual(paths[0][0], 'load.antimony')
+        self.assertGreaterEqual(rows['load.antimony']['wall'], rows['load.antimony']['self'])
+
+    def test_nested_span(self):
+        prof = te.enableProfiling()
+        with profiling.span('outer'):
+            with profiling.span('inner'):
+                pass
+            with profiling.span('inner'):
+                pass
+        te.disableProfiling()
+        self.assertIn('outer;inner', prof.folded())
+        rows = dict((row['phase'], row) for row in prof.summary())
+        self.assertEqual(rows['inner']['calls'], 2)
+        self.assertLessEqual(rows['outer']['self'], rows['outer']['wall'])
+
+    def test_save(self):
+        path = os.path.join(self.tmpdir, 'trace.json')
+        with te.profile(path):
+            with profiling.span('phase'):
+                pass
+        with open(path) as f:
+            trace = json.load(f)
+        self.assertEqual(trace['traceEvents'][0]['name'], 'phase')
+        self.assertEqual(trace['traceEvents'][0]['ph'], 'X')
+
+        prof = profiling.Profiler()
+        with prof.span('a'):
+            pass
+        for ext in ['.folded', '.csv', '.txt']:
+            path = os.path.join(self.tmpdir, 'profile' + ext)
+            prof.save(path)
+            self.assertTrue(os.path.getsize(path) > 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -36,7 +36,7 @@ class TestRunner(object):
         :return: results of unittest
         :rtype: unittest.TextTestResult
         """
-        import matplotlib
+        import matplotlib.pyplot
         backend = matplotlib.rcParams['backend']
         matplotlib.pyplot.switch_backend("Agg")
 
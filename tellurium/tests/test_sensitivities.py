@@ -0,0 +1,69 @@
+"""
+Unittests for time course sensitivities.
+"""
+from __future__ import absolute_import, print_function, division
+import unittest
+import numpy as np
+
+import tellurium as te
+
+
+class SensitivitiesTestCase(unittest.TestCase):
+    def setUp(self):
+        self.r = te.loada('''
+            S1 -> S2; k1*S1;
+            k1 = 0.1; k2 = 1; S1 = 40; S2 = 0;
+        ''')
+        self.r.integrator.relative_tolerance = 1E-10
+        self.r.integrator.absolute_tolerance = 1E-12
+        self.t = np.linspace(0, 10, 11)
+
+    def test_central_differences(self):
+        S = self.r.timeCourseSensitivities(0, 10, 11, parameters=['k1', 'k2'], selections=['S1'], method='fd')
+        self.assertEqual(S.shape, (1, 2, 11))
+        self.assertTrue(np.allclose(S[0, 0], -40 * self.t * np.exp(-0.1 * self.t), rtol=1E-4, atol=1E-6))
+        self.assertTrue(np.allclose(S[0, 1], 0))
+        # the perturbed parameters are restored
+        self.assertEqual(self.r.k1, 0.1)
+
+    def test_workers(self):
+        S1 = self.r.timeCourseSensitivities(0, 10, 11, parameters=['k1'], method='fd', workers=1)
+        S2 = self.r.timeCourseSensitivities(0, 10, 11, parameters=['k1'], method='fd', workers=2)
+        self.assertTrue(np.allclose(S1, S2, rtol=1E-3, atol=1E-6))
+
+    def test_workers_after_simulation(self):
+        # the workers start from the reset state, not from the end of the simulation
+        self.r.simulate(0, 20, 21)
+        S1 = self.r.timeCourseSensitivities(0, 10, 11, parameters=['k1'], method='fd', workers=1)
+        self.r.simulate(0, 20, 21)
+        S2 = self.r.timeCourseSensitivities(0, 10, 11, parameters=['k1'], method='fd', workers=2)
+        self.assertTrue(np.allclose(S1, S2, rtol=1E-3, atol=1E-6))
+        self.assertTrue(np.allclose(S2[0, 0], -40 * self.t * np.exp(-0.1 * self.t), rtol=1E-4, atol=1E-6))
+
+    def test_linearized_bands_workers(self):
+        ens = te.UncertaintyEnsemble(self.r, ['k1'], ['S1'], simulation=(0, 10, 11))
+        bands1 = ens.linearizedBands(workers=1)
+        bands2 = ens.linearizedBands(workers=2)
+        self.assertTrue(np.allclose(bands1, bands2, rtol=1E-3, atol=1E-6))
+
+    def test_auto(self):
+        S = self.r.timeCourseSensitivities(0, 10, 11, parameters=['k1'], selections=['S1', 'S2'])
+        self.assertEqual(S.shape, (2, 1, 11))
+        # mass conservation
+        self.assertTrue(np.allclose(S[0, 0] + S[1, 0], 0, atol=1E-4))
+
+    def test_sse_gradient(self):
+        from tellurium.analysis.parameterestimation import simulationSSE, simulationSSEGradient
+        self.r.timeCourseSelections = ['time', 'S1']
+        data = np.column_stack([self.t, 40 * np.exp(-0.2 * self.t)])
+        settings = (0, 10, 101, False)
+        x, y = data[:, 0], data[:, 1:]
+        sse, gradient = simulationSSEGradient(self.r, ['k1'], [0.1], settings, x, y, method='fd')
+        h = 1E-6
+        fd = (simulationSSE(self.r, ['k1'], [0.1 + h], settings, x, y)[0] -
+              simulationSSE(self.r, ['k1'], [0.1 - h], settings, x, y)[0]) / (2 * h)
+        self.assertAlmostEqual(gradient[0], fd, places=3)
+
+
+if __name__ == '__main__':
+    unittest.main()
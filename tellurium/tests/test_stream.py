@@ -0,0 +1,97 @@
+"""
+Unittests for streaming simulation results and sinks.
+"""
+from __future__ import absolute_import, print_function, division
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+import tellurium as te
+from tellurium.teio.sinks import CSVSink, NPYSink, MemmapSink
+
+
+class StreamTestCase(unittest.TestCase):
+    def setUp(self):
+        self.ant_str = '''
+            S1 -> S2; k1*S1;
+            k1 = 0.1; S1 = 40; S2 = 0;
+        '''
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_fixed_grid_chunks(self):
+        r = te.loada(self.ant_str)
+        full = np.array(r.simulate(0, 10, 101))
+        r.reset()
+        chunks = list(r.simulateStream(0, 10, 101, chunkSize=30))
+        self.assertEqual([c.shape[0] for c in chunks], [30, 30, 30, 11])
+        self.assertTrue(np.allclose(np.concatenate(chunks), full, rtol=1E-4))
+
+    def test_stream_selections(self):
+        r = te.loada(self.ant_str)
+        selections = list(r.timeCourseSelections)
+        stream = r.simulateStream(0, 10, 101, chunkSize=30, selections=['time', 'S1'])
+        self.assertEqual(stream.colnames, ['time', 'S1'])
+        self.assertEqual(stream.toArray().shape, (101, 2))
+        self.assertEqual(list(r.timeCourseSelections), selections)
+
+    def test_stream_plot_decimation(self):
+        from tellurium.plotting.engine import timecourseData
+        from tellurium.plotting.decimation import getDecimation, setDecimation
+        r = te.loada(self.ant_str)
+        full = np.array(r.simulate(0, 10, 10001))
+        r.reset()
+        points, method = getDecimation()
+        setDecimation(points=100)
+        try:
+            data, colnames = timecourseData(r.simulateStream(0, 10, 10001, chunkSize=1000))
+        finally:
+            setDecimation(points=points, method=method)
+        self.assertEqual(colnames, ['time', '[S1]', '[S2]'])
+        self.assertLess(data.shape[0], 1000)
+        # first, last and extreme values are kept
+        self.assertTrue(np.allclose(data[[0, -1]], full[[0, -1]], rtol=1E-4))
+        self.assertTrue(np.allclose(data[:, 1:].max(axis=0), full[:, 1:].max(axis=0), rtol=1E-4))
+
+    def test_variable_step_gillespie(self):
+        r = te.loada(self.ant_str)
+        stream = r.gillespieStream(0, 40, chunkSize=7, windows=5)
+        data = stream.toArray()
+        self.assertTrue(np.all(np.diff(data[:, 0]) >= 0))
+        self.assertEqual(r.integrator.getName(), 'cvode')
+
+    def test_sinks(self):
+        r = te.loada(self.ant_str)
+        npy = os.path.join(self.tmpdir, 'result.npy')
+        csv = os.path.join(self.tmpdir, 'result.csv')
+        mmap = os.path.join(self.tmpdir, 'mmap.npy')
+
+        r.simulateStream(0, 10, 51, chunkSize=20).writeTo(NPYSink(npy))
+        self.assertEqual(np.load(npy, mmap_mode='r').shape, (51, 3))
+
+        r.reset()
+        r.simulateStream(0, 10, 51, chunkSize=20).writeTo(CSVSink(csv))
+        self.assertEqual(np.loadtxt(csv, delimiter=',', skiprows=1).shape, (51, 3))
+
+        r.reset()
+        sink = r.simulateStream(0, 10, 51, chunkSize=20).writeTo(MemmapSink(mmap))
+        self.assertTrue(np.allclose(sink.array, np.load(npy)))
+
+        # fewer rows than expected
+        r.reset()
+        with self.assertRaises(ValueError):
+            r.simulateStream(0, 10, 51, chunkSize=20).writeTo(MemmapSink(mmap, rows=60))
+
+    def test_latex_export_stream(self):
+        r = te.loada(self.ant_str)
+        p = te.LatexExport(r, color=['blue', 'green'], saveto=self.tmpdir, fileName='Model')
+        p.saveToOneFile(r.simulateStream(0, 10, 51, chunkSize=20))
+        self.assertTrue(os.path.exists(os.path.join(self.tmpdir, 'Model.txt')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -11,7 +11,7 @@ import tellurium as te
 
 import os
 import numpy as np
-import matplotlib
+import matplotlib.pyplot
 import antimony
 
 CELLML_SUPPORT = hasattr(antimony, "loadCellMLString")
@@ -235,6 +235,26 @@ class TelluriumTestCase(unittest.TestCase):
         sbml = te.cellmlToSBML(self.cellml_str)
         self.assertIsNotNone(sbml)
 
+    def test_conversion_memoized(self):
+        te.clearConversionCache()
+        cache = te.getConversionCache()
+        sbml1 = te.antimonyToSBML(self.ant_str)
+        sbml2 = te.antimonyToSBML(self.ant_str)
+        self.assertEqual(sbml1, sbml2)
+        self.assertEqual(cache.misses, 1)
+        self.assertEqual(cache.hits, 1)
+        # different direction is a different entry
+        te.sbmlToAntimony(sbml1)
+        self.assertEqual(cache.misses, 2)
+
+    def test_conversion_cache_disabled(self):
+        te.setConversionCacheSize(0)
+        try:
+            te.antimonyToSBML(self.ant_str)
+            self.assertEqual(len(te.getConversionCache()), 0)
+        finally:
+            te.setConversionCacheSize(64)
+
     # ---------------------------------------------------------------------
     # Jarnac compatibility layer
     # ---------------------------------------------------------------------
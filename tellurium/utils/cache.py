@@ -0,0 +1,98 @@
+"""
+Bounded, thread-safe caches and content hashing helpers.
+"""
+from __future__ import print_function, division, absolute_import
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def contentHash(*parts):
+    """ SHA-256 hex digest over the given string or bytes parts.
+
+    Parts are separated so that ('ab', 'c') and ('a', 'bc') hash differently.
+
+    :param parts: str or bytes objects
+    :return: hex digest
+    :rtype: str
+    """
+    h = hashlib.sha256()
+    for part in parts:
+        if not isinstance(part, bytes):
+            part = str(part).encode('utf-8')
+        h.update(part)
+        h.update(b'\0')
+    return h.hexdigest()
+
+
+class LRUCache(object):
+    """ Least recently used cache with a maximum number of entries.
+
+    All operations are guarded by a lock, so a single cache can be shared
+    between threads. A maxsize of 0 disables caching.
+    """
+
+    def __init__(self, maxsize=128):
+        self._maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    @property
+    def maxsize(self):
+        return self._maxsize
+
+    @maxsize.setter
+    def maxsize(self, value):
+        if value < 0:
+            raise ValueError('maxsize must be non-negative, got {}'.format(value))
+        with self._lock:
+            self._maxsize = value
+            self._evict()
+
+    def get(self, key, default=None):
+        """ Cached value for key, default if not cached. """
+        with self._lock:
+            if key in self._data:
+                value = self._data.pop(key)
+                self._data[key] = value
+                self.hits += 1
+                return value
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        """ Store value for key, evicting the least recently used entries. """
+        with self._lock:
+            self._data.pop(key, None)
+            if self._maxsize > 0:
+                self._data[key] = value
+                self._evict()
+
+    def clear(self):
+        """ Remove all entries and reset the counters. """
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """ Dictionary with hits, misses, size and maxsize. """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._data),
+            'maxsize': self._maxsize,
+        }
+
+    def _evict(self):
+        while len(self._data) > self._maxsize:
+            self._data.popitem(last=False)
@@ -0,0 +1,51 @@
+"""
+Lazy attributes of packages.
+
+A package lists the attributes it re-exports from its subsystems together
+with the module defining them. The module is imported on the first access of
+one of its attributes (PEP 562 module __getattr__), so importing the package
+does not import the subsystems.
+::
+
+    __getattr__, __dir__ = lazyAttributes(__name__, globals(), {
+        'executeSEDML': '.sedml.tesedml',
+    }, submodules=['sedml'])
+
+Python versions without module __getattr__ (< 3.7) import all attributes
+eagerly.
+"""
+from __future__ import print_function, division, absolute_import
+
+import sys
+import importlib
+
+
+def lazyAttributes(package, namespace, attributes, submodules=()):
+    """ Module __getattr__ and __dir__ resolving the attributes on first access.
+
+    :param package: name of the package, i.e. __name__
+    :param namespace: globals() of the package, resolved attributes are cached in it
+    :param attributes: dictionary of attribute name to the (relative) module defining it
+    :param submodules: names of subpackages imported on attribute access
+    :return: tuple (__getattr__, __dir__)
+    """
+    submodules = set(submodules)
+
+    def __getattr__(name):
+        if name in attributes:
+            value = getattr(importlib.import_module(attributes[name], package), name)
+        elif name in submodules:
+            value = importlib.import_module('.' + name, package)
+        else:
+            raise AttributeError("module '{}' has no attribute '{}'".format(package, name))
+        namespace[name] = value
+        return value
+
+    def __dir__():
+        return sorted(set(namespace) | set(attributes) | submodules)
+
+    if sys.version_info < (3, 7):
+        for name in attributes:
+            __getattr__(name)
+
+    return __getattr__, __dir__
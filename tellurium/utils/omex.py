@@ -13,10 +13,16 @@ When working with COMBINE archives these wrapper functions should be used.
 from __future__ import absolute_import, print_function
 
 import os
+import io
 import shutil
 import warnings
 import zipfile
 import tempfile
+import posixpath
+import threading
+from xml.etree import ElementTree
+
+from .cache import contentHash
 try:
     import libcombine
 except ImportError:
@@ -25,6 +31,7 @@ import pprint
 
 MANIFEST_PATTERN = "manifest.xml"
 METADAT_PATTERN = "metadata.*"
+MANIFEST_NAMESPACE = "http://identifiers.org/combine.specifications/omex-manifest"
 
 
 
@@ -356,3 +363,181 @@ def printContents(omexPath):
     :return:
     """
     pprint.pprint(listContents(omexPath))
+
+
+class OmexReader(object):
+    """ Reads entries of a COMBINE archive without extracting it.
+
+    The manifest is parsed once when the reader is created and the entries
+    are indexed by location. Entries are decompressed only when they are
+    read, directly from the zip into memory.
+    ::
+
+        with OmexReader(omexPath) as archive:
+            for location in archive.locationsByFormat('sed-ml'):
+                sedml = archive.readString(location)
+
+    Readers can be pickled, the copy reopens the archive.
+    """
+
+    def __init__(self, omexPath):
+        """ Open archive.
+
+        :param omexPath: path of the COMBINE archive
+        """
+        self.path = os.path.abspath(omexPath)
+        self._lock = threading.Lock()
+        self._zip = zipfile.ZipFile(self.path, 'r')
+        self._names = dict((self.normalize(name), name) for name in self._zip.namelist()
+                           if not name.endswith('/'))
+        self.entries = self._readManifest()
+
+    def __getstate__(self):
+        return {'path': self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __contains__(self, location):
+        return self.normalize(location) in self._names
+
+    def close(self):
+        """ Close the archive. """
+        self._zip.close()
+
+    @staticmethod
+    def normalize(location):
+        """ Location relative to the archive root, e.g. './model/m.xml' -> 'model/m.xml'. """
+        location = posixpath.normpath(location.replace('\\', '/'))
+        if location.startswith('/'):
+            location = location[1:]
+        return location
+
+    def _readManifest(self):
+        """ List of (location, format, master) of the manifest entries. """
+        if MANIFEST_PATTERN not in self._names:
+            return []
+        root = ElementTree.fromstring(self.read(MANIFEST_PATTERN))
+        entries = []
+        for content in root.iter('{{{}}}content'.format(MANIFEST_NAMESPACE)):
+            location = content.get('location')
+            if location is None or self.normalize(location) == '.':
+                continue
+            master = content.get('master', 'false').lower() == 'true'
+            entries.append((self.normalize(location), content.get('format', ''), master))
+        return entries
+
+    def contentKey(self):
+        """ Hash of the locations and contents of the entries, independent of the path.
+
+        Uses the sizes and CRC-32 checksums of the zip, no entry is decompressed.
+        """
+        parts = []
+        for location in sorted(self._names):
+            info = self._zip.getinfo(self._names[location])
+            parts.extend([location, info.file_size, info.CRC])
+        return contentHash('omex', *parts)
+
+    def locations(self):
+        """ Locations of all files in the archive. """
+        return sorted(self._names.keys())
+
+    def read(self, location):
+        """ Content of the entry as bytes.
+
+        :param location: location of the entry
+        :return: bytes
+        """
+        key = self.normalize(location)
+        if key not in self._names:
+            raise KeyError("No entry '{}' in archive: {}".format(location, self.path))
+        with self._lock:
+            return self._zip.read(self._names[key])
+
+    def readString(self, location, encoding='utf-8'):
+        """ Content of the entry as string. """
+        return self.read(location).decode(encoding)
+
+    def open(self, location):
+        """ In-memory file object of the entry. """
+        return io.BytesIO(self.read(location))
+
+    def extract(self, location, path):
+        """ Write a single entry to path.
+
+        :param location: location of the entry
+        :param path: file path to write to
+        :return: path
+        """
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        with open(path, 'wb') as f:
+            f.write(self.read(location))
+        return path
+
+    def resolve(self, source, base=None):
+        """ Location of a source referenced relative to the entry base.
+
+        SED-ML references models and data relative to the SED-ML file.
+
+        :param source: referenced source
+        :param base: location of the referencing entry
+        :return: normalized location
+        """
+        if base is not None:
+            source = posixpath.join(posixpath.dirname(self.normalize(base)), source)
+        return self.normalize(source)
+
+    def guessFormatKey(self, location):
+        """ Format key guessed from extension and root element, None if unknown. """
+        ext = posixpath.splitext(location)[1].lower()
+        if ext == '.sedml':
+            return 'sed-ml'
+        if ext == '.cellml':
+            return 'cellml'
+        if ext in ['.csv', '.tsv']:
+            return ext[1:]
+        if ext == '.xml':
+            head = self.read(location)[:2048].decode('utf-8', 'ignore')
+            if '<sedML' in head:
+                return 'sed-ml'
+            if '<sbml' in head:
+                return 'sbml'
+            if 'cellml' in head:
+                return 'cellml'
+            if '<numl' in head:
+                return 'numl'
+        return None
+
+    def locationsByFormat(self, formatKey, guess=True):
+        """ Locations of the entries with the given format.
+
+        Uses the formats of the manifest, master entries are listed first.
+        If no entry in the manifest has the format and guess is True, the
+        format is guessed from the files in the archive.
+
+        :param formatKey: libcombine format key, e.g. 'sed-ml' or 'sbml'
+        :param guess: guess the format if not in the manifest
+        :return: list of locations
+        """
+        locations_master = []
+        locations = []
+        for location, format, master in self.entries:
+            if libcombine.KnownFormats.isFormat(formatKey, format):
+                if master:
+                    locations_master.append(location)
+                else:
+                    locations.append(location)
+        locations = locations_master + locations
+        if not locations and guess:
+            locations = [loc for loc in self.locations() if self.guessFormatKey(loc) == formatKey]
+            if locations:
+                warnings.warn("No '{}' entries in manifest of '{}'; guessed {}".format(formatKey, self.path, locations))
+        return locations
@@ -0,0 +1,267 @@
+"""
+Opt-in timing instrumentation of tellurium.
+
+Model loading, the converters, the roadrunner compile, the simulations, the
+SED-ML code generation and execution and the rendering of figures are
+instrumented as phases. While a profiler is active every call of a phase
+records its wall and CPU time; nested calls are recorded as children of the
+enclosing phase.
+::
+
+    with te.profile() as prof:
+        r = te.loada(model)
+        r.simulate(0, 100, 1000)
+    print(prof.table())
+    prof.save('trace.json')     # chrome://tracing, Perfetto or speedscope
+    prof.save('trace.folded')   # flamegraph.pl folded stacks
+
+Setting the environment variable TELLURIUM_PROFILE profiles the whole
+session: '1' prints the summary table at exit, any other value is the path
+the profile is saved to at exit.
+
+Without an active profiler the instrumented functions only check a module
+global, so the instrumentation has no measurable overhead.
+"""
+from __future__ import print_function, division, absolute_import
+
+import os
+import sys
+import json
+import time
+import atexit
+import functools
+import threading
+import contextlib
+
+try:
+    _cpuTime = time.process_time
+except AttributeError:
+    _cpuTime = time.clock
+
+# active profiler, None if profiling is disabled
+_profiler = None
+
+
+class Profiler(object):
+    """ Records the calls of the instrumented phases. """
+
+    def __init__(self):
+        self.start = time.time()
+        self.events = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def begin(self, name):
+        """ Start a call of the phase name, returns the token for :func:`end`. """
+        stack = self._stack()
+        frame = [name, time.time(), _cpuTime(), 0.0]
+        stack.append(frame)
+        return frame
+
+    def end(self, frame):
+        """ Finish the call started with :func:`begin`. """
+        wall = time.time()
+        cpu = _cpuTime()
+        stack = self._stack()
+        name, wallStart, cpuStart, children = frame
+        path = tuple(f[0] for f in stack)
+        stack.pop()
+        duration = wall - wallStart
+        if stack:
+            stack[-1][3] += duration
+        with self._lock:
+            self.events.append({
+                'name': name,
+                'path': path,
+                'start': wallStart - self.start,
+                'wall': duration,
+                'self': duration - children,
+                'cpu': cpu - cpuStart,
+                'thread': threading.current_thread().ident,
+            })
+
+    @contextlib.contextmanager
+    def span(self, name):
+        """ Context manager recording the enclosed code as phase name. """
+        frame = self.begin(name)
+        try:
+            yield
+        finally:
+            self.end(frame)
+
+    def summary(self):
+        """ Call counts and times per phase, ordered by the total wall time.
+
+        :return: list of dictionaries with the keys 'phase', 'calls', 'wall'
+            (inclusive), 'self' (exclusive of nested phases) and 'cpu' in seconds
+        """
+        rows = {}
+        for event in self.events:
+            row = rows.setdefault(event['name'], {'phase': event['name'], 'calls': 0,
+                                                  'wall': 0.0, 'self': 0.0, 'cpu': 0.0})
+            row['calls'] += 1
+            row['self'] += event['self']
+            # recursive calls are only counted once in the inclusive times
+            if event['name'] not in event['path'][:-1]:
+                row['wall'] += event['wall']
+                row['cpu'] += event['cpu']
+        return sorted(rows.values(), key=lambda r: -r['wall'])
+
+    def table(self):
+        """ Summary as a text table. """
+        lines = ['{:<28s} {:>8s} {:>12s} {:>12s} {:>12s}'.format('phase', 'calls', 'wall [s]', 'self [s]', 'cpu [s]')]
+        for row in self.summary():
+            lines.append('{phase:<28s} {calls:>8d} {wall:>12.6f} {self:>12.6f} {cpu:>12.6f}'.format(**row))
+        return '\n'.join(lines)
+
+    def toDataFrame(self):
+        """ Summary as pandas.DataFrame indexed by phase. """
+        import pandas as pd
+        return pd.DataFrame(self.summary(), columns=['phase', 'calls', 'wall', 'self', 'cpu']).set_index('phase')
+
+    def folded(self):
+        """ Folded stacks of the exclusive times in microseconds (flamegraph.pl, speedscope). """
+        stacks = {}
+        for event in self.events:
+            key = ';'.join(event['path'])
+            stacks[key] = stacks.get(key, 0.0) + event['self']
+        return '\n'.join('{} {}'.format(key, int(round(value * 1E6))) for key, value in sorted(stacks.items()))
+
+    def chromeTrace(self):
+        """ Trace in the Chrome trace event format (chrome://tracing, Perfetto, speedscope). """
+        pid = os.getpid()
+        events = [{
+            'name': event['name'],
+            'cat': event['name'].split('.')[0],
+            'ph': 'X',
+            'ts': event['start'] * 1E6,
+            'dur': event['wall'] * 1E6,
+            'pid': pid,
+            'tid': event['thread'],
+            'args': {'cpu': event['cpu']},
+        } for event in self.events]
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def save(self, path):
+        """ Save the profile, the format is chosen by the extension.
+
+        '.json' writes a Chrome trace, '.folded' folded stacks, '.csv' the
+        summary table and every other extension the text table.
+
+        :param path: file path
+        """
+        ext = os.path.splitext(path)[1].lower()
+        with open(path, 'w') as f:
+            if ext == '.json':
+                json.dump(self.chromeTrace(), f)
+            elif ext == '.folded':
+                f.write(self.folded() + '\n')
+            elif ext == '.csv':
+                f.write('phase,calls,wall,self,cpu\n')
+                for row in self.summary():
+                    f.write('{phase},{calls},{wall},{self},{cpu}\n'.format(**row))
+            else:
+                f.write(self.table() + '\n')
+
+
+def getProfiler():
+    """ The active profiler, None if profiling is disabled. """
+    return _profiler
+
+
+def enableProfiling(profiler=None):
+    """ Start recording the instrumented phases.
+
+    :param profiler: Profiler to record into, a new one if None
+    :return: the active Profiler
+    """
+    global _profiler
+    _profiler = profiler if profiler is not None else Profiler()
+    return _profiler
+
+
+def disableProfiling():
+    """ Stop recording, returns the previously active profiler. """
+    global _profiler
+    profiler, _profiler = _profiler, None
+    return profiler
+
+
+@contextlib.contextmanager
+def profile(path=None):
+    """ Profile the enclosed code.
+    ::
+
+        with te.profile('trace.json') as prof:
+            te.executeCombineArchive('archive.omex')
+
+    :param path: optional file the profile is saved to on exit, see :func:`Profiler.save`
+    :return: Profiler
+    """
+    global _profiler
+    previous = _profiler
+    profiler = enableProfiling()
+    try:
+        yield profiler
+    finally:
+        _profiler = previous
+        if path is not None:
+            profiler.save(path)
+
+
+def span(name):
+    """ Context manager recording the enclosed code as phase name if profiling is enabled. """
+    profiler = _profiler
+    if profiler is None:
+        return _NULL_SPAN
+    return profiler.span(name)
+
+
+class _NullSpan(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def timed(name):
+    """ Decorator recording every call of the function as phase name. """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            profiler = _profiler
+            if profiler is None:
+                return func(*args, **kwargs)
+            frame = profiler.begin(name)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profiler.end(frame)
+        return wrapper
+    return decorator
+
+
+def _profileSession(target):
+    """ Profile the whole session, report to target at exit. """
+    profiler = enableProfiling()
+
+    def report():
+        if target.strip().lower() in ['1', 'true', 'yes', 'on']:
+            print(profiler.table(), file=sys.stderr)
+        else:
+            profiler.save(target)
+    atexit.register(report)
+
+
+if os.environ.get('TELLURIUM_PROFILE'):
+    _profileSession(os.environ['TELLURIUM_PROFILE'])
@@ -4,23 +4,178 @@ Created on Fri Oct 12 09:42:34 2018
 @author: YeonMi
 """
 
+from __future__ import division
+
 import tellurium as te
-te.setDefaultPlottingEngine("matplotlib")
 import numpy as np 
-import random
 import roadrunner
 import matplotlib
+from tellurium.plotting.backend import selectBackend
+selectBackend()
 import matplotlib.pyplot as plt
 import matplotlib.gridspec as gs 
 import pandas as pd 
 
+from tellurium.roadrunner.parallel import ModelPool, splitChunks, defaultWorkers
+from tellurium.analysis.sampling import sampleUnitCube
+
+
+def _simulateSamples(rr, item):
+    """ Simulate a block of parameter samples on the worker model.
+
+    :param rr: worker roadrunner instance
+    :param item: tuple (offset, parameter ids, samples, simulation, selections, steadyState)
+    :return: tuple (offset, array (samples, points, selections))
+    """
+    offset, parameters, samples, simulation, selections, steadyState = item
+    if steadyState:
+        rr.steadyStateSelections = selections
+        block = np.empty((len(samples), 1, len(selections)))
+    else:
+        block = np.empty((len(samples), simulation[2], len(selections)))
+    for k, values in enumerate(samples):
+        rr.resetAll()
+        for p, value in zip(parameters, values):
+            rr[p] = value
+        if steadyState:
+            block[k, 0] = rr.getSteadyStateValues()
+        else:
+            block[k] = rr.simulate(simulation[0], simulation[1], simulation[2], ['time'] + selections)[:, 1:]
+    return offset, block
+
+
+class UncertaintyEnsemble(object):
+    """ Batched Monte-Carlo simulation of parameter uncertainty.
+
+    All parameter samples are drawn up front. The parameters are normally
+    distributed around their values in the model with a standard deviation of
+    degreeofVariability times the value; the points of the unit cube given by
+    the sampling are mapped through the normal quantile function. The ensemble
+    is simulated on a pool of worker models into a preallocated array of shape
+    (samples, points, selections), the percentile bands are computed along the
+    sample axis.
+    ::
+
+        ens = UncertaintyEnsemble(r, ['k1', 'k2'], ['S1'], sampling='lhs')
+        bands = ens.run(1000, workers=4, tolerance=1E-3)
+    """
+
+    def __init__(self, model, parameters, selections, simulation=(0, 60, 241), degreeofVariability=0.1,
+                 sampling="uniform", seed=None, steadyState=False):
+        """ Create ensemble.
+
+        :param model: roadrunner instance
+        :param parameters: ids of the varied parameters
+        :param selections: selections of the simulation (without time)
+        :param simulation: (start, end, points) of the time course
+        :param degreeofVariability: relative standard deviation of the parameters
+        :param sampling: "uniform", "lhs" or "sobol", see :func:`sampleUnitCube`
+        :param seed: seed of the samples
+        :param steadyState: compute steady states instead of time courses
+        """
+        self.model = model
+        self.parameters = list(parameters)
+        self.selections = list(selections)
+        self.simulation = tuple(simulation)
+        self.degreeofVariability = degreeofVariability
+        self.sampling = sampling
+        self.seed = seed
+        self.steadyState = steadyState
+        self.data = None
+        self.size = 0
+
+    def samples(self, n):
+        """ Parameter samples (n, parameters). """
+        from scipy.stats import norm
+        self.model.resetAll()
+        nominal = np.array([self.model[p] for p in self.parameters], dtype=float)
+        z = norm.ppf(sampleUnitCube(n, len(self.parameters), sampling=self.sampling, seed=self.seed))
+        return nominal * (1 + self.degreeofVariability * z)
+
+    def percentiles(self, q):
+        """ Percentiles along the sample axis of the simulated samples.
+
+        :param q: list of percentiles (0-100)
+        :return: array (len(q), points, selections)
+        """
+        return np.percentile(self.data[:self.size], q, axis=0)
+
+    def run(self, n, q=(2.5, 50, 97.5), workers=1, tolerance=None, batchSize=None, callback=None):
+        """ Simulate the ensemble.
+
+        With a tolerance the ensemble is simulated in batches and stops early
+        once the largest change of the percentile bands between two batches,
+        relative to the largest band value, is below the tolerance.
+
+        :param n: maximal number of samples
+        :param q: percentiles of the bands
+        :param workers: number of worker processes, None uses all CPUs
+        :param tolerance: relative convergence tolerance of the bands, None simulates all samples
+        :param batchSize: number of samples per batch, defaults to n/10 with a tolerance
+        :param callback: function called with the number of simulated samples after every batch
+        :return: array (len(q), points, selections) of the bands
+        """
+        samples = self.samples(n)
+        points = 1 if self.steadyState else self.simulation[2]
+        self.data = np.empty((n, points, len(self.selections)))
+        self.size = 0
+        if batchSize is None:
+            batchSize = max(1, n // 10) if tolerance is not None else n
+
+        bands = None
+        with ModelPool(self.model.getCurrentSBML(), workers=defaultWorkers(workers)) as pool:
+            while self.size < n:
+                start, stop = self.size, min(n, self.size + batchSize)
+                items = [(start + a, self.parameters, samples[start + a:start + b], self.simulation,
+                          self.selections, self.steadyState)
+                         for a, b in splitChunks(stop - start, pool.workers)]
+                for offset, block in pool.imap_unordered(_simulateSamples, items):
+                    self.data[offset:offset + len(block)] = block
+                self.size = stop
+                if callback is not None:
+                    callback(self.size)
+
+                previous, bands = bands, self.percentiles(q)
+                if tolerance is not None and previous is not None:
+                    scale = max(np.max(np.abs(bands)), np.finfo(float).tiny)
+                    if np.max(np.abs(bands - previous)) / scale < tolerance:
+                        break
+        return bands
+
+    def linearizedBands(self, q=(2.5, 50, 97.5), workers=1):
+        """ Percentile bands of the first order propagation of the parameter uncertainty.
+
+        The standard deviation of every output is propagated linearly through the
+        time course sensitivities (see ExtendedRoadRunner.timeCourseSensitivities),
+        which needs 2 simulations per parameter instead of an ensemble. The bands
+        are accurate for small degrees of variability.
+
+        :param q: percentiles of the bands
+        :param workers: number of worker processes of the sensitivities
+        :return: array (len(q), points, selections) of the bands
+        """
+        from scipy.stats import norm
+        if self.steadyState:
+            raise ValueError('Linearized bands are only available for time courses.')
+        start, end, points = self.simulation
+        self.model.resetAll()
+        nominal = np.array([self.model[p] for p in self.parameters], dtype=float)
+        y0 = np.array(self.model.simulate(start, end, points, ['time'] + self.selections))[:, 1:]
+        S = self.model.timeCourseSensitivities(start, end, points, parameters=self.parameters,
+                                               selections=self.selections, workers=workers)
+        # (selections, parameters, points) scaled by the parameter standard deviations
+        sd = np.sqrt(np.sum((S * (self.degreeofVariability * nominal)[np.newaxis, :, np.newaxis]) ** 2, axis=1))
+        z = norm.ppf(np.asarray(q, dtype=float) / 100.0)
+        return y0[np.newaxis] + z[:, np.newaxis, np.newaxis] * sd.T[np.newaxis]
+
 
 def UncertaintySingleP(model, variables, runType = None, parameters = None, simulation = None, degreeofVariability = None,
                       excludedParameters = None, sizeofEnsemble = None, ConfidenceInterval = None,  
                       limitc = None, midc = None, fillc = None, barc = None, 
                       limitw = None, midw = None,
                       fontsize = None,  
-                      callback = None, datasave = None, imagesave = None):
+                      callback = None, datasave = None, imagesave = None,
+                      sampling = None, workers = None, tolerance = None, seed = None):
     
     """ Measures the contribution of a singple parameter uncertainty to the model output. 
     The row of the grid indicates individual parameter, the independent variable of the simulation.
@@ -50,6 +205,10 @@ def UncertaintySingleP(model, variables, runType = None, parameters = None, simu
     :param callback: callback (bool) If `True`, shows the progress of the task by returning the coordinate of subplot
     :param datasave: name of the directory (str). creates a new directory in current working directory and save raw data in CSV format.
     :param imagesave: name of the image file (str, "filename.format"). saves the image file of the grid output. 
+    :param sampling: design of the parameter samples (str), "uniform" (default), "lhs" or "sobol".
+    :param workers: number of processes simulating the ensemble (int), default 1. None in the ensemble uses all CPUs.
+    :param tolerance: stop early once the relative change of the confidence bands between batches is below tolerance (float).
+    :param seed: seed of the parameter samples (int).
     """
     
     #default settings for function arguments 
@@ -106,6 +265,12 @@ def UncertaintySingleP(model, variables, runType = None, parameters = None, simu
         
     if runType is None:
         runType = "TimeCourse"  
+
+    if sampling is None:
+        sampling = "uniform"
+
+    if workers is None:
+        workers = 1
     
     #create a new directory to save raw data
     if datasave is not None:
@@ -141,34 +306,14 @@ def UncertaintySingleP(model, variables, runType = None, parameters = None, simu
         fig = plt.figure(figsize = figuresize)
         grids = gs.GridSpec(nrows = len(parameters), ncols = len(variables), figure = fig)
         
-        for v in variables:
-            for p in parameters: 
-                results = []
-                lowers = []
-                mids = []
-                uppers = []
-            
-        # run simulations and collect all the results
-                for i in range(0, sizeofEnsemble+1):
-                    model.resetAll()
-                    model[p] = random.normalvariate(model[p], degreeofVariability * model[p])
-                    result = model.simulate(simulation[0], simulation[1], simulation[2], ['time'] + [v]) 
-                    results.append(result)
-                
-                for j in range(0, len(results[0]['time'])):
-                    timepoint=[]
-                    for k in range(0,len(results)):
-                        timepoint.append(results[k][v][j])
-                    lowers.append(np.percentile(timepoint,cilimit[0]))
-                    mids.append(np.percentile(timepoint,cilimit[1]))
-                    uppers.append(np.percentile(timepoint,cilimit[2]))
-            
-
-
-                x = results[0]["time"]
-                y1 = lowers
-                y2 = mids
-                y3 = uppers
+        x = np.linspace(simulation[0], simulation[1], simulation[2])
+        for p in parameters:
+            # one ensemble per parameter for all variables
+            ensemble = UncertaintyEnsemble(model, [p], variables, simulation=simulation,
+                                           degreeofVariability=degreeofVariability, sampling=sampling, seed=seed)
+            bands = ensemble.run(sizeofEnsemble, q=cilimit, workers=workers, tolerance=tolerance)
+            for v in variables:
+                y1, y2, y3 = bands[:, :, variables.index(v)]
             
             #save the data file(csv form) in a new directory 
                 
@@ -218,22 +363,17 @@ def UncertaintySingleP(model, variables, runType = None, parameters = None, simu
             else:
                 newvars.append(v)
         model.steadyStateSelections = newvars
+        # steady state bands (percentiles, parameters, variables)
+        ssbands = np.empty((3, len(parameters), len(newvars)))
+        for p in parameters:
+            ensemble = UncertaintyEnsemble(model, [p], newvars, degreeofVariability=degreeofVariability,
+                                           sampling=sampling, seed=seed, steadyState=True)
+            ssbands[:, parameters.index(p), :] = ensemble.run(sizeofEnsemble, q=cilimit, workers=workers,
+                                                              tolerance=tolerance)[:, 0, :]
+            if callback is True:
+                print ("ss:",parameters.index(p),"complete")
         for nv in newvars:
-            midpoints = []
-            lowlimits = []
-            upplimits = []
-            for p in parameters:
-                ssresults=[]
-                for i in range(0,sizeofEnsemble+1):
-                    model.resetAll()
-                    model[p]=random.normalvariate(model[p], degreeofVariability * model[p]) 
-                    ssresult = model.getSteadyStateValuesNamedArray()[nv][0]
-                    ssresults.append(ssresult)
-                lowlimits.append(np.percentile(ssresults,cilimit[0]))
-                midpoints.append(np.percentile(ssresults,cilimit[1]))
-                upplimits.append(np.percentile(ssresults,cilimit[2]))        
-                if callback is True: 
-                    print ("ss:",(nv,parameters.index(p)),"complete")     
+            lowlimits, midpoints, upplimits = [list(b) for b in ssbands[:, :, newvars.index(nv)]]
             barheights = list(np.asarray(upplimits)-np.asarray(lowlimits))
             nwsub = fig.add_subplot(grids[newvars.index(nv),0])           
             nwsub.bar(x = parameters, height = barheights, color = barc)
@@ -262,7 +402,8 @@ def UncertaintyAllP(model, variables, runType = None, parameters = None, simulat
                     limitw = None, midw = None,
                     figtitle = None, xlabel = None, ylabel = None,
                     fontsize = None, 
-                    callback = None, datasave = None, imagesave = None):
+                    callback = None, datasave = None, imagesave = None,
+                    sampling = None, workers = None, tolerance = None, seed = None):
     
     """ Plots the confidence interval to visualize and quantify the uncertainty of the model. 
     The model is simulated multiple time (default : 10000 times) with changes in the value of entire set of parameters  
@@ -290,6 +431,10 @@ def UncertaintyAllP(model, variables, runType = None, parameters = None, simulat
     :param callback: callback (bool) If `True`, shows the progress of the task by returning the coordinate of subplot.
     :param datasave: name of the directory (str). creates a new directory in current working directory and save raw data in CSV format.
     :param imagesave: name of the image file (str, "filename.format"). saves the image file of the grid output. 
+    :param sampling: design of the parameter samples (str), "uniform" (default), "lhs" or "sobol".
+    :param workers: number of processes simulating the ensemble (int), default 1. None in the ensemble uses all CPUs.
+    :param tolerance: stop early once the relative change of the confidence bands between batches is below tolerance (float).
+    :param seed: seed of the parameter samples (int).
     """
     
     if parameters is None: 
@@ -350,6 +495,13 @@ def UncertaintyAllP(model, variables, runType = None, parameters = None, simulat
     
     if runType is None:
         runType = "TimeCourse"
+
+    if sampling is None:
+        sampling = "uniform"
+
+    if workers is None:
+        workers = 1
+
     if datasave is not None:
         import os
         cwd = os.getcwd()
@@ -373,37 +525,19 @@ def UncertaintyAllP(model, variables, runType = None, parameters = None, simulat
         grids = gs.GridSpec(nrows = 1, ncols = 1, figure = fig)
     #time course simulation 
     if runType == "TimeCourse":
-        for v in variables:
-            results = []
-            lowers = []
-            mids = []
-            uppers = []
-        #for each row
-            for i in range(0, sizeofEnsemble+1):
-                model.resetAll()
-                for p in parameters: 
-                    model[p] = random.normalvariate(model[p], degreeofVariability * model[p])
-                result = model.simulate(simulation[0], simulation[1], simulation[2], ['time'] + [v]) 
-                results.append(result)
-            
-                if callback is True: 
-                    if i%(sizeofEnsemble/2)==0:
-                        print (v, "simulation:", i/(sizeofEnsemble)*100, "% complete") 
-        
-            for j in range(0, len(results[0]['time'])):
-                timepoint=[]
-                for k in range(0,len(results)):
-                    timepoint.append(results[k][v][j])
-                lowers.append(np.percentile(timepoint,cilimit[0]))
-                mids.append(np.percentile(timepoint,cilimit[1]))
-                uppers.append(np.percentile(timepoint,cilimit[2]))
-            
+        # one ensemble for all variables
+        ensemble = UncertaintyEnsemble(model, parameters, variables, simulation=simulation,
+                                       degreeofVariability=degreeofVariability, sampling=sampling, seed=seed)
+
+        def progress(n):
+            if callback is True:
+                print ("simulation:", n/(sizeofEnsemble)*100, "% complete")
 
+        bands = ensemble.run(sizeofEnsemble, q=cilimit, workers=workers, tolerance=tolerance, callback=progress)
+        x = np.linspace(simulation[0], simulation[1], simulation[2])
+        for v in variables:
         #create a plot for confidence interval 
-            x = results[0]["time"]
-            y1 = lowers
-            y2 = mids
-            y3 = uppers
+            y1, y2, y3 = bands[:, :, variables.index(v)]
             
             #save the data file(csv form) in new directory 
             if datasave is not None:
@@ -446,17 +580,11 @@ def UncertaintyAllP(model, variables, runType = None, parameters = None, simulat
             else:
                 newvars.append(v)
         model.steadyStateSelections = newvars    
+        ensemble = UncertaintyEnsemble(model, parameters, newvars, degreeofVariability=degreeofVariability,
+                                       sampling=sampling, seed=seed, steadyState=True)
+        ssbands = ensemble.run(sizeofEnsemble, q=cilimit, workers=workers, tolerance=tolerance)
         for nv in newvars:
-            ssresults = []
-            for i in range(0,sizeofEnsemble+1):
-                model.resetAll()
-                for p in parameters:
-                    model[p]=random.normalvariate(model[p], degreeofVariability *model[p])
-                
-                ssresults.append(model.getSteadyStateValuesNamedArray()[nv][0])
-            midpoint = np.percentile(ssresults,cilimit[1])
-            lowerlimit = np.percentile(ssresults,cilimit[0])
-            upperlimit = np.percentile(ssresults,cilimit[2])
+            lowerlimit, midpoint, upperlimit = ssbands[:, 0, newvars.index(nv)]
             mids_df.append(midpoint)
             lows_df.append(lowerlimit)
             upps_df.append(upperlimit)